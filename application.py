@@ -1,9 +1,9 @@
 """
 Clinical Trials Knowledge Graph — Analytics Applications
 =========================================================
-20 applications across 5 categories:
+21 applications across 5 categories:
   1. Drug Intelligence      (4 apps)
-  2. Disease Analytics      (5 apps)
+  2. Disease Analytics      (6 apps)
   3. Sponsor Intelligence   (5 apps)
   4. Network & Graph        (3 apps)
   5. Geo & Temporal         (3 apps)
@@ -20,13 +20,18 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import seaborn as sns
 import os
+import json
 import networkx as nx
 import community as community_louvain   # pip install python-louvain
 from collections import Counter
 from neo4j import GraphDatabase
+from conditions import canonical_condition
+from raw_index import RawIndex, RAW_INDEX_NAME
 
 BASE_DIR = "outputs"
 os.makedirs(BASE_DIR, exist_ok=True)
+# written by `pre_processing.py --raw-index` into the staging directory
+RAW_INDEX = os.path.join("kg_staging", RAW_INDEX_NAME)
 
 URI = "neo4j://localhost:7687" 
 USER = "neo4j"
@@ -52,6 +57,10 @@ def _save(df, data_dir, filename):
     df.to_csv(path, index=False)
     print(f"  [csv]  {path}  ({len(df)} rows)")
 
+def _disease_key(disease):
+    # Condition nodes are named by canonical id, so "Alzheimer's disease" has to be matched as "alzheimer"
+    return canonical_condition(disease) or disease
+
 def _savefig(plot_dir, filename):
     path = os.path.join(plot_dir, filename)
     plt.tight_layout()
@@ -120,6 +129,7 @@ def drug_competition(kg, drug):
     MATCH (c)<-[:STUDIES]-(st2:Study)-[:USES_INTERVENTION]->(i2:Intervention)
     WHERE toLower(i.name)  CONTAINS toLower($drug)
       AND toLower(i2.name) <> toLower($drug)
+      AND coalesce(i2.role, 'active') = 'active'
     RETURN i2.name AS competitor, COUNT(DISTINCT st2) AS trials
     ORDER BY trials DESC
     LIMIT 30
@@ -199,11 +209,12 @@ def disease_landscape(kg, disease):
     MATCH (st:Study)-[:STUDIES]->(c:Condition)
     WHERE toLower(c.name) CONTAINS toLower($disease)
     MATCH (st)-[:USES_INTERVENTION]->(i:Intervention)
+    WHERE coalesce(i.role, 'active') = 'active'
     RETURN i.name AS drug, COUNT(DISTINCT st.nct_id) AS trials
     ORDER BY trials DESC
     LIMIT 30
     """
-    df = pd.DataFrame(kg.query(query, {"disease": disease}))
+    df = pd.DataFrame(kg.query(query, {"disease": _disease_key(disease)}))
     _save(df, data_dir, f"{disease}.csv")
 
     df.head(15).plot.barh(x="drug", y="trials", legend=False, color="slateblue")
@@ -230,7 +241,7 @@ def disease_design(kg, disease):
            a.type         AS arm_type,
            COUNT(*)       AS count
     """
-    df = pd.DataFrame(kg.query(query, {"disease": disease}))
+    df = pd.DataFrame(kg.query(query, {"disease": _disease_key(disease)}))
     _save(df, data_dir, f"{disease}.csv")
 
     fig, axes = plt.subplots(1, 3, figsize=(15, 4))
@@ -258,7 +269,7 @@ def disease_phase_progression(kg, disease):
     RETURN st.phases AS phase, COUNT(DISTINCT st.nct_id) AS trials
     ORDER BY phase
     """
-    df = pd.DataFrame(kg.query(query, {"disease": disease}))
+    df = pd.DataFrame(kg.query(query, {"disease": _disease_key(disease)}))
     _save(df, data_dir, f"{disease}.csv")
 
     df.plot.bar(x="phase", y="trials", legend=False, color="mediumpurple")
@@ -285,7 +296,7 @@ def disease_enrollment(kg, disease):
            st.enrollment AS enrollment,
            st.phases     AS phase
     """
-    df = pd.DataFrame(kg.query(query, {"disease": disease}))
+    df = pd.DataFrame(kg.query(query, {"disease": _disease_key(disease)}))
     df["enrollment"] = pd.to_numeric(df["enrollment"], errors="coerce")
     df = df.dropna(subset=["enrollment"])
     _save(df, data_dir, f"{disease}.csv")
@@ -307,6 +318,46 @@ def disease_enrollment(kg, disease):
     return df
 
 
+def disease_eligibility(kg, disease, age=65, measure="hba1c", value=7.0):
+    """
+    Trials for a disease that a patient of the given age and lab value could enrol in.
+    Filters numerically on the eligibility properties set by load_eligibility
+    (min/max age in years, incl_<measure>_min / _max) instead of matching criteria text.
+    """
+    data_dir, plot_dir = _dirs("disease_eligibility")
+
+    query = """
+    MATCH (st:Study)-[:STUDIES]->(c:Condition)
+    WHERE toLower(c.name) CONTAINS toLower($disease)
+      AND (st.min_age_years IS NULL OR st.min_age_years <= $age)
+      AND (st.max_age_years IS NULL OR st.max_age_years >= $age)
+      AND (st[$min_key] IS NOT NULL OR st[$max_key] IS NOT NULL)
+      AND (st[$min_key] IS NULL OR st[$min_key] <= $value)
+      AND (st[$max_key] IS NULL OR st[$max_key] >= $value)
+    RETURN DISTINCT st.nct_id     AS trial,
+           st.phases              AS phase,
+           st.overall_status      AS status,
+           st.min_age_years       AS min_age,
+           st.max_age_years       AS max_age,
+           st[$min_key]           AS measure_min,
+           st[$max_key]           AS measure_max
+    """
+    params = {"disease": _disease_key(disease), "age": age, "value": value,
+              "min_key": f"incl_{measure}_min", "max_key": f"incl_{measure}_max"}
+    df = pd.DataFrame(kg.query(query, params))
+    _save(df, data_dir, f"{disease}_{measure}.csv")
+    if df.empty:
+        return df
+
+    df["phase"].astype(str).value_counts().plot.bar(color="seagreen")
+    plt.title(f"{disease} – trials open to age {age}, {measure} = {value}")
+    plt.xlabel("Phase")
+    plt.ylabel("Trials")
+    plt.xticks(rotation=45, ha="right")
+    _savefig(plot_dir, f"{disease}_{measure}_eligibility.png")
+    return df
+
+
 def disease_sponsor_diversity(kg, disease):
     """
     Who is sponsoring trials for a disease and what class are they?
@@ -323,7 +374,7 @@ def disease_sponsor_diversity(kg, disease):
            COUNT(DISTINCT st.nct_id) AS trials
     ORDER BY trials DESC
     """
-    df = pd.DataFrame(kg.query(query, {"disease": disease}))
+    df = pd.DataFrame(kg.query(query, {"disease": _disease_key(disease)}))
     _save(df, data_dir, f"{disease}.csv")
 
     fig, axes = plt.subplots(1, 2, figsize=(13, 4))
@@ -432,6 +483,7 @@ def sponsor_drugs(kg, sponsor):
     MATCH (st:Study)<-[:SPONSORS]-(s:Sponsor)
     WHERE toLower(s.name) CONTAINS toLower($sponsor)
     MATCH (st)-[:USES_INTERVENTION]->(i:Intervention)
+    WHERE coalesce(i.role, 'active') = 'active'
     RETURN i.name AS drug, i.type AS intervention_type,
            COUNT(DISTINCT st.nct_id) AS trials
     ORDER BY trials DESC
@@ -489,6 +541,7 @@ def centrality(kg):
 
     query = """
     MATCH (st:Study)-[:USES_INTERVENTION]->(i:Intervention)
+    WHERE coalesce(i.role, 'active') = 'active'
     MATCH (st)-[:STUDIES]->(c:Condition)
     RETURN i.name AS drug, c.name AS condition
     """
@@ -534,6 +587,7 @@ def community_detection(kg):
 
     query = """
     MATCH (st:Study)-[:USES_INTERVENTION]->(i:Intervention)
+    WHERE coalesce(i.role, 'active') = 'active'
     MATCH (st)-[:STUDIES]->(c:Condition)
     RETURN i.name AS drug, c.name AS condition
     """
@@ -570,6 +624,7 @@ def drug_repurposing(kg):
 
     query = """
     MATCH (i:Intervention)<-[:USES_INTERVENTION]-(st:Study)-[:STUDIES]->(c:Condition)
+    WHERE coalesce(i.role, 'active') = 'active'
     RETURN i.name AS drug,
            COUNT(DISTINCT c.name)    AS n_conditions,
            COUNT(DISTINCT st.nct_id) AS n_trials,
@@ -687,6 +742,33 @@ def geo_phase_heatmap(kg):
     return df
 
 
+# ══════════════════════════════════════════════════════════════
+#  ON DEMAND — ORIGINAL STUDY RECORDS
+# ══════════════════════════════════════════════════════════════
+
+def trial_records(nct_ids, index_path=RAW_INDEX):
+    """
+    Full original ClinicalTrials.gov JSON for a handful of trials, read
+    straight from the dump through the raw index (no scan, no KG query).
+    Saves one <nct_id>.json per trial; ids missing from the index are skipped.
+    """
+    data_dir, _ = _dirs("trial_records")
+
+    records = {}
+    with RawIndex(index_path) as index:
+        for nct_id in nct_ids:
+            raw = index.get_bytes(nct_id)
+            if raw is None:
+                print(f"  [skip] {nct_id} not in {index_path}")
+                continue
+            path = os.path.join(data_dir, f"{nct_id}.json")
+            with open(path, "wb") as f:
+                f.write(raw)
+            print(f"  [json] {path}")
+            records[nct_id] = json.loads(raw)
+    return records
+
+
 # ══════════════════════════════════════════════════════════════
 #  RUNNER — execute all applications
 # ══════════════════════════════════════════════════════════════
@@ -712,6 +794,7 @@ def run_all(kg,
     disease_phase_progression(kg, disease)
     disease_enrollment(kg, disease)
     disease_sponsor_diversity(kg, disease)
+    disease_eligibility(kg, disease)
 
     print("\n══ 3. SPONSOR INTELLIGENCE ═══════════════")
     sponsor_portfolio(kg, sponsor)
@@ -730,7 +813,7 @@ def run_all(kg,
     trial_timeline(kg)
     geo_phase_heatmap(kg)
 
-    print("\n✅  All 20 applications executed.")
+    print("\n✅  All 21 applications executed.")
     print(f"    CSVs  → outputs/<app>/data/")
     print(f"    Plots → outputs/<app>/plots/")
 
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+array_memory.py
+
+Peak memory of reading a JSON array dump (pre_processing.InputStream / iter_json_array) as the input grows.
+Streaming keeps only the current element and one read chunk, so the peak levels off at a few tens of MB of
+allocator overhead instead of growing with the input. With --malformed one element in the middle is broken
+and the read must fail once MAX_RECORD_CHARS is buffered, not at EOF.
+
+    python bench/array_memory.py                        # 10k, 50k and 200k synthetic studies
+    python bench/array_memory.py --studies 10000,100000 --malformed
+
+Each size is read in its own interpreter and the peak RSS (VmHWM, reset after the imports) is reported above
+the resident size at the start, so it is the reader's alone (Linux only).
+Dumps are written to a temporary directory, about 3.4 kB per study.
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024  # kB
+
+def reset_peak():
+    # the imports peak above their resident size; start the high-water mark (VmHWM) from here
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+def run_one(path):
+    sys.path.insert(0, str(ROOT))
+    import pre_processing as pp
+    reset_peak()
+    base = status_mb("VmRSS")
+    size_mb = os.path.getsize(path) / 1e6
+    inp = pp.InputStream(Path(path))
+    n = 0
+    outcome = "ok"
+    t0 = time.perf_counter()
+    try:
+        for _ in inp.records():
+            n += 1
+    except ValueError as e:
+        outcome = f"error after {n:,} records: {e}"
+    finally:
+        inp.close()
+    elapsed = time.perf_counter() - t0
+    print(f"{size_mb:9.0f} MB {n:>9,} {elapsed:8.2f} s {status_mb('VmHWM') - base:9.1f} MB  {outcome}")
+
+def write_broken_dump(path, n):
+    from synthetic import write_dump
+    write_dump(path, n, fmt="array")
+    # drop the opening quote of the first key of the middle study: that element can never decode
+    lines = Path(path).read_text(encoding="utf-8").splitlines(keepends=True)
+    mid = 1 + n // 2
+    lines[mid] = lines[mid].replace('{"', "{", 1)
+    Path(path).write_text("".join(lines), encoding="utf-8")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark peak memory of reading JSON array dumps")
+    parser.add_argument("--studies", type=str, default="10000,50000,200000", help="Comma-separated study counts")
+    parser.add_argument("--malformed", action="store_true", help="Break one element in the middle of each dump")
+    parser.add_argument("--one", metavar="PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.one:
+        run_one(args.one)
+        return
+    sys.path.insert(0, str(ROOT / "bench"))
+    from synthetic import write_dump
+    print(f"{'input':>12} {'records':>9} {'time':>10} {'peak RSS':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [int(k) for k in args.studies.split(",")]:
+            path = os.path.join(tmp, f"studies_{n}.json")
+            if args.malformed:
+                write_broken_dump(path, n)
+            else:
+                write_dump(path, n, fmt="array")
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--one", path], check=True)
+            os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+categorical.py
+
+What the categorical columns (COLUMN_TYPES "category" / "category_list": overallStatus, phases, country, role, ...)
+cost with and without the StringPool dictionary encoding of pre_processing.ColumnarWriter.
+
+    python bench/categorical.py                                   # 20000 synthetic studies
+    python bench/categorical.py --input dump.jsonl.gz --limit 50000   # a sample of a real dump
+
+Two measurements over the same extracted rows:
+ - memory: tracemalloc of the buffered categorical columns alone, once as the parsed strings (one str object per
+   row, as json.loads creates them) and once as int codes plus the per-column StringPool, which is what the
+   writer buffers until a row group is flushed. --row-group-rows 0 (default) buffers every row, as one row group
+   of a whole dump would.
+ - output: Arrow IPC and Parquet file sizes and write time of every file with a categorical column, written by
+   ColumnarWriter with the categorical columns dictionary-encoded, then declared as plain strings. Parquet
+   dictionary-encodes repeated strings on its own, so most of the difference shows in Arrow.
+
+On 3000 synthetic studies the buffered categorical values take 9.0 MB as strings and 2.1 MB as codes; Arrow
+output shrinks from 1.41 MB to 1.08 MB and Parquet stays at 0.30 MB; write times are within noise of each other.
+"""
+
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+import pre_processing as pp  # noqa: E402
+from synthetic import write_dump  # noqa: E402
+
+CATEGORICAL = ("category", "category_list")
+PLAIN_KIND = {"category": "string", "category_list": "list"}
+
+def categorical_files():
+    """Staging file -> its columns, for files with at least one categorical column."""
+    return {fname: cols for fname, cols in pp.file_columns().items() if any(k in CATEGORICAL for _, k in cols)}
+
+def extract_rows(path, limit, files):
+    """Rows (dicts) per categorical file for the first `limit` records of path."""
+    rows = {fname: [] for fname in files}
+    inp = pp.InputStream(Path(path))
+    try:
+        for n, (_, raw) in enumerate(inp.records()):
+            if limit and n >= limit:
+                break
+            out, _ = pp.extract_record(raw, Path(path), encode=False)
+            for fname, row, _ in out:
+                if fname in rows:
+                    rows[fname].append(row)
+    finally:
+        inp.close()
+    return rows
+
+def buffered_bytes(path, limit, files, pooled, row_group_rows):
+    """tracemalloc size of the categorical column buffers after reading `limit` records, and the peak."""
+    cols = {(fname, name): kind for fname, columns in files.items() for name, kind in columns if kind in CATEGORICAL}
+    pools = {key: pp.StringPool() for key in cols}
+    buffers = {key: [] for key in cols}
+    counts = dict.fromkeys(files, 0)
+    inp = pp.InputStream(Path(path))
+    tracemalloc.start()
+    try:
+        for n, (_, raw) in enumerate(inp.records()):
+            if limit and n >= limit:
+                break
+            out, _ = pp.extract_record(raw, Path(path), encode=False)
+            for fname, row, _ in out:
+                if fname not in files:
+                    continue
+                counts[fname] += 1
+                if row_group_rows and counts[fname] % row_group_rows == 0:
+                    # a flushed row group: the writer drops its buffers (the pools stay)
+                    for key in buffers:
+                        if key[0] == fname:
+                            buffers[key] = []
+                for (f, name), kind in cols.items():
+                    if f != fname:
+                        continue
+                    value = row.get(name)
+                    if value is not None and pooled:
+                        code = pools[(f, name)].code
+                        value = code(value) if kind == "category" else [code(v) for v in value]
+                    buffers[(f, name)].append(value)
+            del out
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        inp.close()
+    return current, peak, sum(len(b) for b in buffers.values())
+
+def write_size(rows, columns, fmt, outdir, tag, row_group_rows):
+    """(bytes, seconds) of one file written by ColumnarWriter."""
+    path = Path(outdir) / f"{tag}{pp.COLUMNAR_SUFFIX[fmt]}"
+    t0 = time.perf_counter()
+    writer = pp.ColumnarWriter(path, columns, fmt, row_group_rows or max(len(rows), 1))
+    for row in rows:
+        writer.write(row)
+    writer.close()
+    return writer.bytes_written, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dictionary encoding of categorical columns")
+    parser.add_argument("--studies", type=int, default=20000, help="Number of synthetic studies (without --input)")
+    parser.add_argument("--input", type=str, default=None, help="Dump to sample instead (JSONL / JSON array, .gz)")
+    parser.add_argument("--limit", type=int, default=None, help="Records read from --input (default: all)")
+    parser.add_argument("--row-group-rows", type=int, default=0,
+                        help=f"Rows buffered per row group (0 = all; the ETL default is {pp.DEFAULT_ROW_GROUP_ROWS})")
+    args = parser.parse_args()
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        sys.exit("pyarrow is required (pip install pyarrow)")
+    logging.disable(logging.INFO)
+    files = categorical_files()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.input:
+            path, limit = args.input, args.limit
+        else:
+            path, limit = write_dump(Path(tmp) / "dump.jsonl", args.studies), None
+
+        print("Buffered categorical columns (tracemalloc)")
+        print(f"  {'buffer':<16} {'values':>10} {'current':>11} {'peak':>11}")
+        results = {}
+        for label, pooled in (("strings", False), ("codes + pool", True)):
+            current, peak, values = buffered_bytes(path, limit, files, pooled, args.row_group_rows)
+            results[label] = current
+            print(f"  {label:<16} {values:>10,} {current / 1e6:>9.2f} MB {peak / 1e6:>9.2f} MB")
+        if results["codes + pool"]:
+            print(f"  strings / codes: {results['strings'] / results['codes + pool']:.1f}x")
+
+        rows = extract_rows(path, limit, files)
+        print()
+        print("Output size and write time (ColumnarWriter)")
+        print(f"  {'file':<42} {'rows':>8} {'fmt':>8} {'plain':>11} {'dictionary':>11} {'plain s':>8} {'dict s':>8}")
+        totals = {}
+        # warm up pyarrow (lazy imports, type conversions) so the first file's times are not its setup cost
+        for fmt in ("arrow", "parquet"):
+            for fname, columns in files.items():
+                plain = [(name, PLAIN_KIND.get(kind, kind)) for name, kind in columns]
+                write_size(rows[fname][:100], plain, fmt, tmp, "warmup", args.row_group_rows)
+        for fname, columns in sorted(files.items()):
+            plain = [(name, PLAIN_KIND.get(kind, kind)) for name, kind in columns]
+            for fmt in ("arrow", "parquet"):
+                p_bytes, p_secs = write_size(rows[fname], plain, fmt, tmp, "plain", args.row_group_rows)
+                d_bytes, d_secs = write_size(rows[fname], columns, fmt, tmp, "dict", args.row_group_rows)
+                total = totals.setdefault(fmt, [0, 0, 0.0, 0.0])
+                for k, v in enumerate((p_bytes, d_bytes, p_secs, d_secs)):
+                    total[k] += v
+                print(f"  {fname:<42} {len(rows[fname]):>8,} {fmt:>8} {p_bytes / 1e3:>8.1f} kB {d_bytes / 1e3:>8.1f} kB "
+                      f"{p_secs:>8.3f} {d_secs:>8.3f}")
+        for fmt, (p_bytes, d_bytes, p_secs, d_secs) in totals.items():
+            print(f"  {'total':<42} {'':>8} {fmt:>8} {p_bytes / 1e3:>8.1f} kB {d_bytes / 1e3:>8.1f} kB "
+                  f"{p_secs:>8.3f} {d_secs:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+compress.py
+
+Wall time and staging size of a full pre_processing run with --compress none / gzip / zstd on a synthetic dump.
+
+    python bench/compress.py                                  # 20000 studies, every compression
+    python bench/compress.py --studies 5000 --compress none,zstd --threads 1,2
+
+Compression runs on background lanes (--compress-threads) that overlap with extraction only when there is a
+spare core; on one core the difference to "none" is the full compression cost. zstd needs zstandard.
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import contextlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+import pre_processing as pp  # noqa: E402
+from synthetic import write_dump  # noqa: E402
+
+def dir_mb(path):
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file()) / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark --compress on a synthetic dump")
+    parser.add_argument("--studies", type=int, default=20000, help="Number of synthetic studies")
+    parser.add_argument("--compress", type=str, default=",".join(pp.COMPRESSIONS), help="Comma-separated modes")
+    parser.add_argument("--threads", type=str, default="2", help="Comma-separated --compress-threads values")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        dump = write_dump(os.path.join(tmp, "dump.jsonl"), args.studies)
+        print(f"input: {args.studies} studies, {os.path.getsize(dump) / 1e6:.0f} MB")
+        print(f"{'compress':<9} {'threads':>7} {'time':>10} {'staging':>11}")
+        for mode in args.compress.split(","):
+            for threads in ([int(t) for t in args.threads.split(",")] if mode != "none" else [0]):
+                outdir = Path(tmp) / f"out_{mode}_{threads}"
+                t0 = time.perf_counter()
+                with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):  # the run's summary line
+                    pp.process_file_with_progress(Path(dump), outdir, workers=args.workers, compress=mode,
+                                                  compress_threads=max(threads, 1), progress="none")
+                elapsed = time.perf_counter() - t0
+                print(f"{mode:<9} {threads or '-':>7} {elapsed:8.2f} s {dir_mb(outdir):8.1f} MB")
+
+if __name__ == "__main__":
+    main()
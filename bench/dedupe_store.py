@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+dedupe_store.py
+
+Time and peak memory of the --dedupe-store backends (pre_processing.SetStore / HashedStore / SqliteStore)
+adding N distinct keys, each checked first with add_new as the writer does.
+
+    python bench/dedupe_store.py                      # 1M and 10M keys, every store
+    python bench/dedupe_store.py --keys 1000000 --stores set,hashed
+
+Each store runs in its own interpreter, so the peak RSS (ru_maxrss) above the interpreter's baseline is the
+store's alone.
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STORES = ["set", "hashed", "disk"]
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def run_one(store_name, n):
+    sys.path.insert(0, str(ROOT))
+    import pre_processing as pp
+    with tempfile.TemporaryDirectory() as tmp:
+        base = peak_mb()
+        store = pp.open_dedupe_stores(store_name, Path(tmp))["trials"]
+        t0 = time.perf_counter()
+        for i in range(n):
+            store.add_new(f"NCT{i:08d}")
+        elapsed = time.perf_counter() - t0
+        assert len(store) == n
+        store.close()
+        print(f"{store_name:<7} {n:>11,} {elapsed:8.2f} s {n / elapsed:12,.0f} keys/s {peak_mb() - base:9.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dedupe stores")
+    parser.add_argument("--keys", type=str, default="1000000,10000000", help="Comma-separated key counts")
+    parser.add_argument("--stores", type=str, default=",".join(STORES), help="Comma-separated stores")
+    parser.add_argument("--one", nargs=2, metavar=("STORE", "N"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.one:
+        run_one(args.one[0], int(args.one[1]))
+        return
+    print(f"{'store':<7} {'keys':>11} {'time':>10} {'rate':>19} {'peak RSS':>12}")
+    for n in [int(k) for k in args.keys.split(",")]:
+        for store_name in args.stores.split(","):
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--one", store_name, str(n)], check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+eligibility_parse.py
+
+Criteria blocks per second for eligibility.parse_criteria (and with add_constraints) against the
+naive splitter pre_processing used before eligibility.py, on synthetic eligibilityCriteria blocks.
+
+    python bench/eligibility_parse.py                  # 20000 blocks of ~3k characters
+    python bench/eligibility_parse.py --blocks 100000 --repeat 5
+
+The splitter only cuts the block into inclusion/exclusion lines; parse_criteria also strips list markers,
+recognises header variants and tracks nesting, so the splitter is the cost to stay close to.
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from eligibility import parse_criteria, add_constraints  # noqa: E402
+
+INCLUSION_LINES = [
+    "Age 18 to 75 years, inclusive, at the time of signing informed consent",
+    "HbA1c > 7.0% and <= 10.5% at screening",
+    "Body mass index (BMI) >= 27 kg/m2",
+    "Diagnosed with type 2 diabetes mellitus at least 180 days prior to the day of screening",
+    "Male or female, willing to use highly effective contraception during the trial",
+    "Stable daily dose of metformin (>= 1500 mg or maximum tolerated dose) for at least 90 days",
+    "Able and willing to comply with the study visits and procedures described in the protocol",
+    "ECOG performance status 0 or 1",
+    "Absolute neutrophil count >= 1.5 x 10^9/L and platelets >= 100 x 10^9/L",
+]
+EXCLUSION_LINES = [
+    "eGFR < 30 mL/min/1.73m2 (CKD-EPI) at screening",
+    "Pregnant or breast-feeding women, or women intending to become pregnant",
+    "ALT or AST > 2.5 x ULN",
+    "History of pancreatitis (acute or chronic)",
+    "Myocardial infarction, stroke or hospitalization for unstable angina within the past 180 days",
+    "Treatment with any medication for the indication of obesity within the past 90 days before screening",
+    "Known or suspected hypersensitivity to trial product(s) or related products",
+    "Participation in any clinical trial of an approved or non-approved investigational medicinal product",
+]
+MARKERS = ["* ", "- ", "• ", "{n}. ", "{n}) ", "({n}) "]
+
+def _items(rng, lines, n):
+    out = []
+    marker = rng.choice(MARKERS)
+    for k in range(n):
+        out.append(marker.format(n=k + 1) + rng.choice(lines))
+        if rng.random() < 0.2:
+            out.append("   " + rng.choice(["a. ", "* ", "i. "]) + rng.choice(lines).lower())
+        if rng.random() < 0.05:
+            out.append("   continued on the next line of the same item")
+    return out
+
+def criteria_block(rng):
+    """One synthetic eligibilityCriteria block: headers, markers, nesting and continuation lines."""
+    lines = [rng.choice(["Inclusion Criteria:", "Key Inclusion Criteria:", "INCLUSION CRITERIA"]), ""]
+    lines += _items(rng, INCLUSION_LINES, rng.randint(12, 20))
+    lines += ["", rng.choice(["Exclusion Criteria:", "Key Exclusion Criteria:", "EXCLUSION CRITERIA"]), ""]
+    lines += _items(rng, EXCLUSION_LINES, rng.randint(14, 24))
+    return "\n".join(lines)
+
+def split_eligibility_criteria(elig_text):
+    # pre_processing's splitter before eligibility.py, unchanged
+    if not elig_text:
+        return []
+    inc = []
+    exc = []
+    lower = elig_text.lower()
+    if "inclusion criteria" in lower or "exclusion criteria" in lower:
+        lines = [l.strip() for l in elig_text.splitlines() if l.strip()]
+        mode = None
+        for L in lines:
+            ll = L.lower()
+            if "inclusion" in ll and "criteria" in ll:
+                mode = "INCLUSION"
+                continue
+            if "exclusion" in ll and "criteria" in ll:
+                mode = "EXCLUSION"
+                continue
+            if mode == "INCLUSION":
+                inc.append(L)
+            elif mode == "EXCLUSION":
+                exc.append(L)
+            else:
+                if L.startswith("*") or L.startswith("-"):
+                    inc.append(L.lstrip("*- ").strip())
+                else:
+                    inc.append(L)
+    else:
+        inc = [elig_text]
+    items = [{"tag": "IN", "type": "INCLUSION", "text": t, "sequence": seq} for seq, t in enumerate(inc)]
+    items += [{"tag": "EX", "type": "EXCLUSION", "text": t, "sequence": seq} for seq, t in enumerate(exc)]
+    return items
+
+def structured(text):
+    return add_constraints(parse_criteria(text))
+
+def best_rate(fn, blocks, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in blocks:
+            fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return len(blocks) / best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark eligibility criteria parsing")
+    parser.add_argument("--blocks", type=int, default=20000, help="Number of criteria blocks")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes (the best is reported)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    blocks = [criteria_block(rng) for _ in range(args.blocks)]
+    chars = sum(len(b) for b in blocks) / len(blocks)
+    criteria = sum(len(parse_criteria(b)) for b in blocks) / len(blocks)
+    print(f"{len(blocks)} blocks, {chars:.0f} characters and {criteria:.0f} criteria on average")
+    for name, fn in [("old splitter", split_eligibility_criteria), ("parse_criteria", parse_criteria),
+                     ("parse_criteria + add_constraints", structured)]:
+        print(f"{name:<34} {best_rate(fn, blocks, args.repeat):10,.0f} blocks/s")
+
+if __name__ == "__main__":
+    main()
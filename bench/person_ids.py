@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+person_ids.py
+
+Throughput of people.person_key / person_id and build_person_map on synthetic overall officials: each person
+appears under several name renderings ("Dr. John A. Smith", "Smith, John, MD", "J. Smith", ...) and with
+affiliation suffixes ("Mayo Clinic" / "Mayo Clinic, Rochester").
+
+    python bench/person_ids.py                          # 1M records of 150k people
+    python bench/person_ids.py --records 200000 --people 30000
+
+Also reports the comparisons build_person_map made (against all pairs of distinct keys) and how many ids the
+records resolve to without and with the table, next to the true number of people.
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import people  # noqa: E402
+
+FIRST = ["John", "Mary", "Wei", "Ana", "Mohammed", "Sarah", "David", "Yuki", "Olga", "Pierre", "Priya", "James",
+         "Elena", "Ahmed", "Laura", "Kenji", "Fatima", "Michael", "Sofia", "Lars"]
+LAST = ["Smith", "Garcia", "Wang", "Müller", "Kim", "Rossi", "Nguyen", "Kowalski", "Silva", "Cohen", "Tanaka",
+        "Johansson", "Okafor", "Dubois", "Patel", "Ivanova", "Brown", "Lopez", "Schmidt", "Haddad"]
+INSTITUTIONS = ["Mayo Clinic", "University of Texas MD Anderson Cancer Center", "Charité Universitätsmedizin",
+                "Massachusetts General Hospital", "Peking University First Hospital", "Karolinska Institutet",
+                "Hospital Universitario La Paz", "Seoul National University Hospital", "Institut Gustave Roussy",
+                "University of Toronto", "Tata Memorial Centre", "Royal Marsden Hospital"]
+SUFFIXES = ["", ", Rochester", " - Department of Oncology", ", Boston, MA"]
+
+def make_people(rng, n):
+    out = []
+    for i in range(n):
+        first, last = rng.choice(FIRST), f"{rng.choice(LAST)}{i // 400 or ''}"
+        out.append((first, rng.choice("ABCDEFGHJKLMNPRSTW"), last, rng.choice(INSTITUTIONS)))
+    return out
+
+def render(rng, person):
+    first, middle, last, institution = person
+    name = rng.choice([
+        f"{first} {last}", f"Dr. {first} {middle}. {last}", f"{last}, {first}, MD", f"{first[0]}. {last}",
+        f"{first} {last}, PhD",
+    ])
+    return name, institution + rng.choice(SUFFIXES)
+
+def rate(n, seconds):
+    return f"{n / seconds:10,.0f} records/s"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark investigator ids and the resolution table")
+    parser.add_argument("--records", type=int, default=1000000, help="Number of official records")
+    parser.add_argument("--people", type=int, default=150000, help="Number of distinct people behind them")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    persons = make_people(rng, args.people)
+    records = [render(rng, rng.choice(persons)) for _ in range(args.records)]
+
+    t0 = time.perf_counter()
+    keys = {people.person_key(name, aff) for name, aff in records}
+    print(f"person_key        {rate(len(records), time.perf_counter() - t0)} (uncached)")
+
+    people.load_person_map(None)
+    t0 = time.perf_counter()
+    exact = {people.person_id(name, aff) for name, aff in records}
+    print(f"person_id         {rate(len(records), time.perf_counter() - t0)} "
+          f"({len(set(records)):,} distinct raw pairs, cache of {people.person_id.cache_info().maxsize:,})")
+
+    t0 = time.perf_counter()
+    table = people.build_person_map(records)
+    elapsed = time.perf_counter() - t0
+    print(f"build_person_map  {rate(len(records), elapsed)} ({elapsed:.1f} s)")
+    print(f"comparisons       {table['comparisons']:,} (all pairs of {len(keys):,} keys: {len(keys) ** 2 // 2:.1e})")
+
+    people.PERSON_MAP = table["persons"]
+    people.person_id.cache_clear()
+    mapped = {people.person_id(name, aff) for name, aff in records}
+    print(f"distinct ids      {len(exact):,} exact -> {len(mapped):,} with the table ({args.people:,} people)")
+
+if __name__ == "__main__":
+    main()
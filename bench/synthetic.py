@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+synthetic.py
+
+Synthetic ClinicalTrials.gov studies for the tests and benchmarks (no real dump needed).
+
+    from synthetic import study, write_dump
+    write_dump("sample.jsonl", 1000)              # JSONL (.gz compresses, fmt="array" writes one JSON array)
+    python bench/synthetic.py 20000 big.jsonl.gz   # same from the command line
+
+Studies cycle through a few spellings of the same conditions, interventions, sponsors, sites and people,
+so the dedupe and canonicalization paths see realistic repetition; every other study has a results section.
+"""
+
+import gzip
+import json
+import random
+import argparse
+
+CONDITIONS = ["Alzheimer Disease", "Alzheimer's disease", "Alzheimers", "Type 2 Diabetes",
+              "Diabetes Mellitus, Type 2", "Obesity", "Hypertension", "Breast Cancers", "Café-au-lait"]
+INTERVENTIONS = ["Drug: Semaglutide", "semaglutide 1mg", "Placebo (semaglutide)", "Donepezil 10 mg tablet",
+                 "Metformin", "Placebo", "Device: Pump", "Biological: Vaccine X"]
+SPONSORS = [("Pfizer", "INDUSTRY"), ("Novo Nordisk A/S", "INDUSTRY"), ("NIH", "NIH"), ("Mayo Clinic", "OTHER")]
+SITES = [("Mayo Clinic", "Rochester", "United States", 44.0225, -92.4699),
+         ("Charité", "Berlin", "Germany", 52.52, 13.405),
+         ("Mayo Clinic Hospital", "Rochester", "United States", 44.02251, -92.46991)]
+PEOPLE = ["John Smith, MD", "Dr. John Smith", "Jane Doe, PhD", "Maria García"]
+CRITERIA = """Inclusion Criteria:
+
+* Age 18 to 75 years
+* HbA1c > 7.0% and <= 10.5%
+* BMI >= 27 kg/m2
+  1. nested item
+* Male or female
+
+Exclusion Criteria:
+
+- eGFR < 30 mL/min/1.73m2
+- Pregnant women
+- Age over 80"""
+
+def study(i, rng=random):
+    """One study dict; i fixes its nctId (NCT<i:08d>), rng picks the repeated values."""
+    ps = {
+        "identificationModule": {"nctId": f"NCT{i:08d}", "orgStudyIdInfo": {"id": f"ORG-{i}"},
+                                 "briefTitle": f"Study {i} ü", "officialTitle": "Off", "acronym": None},
+        "statusModule": {"overallStatus": rng.choice(["COMPLETED", "RECRUITING"]), "statusVerifiedDate": "2020-01",
+                         "startDateStruct": {"date": "2019-01-01"}, "primaryCompletionDateStruct": {"date": "2021-01"},
+                         "completionDateStruct": {"date": "2021-06"}, "studyFirstSubmitDate": "2018-12-01",
+                         "studyFirstPostDateStruct": {"date": "2018-12-05"},
+                         "lastUpdatePostDateStruct": {"date": rng.choice(["2022-01-01", "2023-02-02"])}},
+        "designModule": {"studyType": "INTERVENTIONAL",
+                         "phases": rng.choice([["PHASE2"], ["PHASE3"], ["PHASE1", "PHASE2"]]),
+                         "designInfo": {"interventionModel": "PARALLEL", "allocation": "RANDOMIZED",
+                                        "primaryPurpose": "TREATMENT", "maskingInfo": {"masking": "DOUBLE"}},
+                         "enrollmentInfo": {"count": rng.randint(10, 1000), "type": "ACTUAL"}},
+        "descriptionModule": {"briefSummary": "Summary " * 5},
+        "sponsorCollaboratorsModule": {"leadSponsor": dict(zip(["name", "class"], rng.choice(SPONSORS)))},
+        "conditionsModule": {"conditions": rng.sample(CONDITIONS, 2) + [""]},
+        "armsInterventionsModule": {
+            "interventions": [{"type": "DRUG", "name": name, "description": "d",
+                               "otherNames": ["Ozempic"] if "emaglutide" in name else []}
+                              for name in rng.sample(INTERVENTIONS, 3)],
+            "armGroups": [{"label": "Arm A", "type": "EXPERIMENTAL", "description": "x",
+                           "interventionNames": ["Drug: Semaglutide"]},
+                          {"label": "Arm B", "type": "PLACEBO_COMPARATOR", "interventionNames": ["Drug: Placebo"]}]},
+        "contactsLocationsModule": {
+            "locations": [{"facility": f, "city": c, "country": co, "status": "RECRUITING",
+                           "geoPoint": {"lat": lat, "lon": lon}} for f, c, co, lat, lon in rng.sample(SITES, 2)]
+                         + [{"facility": "Nowhere"}],
+            "centralContacts": [{"name": rng.choice(PEOPLE), "role": "CONTACT", "phone": "1", "email": "a@b"}],
+            "overallOfficials": [{"name": rng.choice(PEOPLE), "affiliation": "Mayo Clinic",
+                                  "role": "PRINCIPAL_INVESTIGATOR"}]},
+        "outcomesModule": {"primaryOutcomes": [{"measure": "HbA1c change", "timeFrame": "26 weeks"}],
+                           "secondaryOutcomes": [{"measure": "Weight"}]},
+        "eligibilityModule": {"eligibilityCriteria": CRITERIA if i % 3 else "Adults only", "sex": "ALL",
+                              "minimumAge": "18 Years", "maximumAge": "75 Years", "healthyVolunteers": False},
+        "referencesModule": {"references": [{"pmid": str(1000 + i), "type": "RESULT", "citation": "cit"},
+                                            {"type": "BACKGROUND", "citation": "c2"}]},
+        "ipdSharingStatementModule": {"ipdSharing": "NO"},
+        "derivedSection": {"miscInfoModule": {"versionHolder": "2024-01-01"}},
+    }
+    js = {"protocolSection": ps, "hasResults": i % 2 == 0,
+          "derivedSection": {"miscInfoModule": {"versionHolder": "2024-01-01"}}}
+    if i % 2 == 0:
+        js["resultsSection"] = {
+            "outcomeMeasuresModule": {"outcomeMeasures": [
+                {"type": "PRIMARY", "title": "HbA1c change", "classes": [{"categories": [{"measurements": [
+                    {"groupId": "OG000", "value": "-1.2", "spread": "0.3"}, {"groupId": "OG001", "value": "-0.1"}]}]}]}]},
+            "participantFlowModule": {"groups": [{"id": "FG000", "title": "Sema"}], "periods": [
+                {"title": "Overall", "milestones": [{"type": "STARTED",
+                                                     "achievements": [{"groupId": "FG000", "numSubjects": "50"}]}]}]},
+            "baselineCharacteristicsModule": {"groups": [{"id": "BG000", "title": "Total"}], "measures": [
+                {"title": "Age", "paramType": "MEAN", "unitOfMeasure": "years", "classes": []}]},
+            "adverseEventsModule": {"eventGroups": [{"id": "EG000", "title": "Sema", "seriousNumAffected": 2}],
+                                    "seriousEvents": [{"term": "Nausea", "organSystem": "GI", "stats": [
+                                        {"groupId": "EG000", "numEvents": 3, "numAffected": 2, "numAtRisk": 50}]}]},
+        }
+    return js
+
+def write_dump(path, n, seed=1, fmt="jsonl", first=0):
+    """Write studies first .. first+n-1 to path as JSONL or one JSON array (gzip when path ends in .gz)."""
+    rng = random.Random(seed)
+    path = str(path)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        if fmt == "array":
+            f.write("[\n")
+        for i in range(first, first + n):
+            line = json.dumps(study(i, rng), ensure_ascii=False)
+            if fmt == "array":
+                f.write(line + (",\n" if i < first + n - 1 else "\n"))
+            else:
+                f.write(line + "\n")
+        if fmt == "array":
+            f.write("]\n")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic ClinicalTrials.gov dump")
+    parser.add_argument("n", type=int, help="Number of studies")
+    parser.add_argument("output", type=str, help="Output path (.jsonl, .json, optionally .gz)")
+    parser.add_argument("--format", choices=["jsonl", "array"], default="jsonl")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    write_dump(args.output, args.n, args.seed, args.format)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+trial_node.py
+
+Trial nodes per second: the compiled "trials" schema section against building the same dict with safe_get,
+which splits every dotted path again for every record (how the trial node was built before TRIAL_NODE_SPEC).
+
+    python bench/trial_node.py                     # 20000 synthetic studies
+    python bench/trial_node.py --studies 100000 --repeat 5
+    python bench/trial_node.py --input dump.jsonl.gz --studies 50000   # the first 50000 studies of a real dump
+
+Records are parsed up front and only the mapping is timed (no JSON parsing or serialization). Real records are
+more varied than the synthetic ones (missing modules, longer texts), so the gap on a dump sample can differ.
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+import pre_processing as pp  # noqa: E402
+from synthetic import study  # noqa: E402
+
+def scope_for(js, input_path):
+    ps = js.get("protocolSection", {})
+    idm = ps.get("identificationModule", {})
+    return {"record": js, "protocol": ps, "identification": idm, "results": js.get("resultsSection", {}) or {},
+            "nct": idm.get("nctId"), "input": input_path}
+
+def read_scopes(path, limit):
+    """Scopes of the first `limit` study objects in a dump (JSONL / JSON array, optionally .gz)."""
+    scopes = []
+    inp = pp.InputStream(path)
+    try:
+        for _, raw in inp.records():
+            try:
+                js = pp.CODEC.loads(raw) if isinstance(raw, (bytes, str)) else raw
+            except ValueError:
+                continue
+            # the ETL dead-letters records that are not study objects or have no nctId; leave them out
+            if not isinstance(js, dict) or not isinstance(js.get("protocolSection"), dict):
+                continue
+            scope = scope_for(js, path)
+            if not isinstance(scope["identification"], dict) or not scope["nct"]:
+                continue
+            scopes.append(scope)
+            if len(scopes) >= limit:
+                break
+    finally:
+        inp.close()
+    return scopes
+
+def naive_trial_node(scope):
+    node = {}
+    for key, expr, default in pp.TRIAL_NODE_SPEC:
+        if isinstance(expr, tuple):  # rawJsonPath
+            node[key] = f"{scope['input']}::{scope['nct']}"
+            continue
+        var, _, rest = expr.partition(".")
+        node[key] = pp.safe_get(scope[var], rest, default) if rest else scope[var]
+    return node
+
+def compiled(scopes):
+    rows = []
+    emit = lambda fname, obj, seen=None: rows.append(obj)  # noqa: E731
+    for scope in scopes:
+        for run in pp.COMPILED_SECTIONS["trials"]:
+            run(scope, emit)
+    return rows
+
+def naive(scopes):
+    return [naive_trial_node(scope) for scope in scopes]
+
+def best_rate(fn, scopes, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(scopes)
+        best = min(best, time.perf_counter() - t0)
+    return len(scopes) / best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trial node extraction")
+    parser.add_argument("--studies", type=int, default=20000,
+                        help="Number of studies (synthetic, or the first ones read from --input)")
+    parser.add_argument("--input", type=str, default=None,
+                        help="Dump to read the studies from instead (JSONL / JSON array, optionally .gz)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes (the best is reported)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.input:
+        scopes = read_scopes(Path(args.input), args.studies)
+        if not scopes:
+            sys.exit(f"No studies with an nctId in {args.input}")
+        print(f"{len(scopes):,} studies from {args.input}")
+    else:
+        rng = random.Random(args.seed)
+        input_path = Path("dump.jsonl")
+        scopes = [scope_for(study(i, rng), input_path) for i in range(args.studies)]
+    assert compiled(scopes[:100]) == naive(scopes[:100])
+    for name, fn in [("safe_get per record", naive), ("compiled trials section", compiled)]:
+        rate = best_rate(fn, scopes, args.repeat)
+        print(f"{name:<24} {rate:10,.0f} records/s {1e6 / rate:7.1f} us/record")
+
+if __name__ == "__main__":
+    main()
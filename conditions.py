@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+conditions.py
+
+Condition name normalization for ClinicalTrials.gov records, shared by pre_processing.py and application.py.
+
+    from conditions import canonical_condition, load_condition_map
+    canonical_condition("Alzheimer's disease")         # "alzheimer"
+    canonical_condition("Diabetes Mellitus, Type 2")   # "type 2 diabetes mellitus"
+
+Mapping file (pre_processing.py --condition-map): JSON {"alias": "canonical name", ...} or a two-column
+.csv / .tsv (alias, canonical name). Both sides are normalized with the same pipeline, so entries can be
+written as natural names:
+    T2DM<TAB>Type 2 Diabetes Mellitus
+    Type 2 Diabetes<TAB>Type 2 Diabetes Mellitus
+
+Notes:
+ - Pipeline: accent/case folding, MeSH-style inversion ("Carcinoma, Non-Small-Cell Lung" ->
+   "non small cell lung carcinoma"), possessives, punctuation to spaces, then per token: roman numerals
+   after type/stage/grade/class, plural folding (KEEP_S lists words that only look plural), British
+   spellings (tumour, anaemia, oedema), and dropping generic words (disease, disorder, of, the) except
+   disease/disorder right after an organ ("Kidney Diseases" -> "kidney disease"). The result is the
+   canonical id, optionally replaced through the mapping file.
+ - canonical_condition is memoized (lru_cache); load_condition_map clears the cache.
+"""
+
+import re
+import csv
+import json
+import unicodedata
+from functools import lru_cache
+
+# --------------------------
+# Token rules
+# --------------------------
+NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+POSSESSIVE_RE = re.compile(r"(?<=[a-z])'s\b|(?<=s)'(?=\s|$)")
+ROMAN = {"i": "1", "ii": "2", "iii": "3", "iv": "4", "v": "5"}
+ROMAN_AFTER = frozenset(["type", "stage", "grade", "class", "phase", "level"])
+# generic words that do not distinguish one condition from another
+DROP_TOKENS = frozenset(["disease", "disorder", "of", "the", "a", "an"])
+# ...except disease/disorder right after an organ, where they are the qualifier ("kidney disease" is not "kidney")
+ORGAN_QUALIFIERS = frozenset(["disease", "disorder"])
+ORGAN_TOKENS = frozenset("""
+    kidney renal liver hepatic heart cardiac lung pulmonary airway bowel intestinal brain cerebrovascular bone
+    skin eye thyroid pancreas pancreatic gallbladder prostate breast stomach colon joint muscle nerve spine
+    blood artery arterial coronary vascular valve ear gum periodontal
+""".split())
+# words that end in "s" but are not plurals (including eponyms: Graves' disease)
+KEEP_S = frozenset("""
+    diabetes herpes measles mumps rabies scabies rickets shingles aids tetanus lupus sepsis pertussis
+    mellitus status graves bias pancreas caries ascites feces faeces menses series species facies
+""".split())
+# plurals of words ending in s/sh/x add "es": glasses, rashes, reflexes
+ES_PLURAL_ENDINGS = ("sses", "shes", "xes")
+
+CONDITION_MAP = {}     # canonical id -> canonical id (see load_condition_map)
+
+# --------------------------
+# Normalization
+# --------------------------
+def _fold(name):
+    s = name.strip()
+    if not s.isascii():
+        s = unicodedata.normalize("NFKD", s)
+        s = "".join(ch for ch in s if not unicodedata.combining(ch))
+        s = s.replace("’", "'").replace("‘", "'")
+    s = s.lower()
+    # MeSH inverts qualifiers: "Diabetes Mellitus, Type 2" is "Type 2 Diabetes Mellitus"
+    head, comma, tail = s.partition(",")
+    if comma and "," not in tail and tail.strip():
+        s = tail + " " + head
+    return POSSESSIVE_RE.sub("", s)
+
+def _token(tok, prev):
+    if prev in ROMAN_AFTER and tok in ROMAN:
+        return ROMAN[tok]
+    if len(tok) > 3 and tok.endswith("s") and tok not in KEEP_S and not tok.endswith(("ss", "us", "is")):
+        if tok.endswith("ies"):
+            tok = tok[:-3] + "y"
+        elif tok.endswith(ES_PLURAL_ENDINGS):
+            tok = tok[:-2]
+        else:
+            tok = tok[:-1]
+    if len(tok) > 4:
+        # British spellings: anaemia, leukaemia, oedema, oesophageal, tumour, behaviour
+        if tok.startswith("oe"):
+            tok = "e" + tok[2:]
+        if "ae" in tok[1:]:
+            tok = tok[0] + tok[1:].replace("ae", "e")
+        if tok.endswith("our"):
+            tok = tok[:-3] + "or"
+    return tok
+
+def condition_key(name):
+    """Normalized token key for a condition name, without the mapping file ("" for an empty name)."""
+    tokens = NON_ALNUM_RE.split(_fold(name))
+    out = []
+    prev = None
+    for tok in tokens:
+        if tok:
+            norm = _token(tok, prev)
+            out.append(norm)
+            prev = tok
+    kept = [t for i, t in enumerate(out)
+            if t not in DROP_TOKENS or (t in ORGAN_QUALIFIERS and i and out[i - 1] in ORGAN_TOKENS)]
+    return " ".join(kept or out)
+
+@lru_cache(maxsize=1 << 16)
+def canonical_condition(name):
+    """Raw condition name -> canonical condition id, or None for an empty name."""
+    if not name or not name.strip():
+        return None
+    key = condition_key(name)
+    return CONDITION_MAP.get(key, key) or None
+
+def load_condition_map(path=None):
+    """Install a mapping file (JSON object or two-column CSV/TSV; None clears it). Returns the table."""
+    global CONDITION_MAP
+    pairs = []
+    if path is not None:
+        path = str(path)
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            if path.endswith(".json"):
+                pairs = list(json.load(f).items())
+            else:
+                delimiter = "\t" if path.endswith((".tsv", ".txt")) else ","
+                pairs = [(row[0], row[1]) for row in csv.reader(f, delimiter=delimiter)
+                         if len(row) >= 2 and row[0].strip() and not row[0].startswith("#")]
+    table = {}
+    for alias, canonical in pairs:
+        target = condition_key(canonical)
+        if target:
+            table[condition_key(alias)] = target
+    CONDITION_MAP = table
+    canonical_condition.cache_clear()
+    return CONDITION_MAP
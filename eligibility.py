@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+eligibility.py
+
+Eligibility criteria parsing for ClinicalTrials.gov records, shared by pre_processing.py and usable on its own.
+
+    from eligibility import parse_criteria, add_constraints, eligibility_summary
+    parse_criteria("Inclusion Criteria:\n* Age >= 18\n  1. nested\nExclusion Criteria:\n- Pregnant")
+    parse_constraints("HbA1c > 7.0% and <= 10.5%")   # [{"measure": "hba1c", "lower": 7.0, "upper": 10.5, ...}]
+
+Standalone (reads the same JSONL / JSON array / .gz dumps as pre_processing.py):
+    python eligibility.py --input clinical_trials_dump.jsonl.gz --output eligibility_parsed.jsonl
+    python eligibility.py --input clinical_trials_dump.jsonl.gz --limit 100000    # throughput only
+
+Notes:
+ - Each block is scanned once with precompiled multiline regexes (one match per non-blank line) instead of
+   lowercasing the text and testing every line with string checks.
+ - Section headers: "Inclusion Criteria:", "Key Exclusion Criteria", "INCLUSION CRITERIA: text",
+   "* Inclusion Criteria:", ... Text before any header, or a block without headers, counts as inclusion
+   criteria.
+ - List markers (*, -, +, bullet characters, "1." "1)" "(1)", "a." "a)" "(a)", roman "iv.") are stripped
+   from the criterion text. Nesting comes from indentation: an item indented deeper than the item above
+   it is its child (level 1, 2, ...; parent = the parent's sequence). An unmarked, indented line directly
+   after an item continues that item's text.
+ - Numeric constraints: each criterion is scanned for known measures (age, HbA1c, BMI, eGFR, ALT, platelets,
+   ECOG, ... see MEASURES) followed by a comparator and value ("> 7.0%", "at least 18 years", "18 to 75",
+   "between 1.5 and 3 x ULN", "65 years or older"). A constraint is {measure, lower, lowerInclusive, upper,
+   upperInclusive, unit}; the value is kept in the unit written in the text.
+ - eligibility_summary folds one study into a compact record: sex and ages from the structured
+   eligibilityModule fields (falling back to the criteria text), criterion counts, and per-measure ranges
+   for inclusion (intersected) and exclusion (listed).
+"""
+
+import re
+import time
+import logging
+import argparse
+from pathlib import Path
+
+# --------------------------
+# Precompiled patterns
+# --------------------------
+_MARKER = (r"[*\-+•·▪◦o]"                          # bullets: * - + • · ▪ ◦ o
+           r"|\d{1,3}[.)]|[ivxIVX]{1,4}[.)]|[a-zA-Z][.)]"   # 1.  1)  iv.  a)
+           r"|\((?:\d{1,3}|[ivxIVX]{1,4}|[a-zA-Z])\)")      # (1)  (iv)  (a), behind a single "(" branch
+# one match per non-blank line: indent, optional list marker, text
+# (the greedy body already ends on the line's last non-space, so no "[ \t]*$" check is needed)
+LINE_RE = re.compile(r"^([ \t]*)(?:(" + _MARKER + r")[ \t]+)?(\S(?:[^\n]*\S)?)", re.M)
+# a header is short, or ends its qualifier with a colon ("Inclusion Criteria (cohort A): text")
+HEADER_RE = re.compile(
+    r"^[#*_\s]*(?:key\s+|main\s+|major\s+|general\s+|other\s+)?(inclusion|exclusion)\s+criteria\b"
+    r"(?:[^:\n]{0,60}:[*_\s]*(.*)|[^:\n]{0,30})$", re.I)
+AGE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(year|month|week|day|hour|minute)s?\s*$", re.I)
+AGE_UNIT_YEARS = {"year": 1.0, "month": 1 / 12, "week": 7 / 365.25, "day": 1 / 365.25,
+                  "hour": 1 / 8766, "minute": 1 / 525960}
+SEXES = {"ALL": "ALL", "FEMALE": "FEMALE", "MALE": "MALE"}
+
+# canonical measure -> aliases, matched from a word start; earlier entries win where aliases overlap (hba1c before hemoglobin)
+MEASURES = [
+    ("age", r"age[ds]?\b|years?\s+of\s+age(?:\s+(?:or|and)\s+(?:older|above|over))?|years?\s+old\b"
+            r"|years?\s+(?:or|and)\s+(?:older|above|over)\b"),
+    ("hba1c", r"hb\s*a1c\b|a1c\b|gly(?:c|cosyl)ated\s+ha?emoglobin\b"),
+    ("bmi", r"bmi\b|body\s+mass\s+index\b"),
+    ("creatinine_clearance", r"creatinine\s+clearance\b|cr?cl\b"),
+    ("egfr", r"e?gfr\b|glomerular\s+filtration\s+rate\b"),
+    ("creatinine", r"creatinine\b"),
+    ("alt", r"alt\b|sgpt\b|alanine\s+(?:amino)?transaminase\b|alanine\s+aminotransferase\b"),
+    ("ast", r"ast\b|sgot\b|aspartate\s+(?:amino)?transaminase\b|aspartate\s+aminotransferase\b"),
+    ("bilirubin", r"bilirubin\b"),
+    ("hemoglobin", r"ha?emoglobin\b|hgb\b|hb\b"),
+    ("platelets", r"platelets?\b|plt\b"),
+    ("anc", r"absolute\s+neutrophil\s+count\b|anc\b|neutrophils?\b"),
+    ("wbc", r"wbc\b|white\s+blood\s+cells?\b|leukocytes?\b"),
+    ("ldl", r"ldl(?:-c)?\b|low[-\s]density\s+lipoprotein\b"),
+    ("triglycerides", r"triglycerides?\b"),
+    ("glucose", r"glucose\b|fpg\b"),
+    ("systolic_bp", r"systolic\b|sbp\b"),
+    ("diastolic_bp", r"diastolic\b|dbp\b"),
+    ("ecog", r"ecog\b"),
+    ("karnofsky", r"karnofsky\b|kps\b"),
+    ("lvef", r"lvef\b|(?:left\s+ventricular\s+)?ejection\s+fraction\b"),
+    ("qtc", r"qtc[bf]?\b|qt\s+interval\b"),
+    ("psa", r"psa\b|prostate[-\s]specific\s+antigen\b"),
+    ("testosterone", r"testosterone\b"),
+    ("weight", r"body\s+weight\b|weigh(?:t|s|ing)\b"),
+    ("life_expectancy", r"life\s+expectancy\b"),
+]
+# first letters of the aliases above: positions that cannot start a measure are rejected before the
+# alternation is tried (it dominates the scan otherwise)
+MEASURE_HEADS = "abcdefghklnpqstwy"
+MEASURE_RE = re.compile(r"\b(?=[" + MEASURE_HEADS + r"])(?:"
+                        + "|".join(f"(?P<{name}>{alias})" for name, alias in MEASURES) + ")", re.I)
+DIGIT_RE = re.compile(r"\d")
+
+_NUM = r"(\d+(?:[.,]\d+)?)"
+_UNIT = (r"(?:[ \t]*("
+         r"%"
+         r"|(?:x|×|times)[ \t]*(?:the[ \t]+)?(?:ULN|LLN|(?:upper|lower)[ \t]+limits?[ \t]+of[ \t]+(?:the[ \t]+)?normal)"
+         r"|(?:x|×)[ \t]*10[ \t]*\^?[ \t]*\d+[ \t]*/[ \t]*(?:l|µl|μl|ul|mm3|mm³)\b"
+         r"|(?:years?|yrs?|months?|weeks?|wks?|days?)\b"
+         r"|(?!and/|or/)[a-zµμ]{1,5}(?:/[a-zµμ0-9.²³]{1,8}){1,2}|/[ \t]*(?:mm3|mm³|µl|μl|ul|l)\b"
+         r"|(?:kg|mmhg|msec|ms|bpm|cm|lbs?|mg|g|points?)\b"
+         r"))?")
+_CMP = (r"(?:(?P<ge>>=|≥|=>|>[ \t]*or[ \t]*=|(?:greater|more|higher|older)[ \t]+than[ \t]+or[ \t]+equal[ \t]+to"
+        r"|equal[ \t]+to[ \t]+or[ \t]+(?:greater|more|higher)[ \t]+than|at[ \t]+least|no[t]?[ \t]+(?:less|lower|younger)[ \t]+than"
+        r"|minimum(?:[ \t]+of)?)"
+        r"|(?P<le><=|≤|=<|<[ \t]*or[ \t]*=|(?:less|lower|younger)[ \t]+than[ \t]+or[ \t]+equal[ \t]+to"
+        r"|equal[ \t]+to[ \t]+or[ \t]+(?:less|lower)[ \t]+than|at[ \t]+most|no[t]?[ \t]+(?:more|greater|higher|older)[ \t]+than"
+        r"|not[ \t]+(?:to[ \t]+)?exceed(?:ing)?|up[ \t]+to|maximum(?:[ \t]+of)?)"
+        r"|(?P<gt>>|(?:greater|more|higher|older)[ \t]+than|above|over|exceeding|exceeds|in[ \t]+excess[ \t]+of)"
+        r"|(?P<lt><|(?:less|lower|younger)[ \t]+than|below|under)"
+        r"|(?P<eq>=|equal[ \t]+to))")
+# comparator / range phrases after (or, for "65 years or older", before) a measure
+BOUND_RE = re.compile(
+    r"(?=[\d<>=≥≤abeghilmnouy])(?:between[ \t]+" + _NUM + _UNIT + r"[ \t]*(?:and|to|-|–)[ \t]*" + _NUM + _UNIT
+    + r"|" + _CMP + r"[ \t]*" + _NUM + _UNIT
+    + r"|" + _NUM + _UNIT + r"(?:[ \t]+of[ \t]+age)?[ \t]+(?:or|and)[ \t]+(?:(older|more|greater|higher|above|over)|(younger|less|lower|below|under))\b"
+    + r"|" + _NUM + _UNIT + r"[ \t]*(?:-|–|to)[ \t]*" + _NUM + _UNIT + ")", re.I)
+BOUND_WINDOW = 120       # characters scanned after a measure name
+BOUND_LOOKBEHIND = 40    # ... and before it, when nothing follows ("18 years of age or older")
+BOUND_LEAD = 40          # longest comparator phrase before a number ("greater than or equal to")
+# only a list separator between two measures: "ALT and AST <= 2.5 x ULN" bounds both
+SHARED_BOUND_RE = re.compile(r"[\s,/&]*(?:(?:and|or)[\s,/&]*)?$", re.I)
+
+_SEX_TERM = r"(males?|females?|men|women|boys|girls)"
+SEX_RE = re.compile(
+    r"(?:(?:healthy|adult|ambulatory|post-?menopausal|pre-?menopausal|non-?pregnant)[ \t]+)*" + _SEX_TERM
+    + r"(?:[ \t]*(?:or|and|/|&)[ \t]*" + _SEX_TERM + r")?"
+    + r"(?:[ \t]+(?:patients|subjects|participants|volunteers|only))*[ \t]*(?:[,.;:(]|aged?\b|between\b|\d|$)", re.I)
+SEX_OF_TERM = {"male": "MALE", "males": "MALE", "men": "MALE", "boys": "MALE",
+               "female": "FEMALE", "females": "FEMALE", "women": "FEMALE", "girls": "FEMALE"}
+
+# typed per-criterion fields filled from its first constraint (see add_constraints)
+CONSTRAINT_FIELDS = ("measure", "lower", "lowerInclusive", "upper", "upperInclusive", "unit")
+
+INCLUSION = ("IN", "INCLUSION")
+EXCLUSION = ("EX", "EXCLUSION")
+
+# --------------------------
+# Criteria text
+# --------------------------
+def parse_criteria(text):
+    """
+    Split an eligibilityCriteria block into criterion dicts, inclusion first:
+      {"tag": "IN"|"EX", "type": "INCLUSION"|"EXCLUSION", "text", "sequence", "level", "parent"}
+    sequence numbers criteria per type from 0; parent is the sequence of the enclosing item, or None.
+    """
+    if not text:
+        return []
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    groups = {"IN": [], "EX": []}
+    tag, kind = INCLUSION
+    items = groups["IN"]
+    widths = []       # indents of the open ancestors of the next item ...
+    parents = []      # ... and their sequences
+    last = None       # last item in the current section, for continuation lines
+    header_match = HEADER_RE.match
+    for indent, marker, body in LINE_RE.findall(text):
+        # only a line naming criteria can be a header ("Criteria", "criteria", "CRITERIA"); the substring
+        # test is far cheaper than HEADER_RE. Headers can carry a list marker ("* Inclusion Criteria:").
+        h = header_match(body) if "riteria" in body or "RITERIA" in body else None
+        if h is not None:
+            tag, kind = INCLUSION if h.group(1).lower() == "inclusion" else EXCLUSION
+            items = groups[tag]
+            widths = []
+            parents = []
+            last = None
+            body = h.group(2)
+            if not body:
+                continue
+            indent = ""
+        elif not marker and indent and last is not None:
+            last["text"] += " " + body
+            continue
+        width = len(indent.expandtabs(4)) if "\t" in indent else len(indent)
+        while widths and widths[-1] >= width:
+            widths.pop()
+            parents.pop()
+        sequence = len(items)
+        last = {"tag": tag, "type": kind, "text": body, "sequence": sequence,
+                "level": len(widths), "parent": parents[-1] if parents else None}
+        items.append(last)
+        widths.append(width)
+        parents.append(sequence)
+    return groups["IN"] + groups["EX"]
+
+# --------------------------
+# Structured fields (age / sex)
+# --------------------------
+def parse_age(value):
+    """ "18 Years" / "6 Months" / "28 Days" -> age in years (float), None when missing or unparseable."""
+    if not value:
+        return None
+    m = AGE_RE.match(value)
+    if m is None:
+        return None
+    return round(float(m.group(1)) * AGE_UNIT_YEARS[m.group(2).lower()], 4)
+
+# --------------------------
+# Numeric constraints
+# --------------------------
+def _number(text):
+    # "1,500" is a thousands separator, "7,5" a decimal comma
+    if "," in text:
+        head, _, tail = text.partition(",")
+        text = head + tail if len(tail) == 3 else head + "." + tail
+    return float(text)
+
+def _bounds(window, last=False):
+    """Apply the comparator/range phrases in window -> [lower, lowerInclusive, upper, upperInclusive, unit]."""
+    b = [None, None, None, None, None]
+    d = DIGIT_RE.search(window)
+    if d is None:
+        return b
+    # a phrase starts at most a comparator's length before its first number
+    hits = list(BOUND_RE.finditer(window, max(0, d.start() - BOUND_LEAD)))
+    if last:
+        hits.reverse()
+    for m in hits:
+        g = m.groups()
+        if g[0] is not None:                            # between A and B
+            lo, hi, unit = (g[0], True), (g[2], True), g[1] or g[3]
+        elif g[9] is not None:                          # comparator value
+            unit = g[10]
+            ge, le, gt, _, eq = g[4:9]
+            if eq is not None:
+                lo = hi = (g[9], True)
+            elif ge is not None or gt is not None:
+                lo, hi = (g[9], ge is not None), None
+            else:
+                lo, hi = None, (g[9], le is not None)
+        elif g[11] is not None:                         # value or older / or less
+            unit = g[12]
+            lo, hi = ((g[11], True), None) if g[13] else (None, (g[11], True))
+        else:                                           # A to B / A-B
+            lo, hi, unit = (g[15], True), (g[17], True), g[16] or g[18]
+        if lo is not None and b[0] is None:
+            b[0], b[1] = _number(lo[0]), lo[1]
+        if hi is not None and b[2] is None:
+            b[2], b[3] = _number(hi[0]), hi[1]
+        if unit and b[4] is None:
+            b[4] = " ".join(unit.split())
+        if b[0] is not None and b[2] is not None:
+            break
+    return b
+
+def parse_constraints(text):
+    """
+    Criterion text -> [{"measure", "lower", "lowerInclusive", "upper", "upperInclusive", "unit"}], one per
+    measure mention that has a bound; a missing side is None.
+    """
+    if not text or DIGIT_RE.search(text) is None:
+        return []
+    found = list(MEASURE_RE.finditer(text))
+    constraints = []
+    for i, m in enumerate(found):
+        j = i
+        while j + 1 < len(found) and SHARED_BOUND_RE.match(text, found[j].end(), found[j + 1].start()):
+            j += 1
+        end = found[j].end()
+        stop = found[j + 1].start() if j + 1 < len(found) else len(text)
+        b = _bounds(text[end:min(stop, end + BOUND_WINDOW)])
+        if b[0] is None and b[2] is None:
+            start = found[i - 1].end() if i else 0
+            b = _bounds(text[max(start, m.start() - BOUND_LOOKBEHIND):m.end()], last=True)
+            if b[0] is None and b[2] is None:
+                continue
+        constraints.append({"measure": m.lastgroup, "lower": b[0], "lowerInclusive": b[1],
+                            "upper": b[2], "upperInclusive": b[3], "unit": b[4]})
+    return constraints
+
+def criterion_sex(text):
+    """ "Male or female" -> ALL, "Women aged 40-75" -> FEMALE; None unless the criterion starts with a sex."""
+    m = SEX_RE.match(text or "")
+    if m is None:
+        return None
+    sexes = {SEX_OF_TERM[t.lower()] for t in m.groups() if t}
+    return sexes.pop() if len(sexes) == 1 else "ALL"
+
+def add_constraints(criteria):
+    """
+    Give each parse_criteria item its constraints list, the typed fields of its first constraint
+    (CONSTRAINT_FIELDS, None when it has none) and sex. Items are updated in place and returned.
+    """
+    empty = dict.fromkeys(CONSTRAINT_FIELDS)
+    for item in criteria:
+        constraints = parse_constraints(item["text"])
+        item.update(constraints[0] if constraints else empty)
+        item["constraints"] = constraints
+        item["sex"] = criterion_sex(item["text"])
+    return criteria
+
+def structured_criteria(text):
+    """parse_criteria + add_constraints: the criteria rows and eligibility_summary input for one block."""
+    if not text:
+        return []
+    return add_constraints(parse_criteria(text))
+
+# --------------------------
+# Per-study summary
+# --------------------------
+def _intersect(current, c):
+    """Narrow an inclusion range by constraint c (same unit only)."""
+    if current.get("unit") != c["unit"]:
+        return
+    if c["lower"] is not None and ("min" not in current or c["lower"] > current["min"]
+                                   or (c["lower"] == current["min"] and not c["lowerInclusive"])):
+        current["min"], current["minInclusive"] = c["lower"], c["lowerInclusive"]
+    if c["upper"] is not None and ("max" not in current or c["upper"] < current["max"]
+                                   or (c["upper"] == current["max"] and not c["upperInclusive"])):
+        current["max"], current["maxInclusive"] = c["upper"], c["upperInclusive"]
+
+def _range(c):
+    r = {"unit": c["unit"]}
+    if c["lower"] is not None:
+        r["min"], r["minInclusive"] = c["lower"], c["lowerInclusive"]
+    if c["upper"] is not None:
+        r["max"], r["maxInclusive"] = c["upper"], c["upperInclusive"]
+    return r
+
+def _age_years(value, unit):
+    if value is None:
+        return None
+    key = (unit or "years").lower().rstrip("s")
+    key = {"yr": "year", "wk": "week"}.get(key, key)
+    return round(value * AGE_UNIT_YEARS.get(key, 1.0), 4)
+
+def eligibility_summary(module, criteria=None):
+    """
+    eligibilityModule -> one compact record per study:
+      {"sex", "minimumAgeYears", "maximumAgeYears", "healthyVolunteers", "stdAges",
+       "inclusionCount", "exclusionCount", "include": {measure: range}, "exclude": {measure: [range, ...]}}
+    A range is {"unit", "min", "minInclusive", "max", "maxInclusive"} without the missing sides. Sex and
+    ages come from the structured fields, falling back to the inclusion criteria text.
+    """
+    module = module or {}
+    if criteria is None:
+        criteria = structured_criteria(module.get("eligibilityCriteria"))
+    include = {}
+    exclude = {}
+    text_sex = None
+    n_inc = 0
+    for item in criteria:
+        if item["tag"] == "IN":
+            n_inc += 1
+            text_sex = text_sex or item["sex"]
+            for c in item["constraints"]:
+                if c["measure"] in include:
+                    _intersect(include[c["measure"]], c)
+                else:
+                    include[c["measure"]] = _range(c)
+        else:
+            for c in item["constraints"]:
+                exclude.setdefault(c["measure"], []).append(_range(c))
+    age = include.get("age", {})
+    min_age = parse_age(module.get("minimumAge"))
+    max_age = parse_age(module.get("maximumAge"))
+    return {
+        "sex": SEXES.get((module.get("sex") or "").upper()) or text_sex,
+        "minimumAgeYears": min_age if min_age is not None else _age_years(age.get("min"), age.get("unit")),
+        "maximumAgeYears": max_age if max_age is not None else _age_years(age.get("max"), age.get("unit")),
+        "healthyVolunteers": module.get("healthyVolunteers"),
+        "stdAges": module.get("stdAges") or [],
+        "inclusionCount": n_inc,
+        "exclusionCount": len(criteria) - n_inc,
+        "include": include,
+        "exclude": exclude,
+    }
+
+# --------------------------
+# CLI (standalone stage / throughput check)
+# --------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Parse eligibility criteria from a ClinicalTrials dump")
+    parser.add_argument("--input", "-i", type=str, required=True, help="Input JSONL / JSON array file (optionally .gz)")
+    parser.add_argument("--output", "-o", type=str, default=None,
+                        help="Write one {nctId, eligibility, criteria} JSON line per study (default: only report throughput)")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after N criteria blocks")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Blocks parsed per batch")
+    args = parser.parse_args()
+    # reuse the ETL's input reader and codec; imported here because pre_processing imports this module
+    import pre_processing as pp
+
+    modules = []
+    nct_ids = []
+    blocks = 0
+    criteria = 0
+    parse_seconds = 0.0
+    out = open(args.output, "wb") if args.output else None
+
+    def flush():
+        nonlocal criteria, parse_seconds
+        t0 = time.perf_counter()
+        parsed = [add_constraints(parse_criteria(m.get("eligibilityCriteria"))) for m in modules]
+        parse_seconds += time.perf_counter() - t0
+        criteria += sum(len(p) for p in parsed)
+        if out is not None:
+            for nct, module, crits in zip(nct_ids, modules, parsed):
+                out.write(pp.CODEC.dumps_line({"nctId": nct, "eligibility": eligibility_summary(module, crits),
+                                               "criteria": crits}))
+        modules.clear()
+        nct_ids.clear()
+
+    inp = pp.InputStream(Path(args.input))
+    try:
+        for _, raw in inp.records():
+            try:
+                js = pp.CODEC.loads(raw) if isinstance(raw, (bytes, str)) else raw
+            except ValueError:
+                continue
+            ps = js.get("protocolSection") or {}
+            module = ps.get("eligibilityModule") or {}
+            if not module.get("eligibilityCriteria"):
+                continue
+            modules.append(module)
+            nct_ids.append((ps.get("identificationModule") or {}).get("nctId"))
+            blocks += 1
+            if len(modules) >= args.batch_size:
+                flush()
+            if args.limit and blocks >= args.limit:
+                break
+        if modules:
+            flush()
+    finally:
+        inp.close()
+        if out is not None:
+            out.close()
+    rate = blocks / parse_seconds if parse_seconds else 0.0
+    logging.info(f"Parsed {blocks} criteria blocks into {criteria} criteria in {parse_seconds:.2f}s "
+                 f"({rate:.0f} blocks/s, parsing only)")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from neo4j import GraphDatabase
 import pandas as pd
 import os
+import json
 import math
 import time
 
@@ -19,25 +19,200 @@ REQUIRED_KEYS = {
     "Interventions": ["intervention_name", "nct_id"],
     "Arms": ["id", "nct_id"],
     "Locations": ["id", "nct_id"],
+    "Sites": ["site_id"],
+    "Site links": ["site_id", "nct_id"],
     "Outcomes": ["measure", "nct_id"],
-    "AdverseEvents": ["nct_id"]
+    "AdverseEvents": ["nct_id"],
+    "Eligibility": ["nct_id"]
 }
 
 # =============================
 # Connect
 # =============================
 
-driver = GraphDatabase.driver(
-    NEO4J_URI,
-    auth=(NEO4J_USER, NEO4J_PASSWORD)
-)
+# Opened by the first query, so the table readers below work without the driver or a server
+driver = None
 
 
 def run_query(query, parameters=None):
+    global driver
+    if driver is None:
+        from neo4j import GraphDatabase
+        driver = GraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USER, NEO4J_PASSWORD)
+        )
     with driver.session() as session:
         session.run(query, parameters or {})
 
 
+def table_paths(name):
+    """
+    Files holding table <name>: one per shard when DATA_DIR/shards.json exists (pre_processing --shards),
+    otherwise the single Parquet, Arrow, JSONL (optionally .gz/.zst) or CSV file. Shards can be loaded
+    independently.
+    """
+    manifest_path = os.path.join(DATA_DIR, "shards.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            parts = json.load(f)["files"].get(name + ".jsonl")
+        if parts:
+            return [os.path.join(DATA_DIR, p["path"]) for p in parts]
+    base = os.path.join(DATA_DIR, name)
+    for ext in (".parquet", ".arrow", ".jsonl", ".jsonl.gz", ".jsonl.zst"):
+        if os.path.exists(base + ext):
+            return [base + ext]
+    return [base + ".csv"]
+
+
+def table_exists(name):
+    return all(os.path.exists(p) for p in table_paths(name))
+
+
+def read_one(path):
+    # Parquet/Arrow staging is typed, no text parsing
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".arrow"):
+        return pd.read_feather(path)
+    if path.endswith((".jsonl", ".jsonl.gz", ".jsonl.zst")):
+        # compression is inferred from the suffix
+        return pd.read_json(path, lines=True)
+    return pd.read_csv(path)
+
+
+def read_files(name):
+    paths = table_paths(name)
+    if len(paths) == 1:
+        return read_one(paths[0])
+    return pd.concat([read_one(p) for p in paths], ignore_index=True)
+
+
+def read_table(name):
+    """
+    Table <name> as the loaders expect it. Older kg_output exports hold these tables as they are; a
+    pre_processing staging directory (it has a trials table) is mapped by STAGING_TABLES.
+    """
+    if name in STAGING_TABLES and table_exists("trials"):
+        return STAGING_TABLES[name]()
+    return read_files(name)
+
+
+# =============================
+# pre_processing staging -> loader tables
+# =============================
+
+def staging_columns(name, columns):
+    # an empty JSONL file reads as a frame without columns
+    return read_files(name).reindex(columns=columns)
+
+
+def name_key(values):
+    # organizations / interventions are deduplicated on the stripped, lowercased name
+    return values.astype(object).str.strip().str.lower()
+
+
+def joined(values):
+    # phases is a list in staging (an array from Parquet/Arrow); older exports stored "PHASE1;PHASE2"
+    if values is None or isinstance(values, float):
+        return None
+    return ";".join(str(v) for v in values) or None
+
+
+def staging_studies():
+    df = staging_columns("trials", [
+        "nctId", "briefTitle", "officialTitle", "overallStatus", "startDate", "completionDate",
+        "studyType", "phases", "enrollmentCount", "allocation", "masking", "hasResults",
+    ])
+    df["phases"] = df["phases"].apply(joined)
+    return df.rename(columns={
+        "nctId": "nct_id",
+        "briefTitle": "brief_title",
+        "officialTitle": "official_title",
+        "overallStatus": "overall_status",
+        "startDate": "start_date",
+        "completionDate": "completion_date",
+        "studyType": "study_type",
+        "enrollmentCount": "enrollment",
+        "hasResults": "has_results",
+    })
+
+
+def staging_sponsors():
+    edges = staging_columns("trial_sponsoredby_rel", ["from_nct", "org_name"])
+    orgs = staging_columns("organizations", ["name", "class"])
+    edges["key"] = name_key(edges["org_name"])
+    orgs["key"] = name_key(orgs["name"])
+    df = edges.merge(orgs.drop_duplicates("key"), on="key", how="left")
+    return pd.DataFrame({
+        "nct_id": df["from_nct"],
+        "lead_sponsor": df["name"].astype(object).fillna(df["org_name"]),
+        "lead_sponsor_class": df["class"],
+    })
+
+
+def staging_conditions():
+    df = staging_columns("trial_studies_rel", ["from_nct", "condition_name", "canonicalId"])
+    return df.rename(columns={"from_nct": "nct_id", "condition_name": "condition", "canonicalId": "canonical_id"})
+
+
+def staging_interventions():
+    edges = staging_columns("trial_uses_intervention_rel", ["from_nct", "intervention_name", "canonicalId"])
+    nodes = staging_columns("interventions", ["name", "type", "description", "role"])
+    edges["key"] = name_key(edges["intervention_name"])
+    nodes["key"] = name_key(nodes["name"])
+    df = edges.merge(nodes.drop_duplicates("key"), on="key", how="left")
+    return pd.DataFrame({
+        "nct_id": df["from_nct"],
+        "intervention_name": df["intervention_name"],
+        "intervention_type": df["type"],
+        "description": df["description"],
+        "role": df["role"],
+        "canonical_id": df["canonicalId"],
+    })
+
+
+def staging_arms():
+    df = staging_columns("arms", ["nctId", "label", "type", "description"])
+    return df.rename(columns={"nctId": "nct_id", "label": "arm_label", "type": "arm_type",
+                              "description": "arm_description"})
+
+
+def staging_outcomes():
+    # staging does not record primary/secondary, so type stays empty
+    df = staging_columns("outcomes", ["nctId", "measure", "timeFrame", "type"])
+    return df.rename(columns={"nctId": "nct_id", "timeFrame": "timeframe"})
+
+
+def staging_adverse_events():
+    # adverse_events holds event group rows and event rows; only events have a term
+    events = staging_columns("adverse_events", ["adEventId", "term", "nctId"])
+    events = events[events["term"].notnull()]
+    stats = staging_columns("adverseevent_has_stat_rel", ["adEventId", "numAffected", "numAtRisk"])
+    for col in ("numAffected", "numAtRisk"):
+        stats[col] = pd.to_numeric(stats[col], errors="coerce")
+    totals = stats.groupby("adEventId", as_index=False)[["numAffected", "numAtRisk"]].sum(min_count=1)
+    df = events.merge(totals, on="adEventId", how="left")
+    return pd.DataFrame({
+        "nct_id": df["nctId"],
+        "event_term": df["term"],
+        "num_affected": df["numAffected"],
+        "num_at_risk": df["numAtRisk"],
+    })
+
+
+# loader table -> builder over pre_processing staging tables
+STAGING_TABLES = {
+    "studies": staging_studies,
+    "sponsors": staging_sponsors,
+    "conditions": staging_conditions,
+    "interventions": staging_interventions,
+    "arms": staging_arms,
+    "outcomes": staging_outcomes,
+    "adverse_events": staging_adverse_events,
+}
+
+
 # =============================
 # Utility: Batch Loader
 # =============================
@@ -61,8 +236,9 @@ def batch_loader(df, query, label):
 
         batch_df = df.iloc[start:end].copy()
 
-        # Convert NaN → None
-        batch_df = batch_df.where(pd.notnull(batch_df), None)
+        # Dictionary-encoded Parquet/Arrow columns arrive as categoricals; decode per batch
+        for col in batch_df.columns[batch_df.dtypes == "category"]:
+            batch_df[col] = batch_df[col].astype(object)
 
         # Strip whitespace from string columns
         for col in batch_df.columns:
@@ -71,6 +247,9 @@ def batch_loader(df, query, label):
                     lambda x: x.strip() if isinstance(x, str) else x
                 )
 
+        # Convert NaN → None (last: float columns keep NaN unless made object, and apply re-infers dtypes)
+        batch_df = batch_df.astype(object).where(pd.notnull(batch_df), None)
+
         # Drop rows missing required merge keys
         for col in required:
             batch_df = batch_df[batch_df[col].notnull()]
@@ -101,6 +280,10 @@ def create_constraints():
         "CREATE CONSTRAINT sponsor_name IF NOT EXISTS FOR (sp:Sponsor) REQUIRE sp.name IS UNIQUE",
         "CREATE CONSTRAINT location_id IF NOT EXISTS FOR (l:Location) REQUIRE l.id IS UNIQUE",
         "CREATE CONSTRAINT arm_id IF NOT EXISTS FOR (a:Arm) REQUIRE a.id IS UNIQUE",
+        # range indexes for numeric eligibility filters (load_eligibility)
+        "CREATE INDEX study_min_age IF NOT EXISTS FOR (s:Study) ON (s.min_age_years)",
+        "CREATE INDEX study_max_age IF NOT EXISTS FOR (s:Study) ON (s.max_age_years)",
+        "CREATE INDEX study_sex IF NOT EXISTS FOR (s:Study) ON (s.sex)",
     ]
 
     for q in queries:
@@ -114,7 +297,7 @@ def create_constraints():
 # =============================
 
 def load_studies():
-    df = pd.read_csv(os.path.join(DATA_DIR, "studies.csv"))
+    df = read_table("studies")
 
     query = """
     UNWIND $rows AS row
@@ -125,8 +308,40 @@ def load_studies():
     batch_loader(df, query, "Studies")
 
 
+def load_eligibility():
+    df = read_table("eligibility_summary")
+    df = df.rename(columns={
+        "nctId": "nct_id",
+        "minimumAgeYears": "min_age_years",
+        "maximumAgeYears": "max_age_years",
+        "healthyVolunteers": "healthy_volunteers",
+    })
+
+    # Inclusion ranges become flat numeric Study properties (incl_hba1c_min, incl_egfr_max, ...)
+    # so Cypher can compare them directly; Parquet/Arrow staging stores them as a JSON string
+    ranges = df["include"].apply(lambda v: json.loads(v) if isinstance(v, str) else (v or {}))
+    flat = pd.DataFrame(
+        [{f"incl_{measure}_{side}": r[side]
+          for measure, r in include.items() for side in ("min", "max") if side in r}
+         for include in ranges],
+        index=df.index,
+    )
+    df = pd.concat(
+        [df[["nct_id", "sex", "min_age_years", "max_age_years", "healthy_volunteers"]], flat],
+        axis=1,
+    )
+
+    query = """
+    UNWIND $rows AS row
+    MATCH (s:Study {nct_id: row.nct_id})
+    SET s += row
+    """
+
+    batch_loader(df, query, "Eligibility")
+
+
 def load_sponsors():
-    df = pd.read_csv(os.path.join(DATA_DIR, "sponsors.csv"))
+    df = read_table("sponsors")
 
     query = """
     UNWIND $rows AS row
@@ -141,11 +356,15 @@ def load_sponsors():
 
 
 def load_conditions():
-    df = pd.read_csv(os.path.join(DATA_DIR, "conditions.csv"))
+    df = read_table("conditions")
 
+    # One node per canonical id (pre_processing canonicalId) when present; the raw spellings are kept as aliases
     query = """
     UNWIND $rows AS row
-    MERGE (c:Condition {name: row.condition})
+    MERGE (c:Condition {name: coalesce(row.canonical_id, row.condition)})
+    SET c.aliases = CASE WHEN row.condition IN coalesce(c.aliases, [])
+                         THEN c.aliases
+                         ELSE coalesce(c.aliases, []) + row.condition END
     WITH c, row
     MATCH (s:Study {nct_id: row.nct_id})
     MERGE (s)-[:STUDIES]->(c)
@@ -155,13 +374,18 @@ def load_conditions():
 
 
 def load_interventions():
-    df = pd.read_csv(os.path.join(DATA_DIR, "interventions.csv"))
+    df = read_table("interventions")
 
+    # One node per canonical id (pre_processing canonicalId) when present; the raw names are kept as aliases
     query = """
     UNWIND $rows AS row
-    MERGE (i:Intervention {name: row.intervention_name})
+    MERGE (i:Intervention {name: coalesce(row.canonical_id, row.intervention_name)})
     SET i.type = row.intervention_type,
-        i.description = row.description
+        i.description = row.description,
+        i.role = row.role,
+        i.aliases = CASE WHEN row.intervention_name IN coalesce(i.aliases, [])
+                         THEN i.aliases
+                         ELSE coalesce(i.aliases, []) + row.intervention_name END
     WITH i, row
     MATCH (s:Study {nct_id: row.nct_id})
     MERGE (s)-[:USES_INTERVENTION]->(i)
@@ -171,7 +395,7 @@ def load_interventions():
 
 
 def load_arms():
-    df = pd.read_csv(os.path.join(DATA_DIR, "arms.csv"))
+    df = read_table("arms")
     df["id"] = df["nct_id"] + "_" + df["arm_label"].astype(str)
 
     query = """
@@ -189,7 +413,7 @@ def load_arms():
 
 
 def load_locations():
-    df = pd.read_csv(os.path.join(DATA_DIR, "locations.csv"))
+    df = read_table("locations")
     df["id"] = df["nct_id"] + "_" + df["facility"].astype(str)
 
     query = """
@@ -197,6 +421,8 @@ def load_locations():
     MERGE (l:Location {id: row.id})
     SET l.facility = row.facility,
         l.city = row.city,
+        l.state = row.state,
+        l.zip = row.zip,
         l.country = row.country,
         l.lat = row.lat,
         l.lon = row.lon
@@ -208,8 +434,41 @@ def load_locations():
     batch_loader(df, query, "Locations")
 
 
+def load_sites():
+    # pre_processing staging: one row per physical site (stable siteId), trial links in trial_has_site_rel
+    df = read_table("sites")
+    df = df.rename(columns={"siteId": "site_id", "latitude": "lat", "longitude": "lon"})
+
+    query = """
+    UNWIND $rows AS row
+    MERGE (l:Location {id: row.site_id})
+    SET l.facility = row.facility,
+        l.city = row.city,
+        l.state = row.state,
+        l.zip = row.zip,
+        l.country = row.country,
+        l.lat = row.lat,
+        l.lon = row.lon
+    """
+
+    batch_loader(df, query, "Sites")
+
+    edges = read_table("trial_has_site_rel")
+    edges = edges.rename(columns={"from_nct": "nct_id", "siteId": "site_id"})
+
+    query = """
+    UNWIND $rows AS row
+    MATCH (s:Study {nct_id: row.nct_id})
+    MATCH (l:Location {id: row.site_id})
+    MERGE (s)-[r:CONDUCTED_AT]->(l)
+    SET r.status = row.status
+    """
+
+    batch_loader(edges, query, "Site links")
+
+
 def load_outcomes():
-    df = pd.read_csv(os.path.join(DATA_DIR, "outcomes.csv"))
+    df = read_table("outcomes")
 
     query = """
     UNWIND $rows AS row
@@ -225,7 +484,7 @@ def load_outcomes():
 
 
 def load_adverse_events():
-    df = pd.read_csv(os.path.join(DATA_DIR, "adverse_events.csv"))
+    df = read_table("adverse_events")
 
     query = """
     UNWIND $rows AS row
@@ -246,8 +505,7 @@ def load_adverse_events():
 # MAIN
 # =============================
 
-if __name__ == "__main__":
-
+def main():
     print("\n=========================================")
     print("Starting ClinicalTrials KG Construction")
     print("=========================================")
@@ -256,14 +514,24 @@ if __name__ == "__main__":
 
     create_constraints()
     load_studies()
+    # staging written before eligibility_summary existed (or with --skip eligibility) has no summary table
+    if table_exists("eligibility_summary"):
+        load_eligibility()
+    else:
+        print("\nNo eligibility_summary table, skipping Eligibility.")
     load_sponsors()
     load_conditions()
     load_interventions()
     load_arms()
-    load_locations()
+    # pre_processing staging has deduplicated sites; older exports have one location row per trial
+    if table_exists("sites"):
+        load_sites()
+    else:
+        load_locations()
     load_outcomes()
 
-    driver.close()
+    if driver is not None:
+        driver.close()
 
     total_time = time.time() - total_start
 
@@ -271,3 +539,7 @@ if __name__ == "__main__":
     print("Knowledge Graph Successfully Built")
     print(f"Total execution time: {total_time:.2f} seconds")
     print("=========================================")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+interventions.py
+
+Intervention name canonicalization for ClinicalTrials.gov records, shared by pre_processing.py and usable on its own.
+
+    from interventions import canonical_intervention, load_synonyms
+    canonical_intervention("Drug: Semaglutide 1 mg s.c. once weekly")   # {"id": "semaglutide", "role": "active"}
+    canonical_intervention("Placebo (semaglutide)")                     # {"id": "placebo", "role": "placebo"}
+
+Build a synonym table from otherNames (then pass it to pre_processing.py --intervention-synonyms):
+    python interventions.py --input clinical_trials_dump.jsonl.gz --output intervention_synonyms.json
+
+Notes:
+ - Pipeline: intervention type prefix ("Drug:", "Biological:", ...), case/accent/punctuation folding,
+   control detection (placebo, sham, standard of care, no intervention), removal of parentheticals,
+   dosages ("1 mg", "0.5mg/kg", "10^6 cells"), routes, dosage forms and schedules, then the synonym table.
+ - Control arms collapse to one id per kind ("placebo", "sham", "standard of care", "no intervention") and
+   carry that kind as role; everything else has role "active".
+ - canonical_intervention is memoized (lru_cache), so a name that recurs across studies is normalized
+   once per process; load_synonyms clears the cache.
+ - The synonym table maps canonical keys to canonical keys. build_synonyms groups a name with its
+   otherNames (union-find over every study) and picks, per group, the key used most often as an
+   intervention name. An otherName listed under several distinct names is generic ("chemotherapy") and
+   never links them. The table is built up front rather than during extraction so ids do not depend on
+   input order or on which worker saw a record.
+"""
+
+import re
+import json
+import argparse
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+# --------------------------
+# Precompiled patterns
+# --------------------------
+TYPE_PREFIX_RE = re.compile(
+    r"^\s*(?:drug|device|biological|biologic|procedure|procedure/surgery|radiation|behavioral|genetic"
+    r"|dietary\s+supplement|combination\s+product|diagnostic\s+test|other)\s*:\s*", re.I)
+# folded (lowercase, ascii) name -> control role; checked before anything is stripped
+CONTROL_PATTERNS = [
+    ("placebo", re.compile(r"^(?:(?:matching|matched|identical|inactive|oral|saline)\s+)*(?:placebos?|dummy|vehicle"
+                           r"|sugar\s+pill)\b|^(?:normal\s+)?saline(?:\s+solution)?$|^placebo")),
+    ("sham", re.compile(r"^sham\b")),
+    ("standard of care", re.compile(r"^(?:(?:usual|standard|routine|conventional)\s+(?:of\s+)?(?:care|treatment|therapy)"
+                                    r"|standard[\s-]of[\s-]care|best\s+supportive\s+care|soc)\b")),
+    ("no intervention", re.compile(r"^(?:no\s+(?:intervention|treatment)|wait[\s-]?list|watchful\s+waiting)\b")),
+]
+PAREN_RE = re.compile(r"\([^()]*\)|\[[^\[\]]*\]")
+DOSE_RE = re.compile(
+    r"\b\d+(?:[.,]\d+)?(?:\^\d+)?(?:\s*(?:-|to)\s*\d+(?:[.,]\d+)?)?\s*"
+    r"(?:mg|mcg|ug|µg|μg|g|ng|ml|l|iu|units?|u|%|mmol|meq|cells|vp|pfu|gy|x\s*10\^?\d+(?:\s*cells)?)"
+    r"(?:\s*/\s*(?:kg|m2|m²|ml|day|d|dose|week|wk|h|hr|l))*(?!\w)")
+# routes, dosage forms and schedules: dropped wherever they appear as a whole token
+FORM_WORDS = frozenset("""
+    tablet tablets tab tabs capsule capsules cap caps pill pills injection injections injectable oral orally
+    iv intravenous intravenously subcutaneous subcutaneously sc sq im intramuscular intramuscularly topical
+    solution suspension cream ointment gel patch spray nasal inhaled inhalation infusion film coated
+    extended sustained delayed release er xr sr ir dr odt once twice thrice daily weekly monthly qd bid tid qid
+    od qw po dose doses dosing regimen formulation
+""".split())
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'.][a-z0-9]+)*")
+
+SYNONYMS = {}          # canonical key -> canonical key (see load_synonyms / build_synonyms)
+MIN_ALIAS_CHARS = 3    # shorter otherNames ("A", "IV") are too ambiguous to merge on
+
+# --------------------------
+# Canonicalization
+# --------------------------
+def fold(name):
+    """Prefix-stripped, lowercase, accent-free name with unified quotes/dashes and collapsed spaces."""
+    s = TYPE_PREFIX_RE.sub("", name)
+    if not s.isascii():
+        s = unicodedata.normalize("NFKD", s)
+        s = "".join(ch for ch in s if not unicodedata.combining(ch))
+        s = s.replace("’", "'").replace("‘", "'").replace("–", "-").replace("—", "-").replace("®", "").replace("™", "")
+    return " ".join(s.lower().split())
+
+def _key(folded):
+    """Folded name -> canonical key without the synonym table: parentheticals, doses and form words removed."""
+    s = DOSE_RE.sub(" ", PAREN_RE.sub(" ", folded))
+    # "s.c." / "p.o." are matched without their dots
+    tokens = [t for t in TOKEN_RE.findall(s) if t.replace(".", "") not in FORM_WORDS]
+    return " ".join(tokens) or " ".join(TOKEN_RE.findall(folded)) or folded
+
+@lru_cache(maxsize=1 << 16)
+def canonical_intervention(name):
+    """
+    Raw intervention name -> {"id": canonical key, "role": "active" | "placebo" | "sham" |
+    "standard of care" | "no intervention"}, or None for an empty name. The returned dict is cached
+    and shared: do not modify it.
+    """
+    if not name or not name.strip():
+        return None
+    folded = fold(name)
+    for role, pattern in CONTROL_PATTERNS:
+        if pattern.match(folded):
+            return {"id": role, "role": role}
+    key = _key(folded)
+    return {"id": SYNONYMS.get(key, key), "role": "active"}
+
+def load_synonyms(path=None):
+    """Install the synonym table from a build_synonyms JSON file (None clears it). Returns the table."""
+    global SYNONYMS
+    table = {}
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)["synonyms"]
+    SYNONYMS = table
+    canonical_intervention.cache_clear()
+    return SYNONYMS
+
+# --------------------------
+# Synonym table from otherNames
+# --------------------------
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+def build_synonyms(interventions):
+    """
+    interventions: iterable of (name, otherNames) -> {"synonyms": {key: canonical key}, "groups": n,
+    "ambiguous": n}. Control arms and short otherNames are left out. An otherName links only the one name
+    it is listed under: one listed under several distinct names ("chemotherapy", "insulin") would chain
+    unrelated drugs, so it joins only if those names are already one group, and is counted as ambiguous
+    otherwise. Each group's canonical key is the one used most often as an intervention name (then the
+    shortest, then alphabetical), so the result does not depend on order.
+    """
+    uf = UnionFind()
+    name_counts = {}
+    listed_under = {}  # otherName key -> distinct name keys listing it
+    for name, other_names in interventions:
+        if not name or not name.strip():
+            continue
+        folded = fold(name)
+        if any(p.match(folded) for _, p in CONTROL_PATTERNS):
+            continue
+        key = _key(folded)
+        name_counts[key] = name_counts.get(key, 0) + 1
+        uf.find(key)
+        for other in other_names or ():
+            if not isinstance(other, str) or len(other.strip()) < MIN_ALIAS_CHARS:
+                continue
+            other_folded = fold(other)
+            if any(p.match(other_folded) for _, p in CONTROL_PATTERNS):
+                continue
+            other_key = _key(other_folded)
+            if other_key != key:
+                listed_under.setdefault(other_key, set()).add(key)
+    ambiguous = []
+    for other_key, keys in listed_under.items():
+        if len(keys) == 1:
+            uf.union(other_key, next(iter(keys)))
+        else:
+            ambiguous.append((other_key, keys))
+    # after the unambiguous links, an otherName of several names may only attach to the group they share
+    attached = 0
+    for other_key, keys in ambiguous:
+        roots = {uf.find(k) for k in keys}
+        if len(roots) == 1 and (other_key not in name_counts or uf.find(other_key) in roots):
+            uf.union(other_key, roots.pop())
+            attached += 1
+    groups = {}
+    for key in list(uf.parent):
+        groups.setdefault(uf.find(key), []).append(key)
+    synonyms = {}
+    merged = 0
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        merged += 1
+        best = min(members, key=lambda k: (-name_counts.get(k, 0), len(k), k))
+        for k in members:
+            if k != best:
+                synonyms[k] = best
+    return {"synonyms": dict(sorted(synonyms.items())), "groups": merged, "ambiguous": len(ambiguous) - attached}
+
+# --------------------------
+# CLI (build the synonym table)
+# --------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Build an intervention synonym table from otherNames")
+    parser.add_argument("--input", "-i", type=str, required=True, help="Input JSONL / JSON array file (optionally .gz)")
+    parser.add_argument("--output", "-o", type=str, default="intervention_synonyms.json",
+                        help="Synonym table for pre_processing.py --intervention-synonyms")
+    args = parser.parse_args()
+    # reuse the ETL's input reader and codec; imported here because pre_processing imports this module
+    import pre_processing as pp
+
+    def interventions():
+        inp = pp.InputStream(Path(args.input))
+        try:
+            for _, raw in inp.records():
+                try:
+                    js = pp.CODEC.loads(raw) if isinstance(raw, (bytes, str)) else raw
+                except ValueError:
+                    continue
+                # the ETL dead-letters records that are not study objects; skip them here
+                ps = js.get("protocolSection") if isinstance(js, dict) else None
+                module = ps.get("armsInterventionsModule") if isinstance(ps, dict) else None
+                items = module.get("interventions") if isinstance(module, dict) else None
+                for it in items if isinstance(items, list) else ():
+                    if isinstance(it, dict):
+                        yield it.get("name"), it.get("otherNames")
+        finally:
+            inp.close()
+
+    table = build_synonyms(interventions())
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(table, f, indent=1, ensure_ascii=False)
+    print(f"Wrote {len(table['synonyms'])} synonyms in {table['groups']} groups to {args.output} "
+          f"({table['ambiguous']} otherNames shared by unrelated names left out)")
+
+if __name__ == "__main__":
+    main()
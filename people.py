@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+people.py
+
+Investigator and contact identity for ClinicalTrials.gov records, shared by pre_processing.py and usable on its own.
+
+    from people import person_id, person_key, load_person_map
+    person_key("Smith, John A., MD", "Mayo Clinic")       # "john a smith|mayo clinic|"
+    person_key("Dr. John Smith", "Mayo Clinic, Rochester") # "john smith|mayo clinic rochester|"
+    person_key("Jane Doe", email="JDoe@univ.edu")          # "jane doe||jdoe@univ.edu"
+    person_id("Dr. John Smith", "Mayo Clinic")            # stable 16-hex id of the (mapped) key
+    person_id("Dr. John Smith", trial="NCT00000001")      # no affiliation/email: an id for this trial only
+
+Build a resolution table from overall officials (then pass it to pre_processing.py --person-map):
+    python people.py --input clinical_trials_dump.jsonl.gz --output person_map.json
+
+Notes:
+ - person_key: case/accent folding, titles and degrees (Dr., Prof., MD, PhD, ...) dropped, "Last, First"
+   inverted and middle names cut to their initial, so the name part is "first [middle initials] last".
+   Affiliations are folded, common abbreviations expanded (univ, hosp, ctr, centre) and filler words (the,
+   of, inc, ...) removed. The email (contacts) is its own component, only stripped and lowercased.
+ - person_id hashes the key after the resolution table, so ids depend only on the record (and the table),
+   not on input order or on which worker saw it. A bare name would merge every namesake in the registry,
+   so a person with neither affiliation nor email gets an id scoped to the trial instead. It is memoized
+   (lru_cache); load_person_map clears the cache.
+ - build_person_map resolves the remaining variants ("J. Smith" / "John Smith", "Mayo Clinic" /
+   "Mayo Clinic Rochester"). Keys are blocked on (last name, first initial) and, inside a block, only keys
+   sharing an affiliation token are compared, so work grows with block sizes rather than n^2. Two keys
+   merge when their first names and middle initials agree and their affiliation tokens overlap by at least
+   AFFILIATION_OVERLAP (Jaccard); a less specific name ("j smith", or "john smith" against "john a smith")
+   joins only if exactly one fuller name fits it, and a key without affiliation never merges. Each group's canonical key is the one seen most often (then the longest
+   name, then alphabetical).
+"""
+
+import re
+import json
+import hashlib
+import argparse
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+from interventions import UnionFind
+
+# --------------------------
+# Token rules
+# --------------------------
+NAME_TOKEN_RE = re.compile(r"[a-z0-9]+")
+PAREN_RE = re.compile(r"\([^()]*\)")
+# titles, degrees and suffixes, compared without dots ("M.D." -> "md")
+NAME_NOISE = frozenset("""
+    dr doctor prof professor med mr mrs ms miss mx sir dame jr sr ii iii iv
+    md phd mph msc mbbs mbchb bchir do dds dmd dvm pharmd rn np crnp pa pac aprn bsn msn dnp
+    ma mba bsc ba bs mhs mhsc mscr mas mpp drph scd dsc dphil frcp frcpc frcs frcsc frcpath mrcp frcog
+    facp facc facs faan fache fasco fccp faap fesc fracp franzcp mpharm bpharm cgc ccrp ccrc
+""".split())
+AFFILIATION_ABBREVIATIONS = {"univ": "university", "hosp": "hospital", "ctr": "center", "centre": "center",
+                             "inst": "institute", "med": "medical", "natl": "national", "st": "saint"}
+AFFILIATION_STOP = frozenset("the of and at for in de la le du der des di del inc llc ltd co corp gmbh sa ag".split())
+AFFILIATION_OVERLAP = 0.5
+
+PERSON_MAP = {}        # person key -> person key (see load_person_map / build_person_map)
+
+# --------------------------
+# Keys and ids
+# --------------------------
+def _fold(value):
+    s = (value or "").lower()
+    if not s.isascii():
+        s = unicodedata.normalize("NFKD", s)
+        s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    # "O'Brien" and "Garcia-Lopez" keep one token
+    return s.replace("'", "").replace("’", "").replace("-", "")
+
+def _name_tokens(part):
+    tokens = []
+    for word in part.split():
+        # "M.D." is a degree, "Dr.John" a title and a name
+        if word.replace(".", "") not in NAME_NOISE:
+            tokens.extend(t for t in NAME_TOKEN_RE.findall(word) if t not in NAME_NOISE)
+    return tokens
+
+def name_key(name):
+    """"first [middle initials] last" for a person name ("" when nothing is left)."""
+    parts = [_name_tokens(p) for p in PAREN_RE.sub(" ", _fold(name)).split(",")]
+    parts = [p for p in parts if p]
+    if not parts:
+        return ""
+    if len(parts) > 1 and len(parts[0]) == 1:
+        # "Smith, John A." -> "john a smith"
+        tokens = parts[1] + parts[0]
+    else:
+        tokens = [t for p in parts for t in p]
+    if len(tokens) == 1:
+        return tokens[0]
+    # middle names keep their initial: "John Adam Smith" and "John A. Smith" agree, "John B. Smith" does not
+    return " ".join([tokens[0]] + [t[0] for t in tokens[1:-1]] + [tokens[-1]])
+
+def affiliation_key(affiliation):
+    tokens = NAME_TOKEN_RE.findall(_fold(affiliation))
+    return " ".join(AFFILIATION_ABBREVIATIONS.get(t, t) for t in tokens if t not in AFFILIATION_STOP)
+
+def email_key(email):
+    return email.strip().lower() if isinstance(email, str) else ""
+
+def person_key(name, affiliation=None, email=None):
+    """Normalized "name|affiliation|email" key, or "" for a name with no usable tokens."""
+    key = name_key(name)
+    return f"{key}|{affiliation_key(affiliation)}|{email_key(email)}" if key else ""
+
+@lru_cache(maxsize=1 << 16)
+def person_id(name, affiliation=None, email=None, trial=None):
+    """
+    Stable 16-hex id for a person (after the resolution table), or None for an empty name. A name alone
+    does not identify anyone across the registry: without an affiliation or email the id is scoped to
+    `trial` (None when no trial is given either).
+    """
+    if not name or not isinstance(name, str):
+        return None
+    key = person_key(name, affiliation if isinstance(affiliation, str) else None, email)
+    if not key:
+        return None
+    if key.endswith("||"):
+        if trial is None:
+            return None
+        key = f"{key}{trial}"
+    else:
+        key = PERSON_MAP.get(key, key)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+def load_person_map(path=None):
+    """Install a resolution table from a build_person_map JSON file (None clears it). Returns the table."""
+    global PERSON_MAP
+    table = {}
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)["persons"]
+    PERSON_MAP = table
+    person_id.cache_clear()
+    return PERSON_MAP
+
+# --------------------------
+# Resolution table (blocking index)
+# --------------------------
+def _overlaps(a, b):
+    return len(a & b) >= AFFILIATION_OVERLAP * len(a | b)
+
+def _given(key):
+    """(first name, middle initials) of a person key."""
+    tokens = key.partition("|")[0].split()
+    return tokens[0], tuple(tokens[1:-1])
+
+def _less_specific(a, b):
+    """True when given name a is b with less detail: an initial for the first name and/or no middle."""
+    return a != b and (a[0] == b[0] or (len(a[0]) == 1 and b[0].startswith(a[0]))) and a[1] in ((), b[1])
+
+def build_person_map(people):
+    """
+    people: iterable of (name, affiliation) -> {"persons": {key: canonical key}, "groups": n,
+    "comparisons": n}. The result does not depend on input order.
+    """
+    counts = {}
+    for name, affiliation in people:
+        if not isinstance(name, str):
+            continue
+        key = person_key(name, affiliation if isinstance(affiliation, str) else None)
+        if key:
+            counts[key] = counts.get(key, 0) + 1
+    # block on (last name, first initial); names without both parts, or without affiliation, only match exactly
+    blocks = {}
+    for key in counts:
+        person, _, rest = key.partition("|")
+        tokens = person.split()
+        if len(tokens) > 1 and rest.partition("|")[0]:
+            blocks.setdefault((tokens[-1], tokens[0][0]), []).append(key)
+    uf = UnionFind()
+    comparisons = 0
+    for keys in blocks.values():
+        if len(keys) < 2:
+            continue
+        tokens = {k: frozenset(k.split("|")[1].split()) for k in keys}
+        given = {k: _given(k) for k in keys}
+        # inverted index on affiliation tokens: only keys sharing a token can overlap
+        by_token = {}
+        vaguer = {}
+        for k in sorted(keys):
+            candidates = set()
+            for t in tokens[k]:
+                candidates.update(by_token.get(t, ()))
+            for other in candidates:
+                comparisons += 1
+                if not _overlaps(tokens[k], tokens[other]):
+                    continue
+                if given[k] == given[other]:
+                    uf.union(k, other)
+                elif _less_specific(given[k], given[other]):
+                    vaguer.setdefault(k, set()).add(given[other])
+                elif _less_specific(given[other], given[k]):
+                    vaguer.setdefault(other, set()).add(given[k])
+            for t in tokens[k]:
+                by_token.setdefault(t, []).append(k)
+        # "J. Smith" / "John Smith" join a fuller name only when a single one fits, so they never bridge
+        # John and Jim, or John A. and John B.
+        for k, names in vaguer.items():
+            if len(names) == 1:
+                name = next(iter(names))
+                for other in keys:
+                    if given[other] == name and _overlaps(tokens[k], tokens[other]):
+                        uf.union(k, other)
+    groups = {}
+    for key in list(uf.parent):
+        groups.setdefault(uf.find(key), []).append(key)
+    persons = {}
+    merged = 0
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        merged += 1
+        best = min(members, key=lambda k: (-counts[k], -len(k.partition("|")[0]), k))
+        for k in members:
+            if k != best:
+                persons[k] = best
+    return {"persons": dict(sorted(persons.items())), "groups": merged, "comparisons": comparisons}
+
+# --------------------------
+# CLI (build the resolution table)
+# --------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Build an investigator resolution table from overall officials")
+    parser.add_argument("--input", "-i", type=str, required=True, help="Input JSONL / JSON array file (optionally .gz)")
+    parser.add_argument("--output", "-o", type=str, default="person_map.json",
+                        help="Resolution table for pre_processing.py --person-map")
+    args = parser.parse_args()
+    # reuse the ETL's input reader and codec; imported here because pre_processing imports this module
+    import pre_processing as pp
+
+    def officials():
+        inp = pp.InputStream(Path(args.input))
+        try:
+            for _, raw in inp.records():
+                try:
+                    js = pp.CODEC.loads(raw) if isinstance(raw, (bytes, str)) else raw
+                except ValueError:
+                    continue
+                # the ETL dead-letters records that are not study objects; skip them here
+                ps = js.get("protocolSection") if isinstance(js, dict) else None
+                module = ps.get("contactsLocationsModule") if isinstance(ps, dict) else None
+                officials = module.get("overallOfficials") if isinstance(module, dict) else None
+                for of in officials if isinstance(officials, list) else ():
+                    if isinstance(of, dict):
+                        yield of.get("name"), of.get("affiliation")
+        finally:
+            inp.close()
+
+    table = build_person_map(officials())
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(table, f, indent=1, ensure_ascii=False)
+    print(f"Wrote {len(table['persons'])} aliases in {table['groups']} groups to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -3,30 +3,120 @@
 split_json_to_edge_files_with_progress.py
 
 Stream a ClinicalTrials JSONL/JSON (list) file and write per-node and per-relationship JSONL files
-for later Neo4j ingestion. Uses tqdm progress bar.
+for later Neo4j ingestion. Uses a tqdm progress bar by default (--progress log|none for batch jobs).
 
 Usage:
     python split_json_to_edge_files_with_progress.py --input clinical_trials_dump.jsonl[.gz] --outdir kg_staging
+    python split_json_to_edge_files_with_progress.py --input clinical_trials_dump.jsonl.gz --outdir kg_staging --workers 8
 
 Notes:
- - For very large JSON array files (a single huge '[' ... ']'), the script will attempt to load the file into memory.
-   This may be memory-heavy. Prefer JSONL (one JSON object per line) or gzipped JSONL.
+ - JSON array files (a single huge '[' ... ']', plain or .gz) are parsed incrementally, one element at a time,
+   so memory stays bounded by the largest single study rather than the size of the file.
+ - With --workers N, raw records are mapped in a process pool while a single writer applies dedupe and
+   writes in input order, so the output is byte-identical to a serial run.
+ - The node/relationship mapping is declared in SCHEMA and interpreted by a small engine. Use
+   --only trials,conditions,interventions (or --skip results,participant_flow,baseline,adverse_events) to
+   extract a subset; disabled sections are never traversed and their files are not opened.
+ - With --checkpoint-every N (off by default), a checkpoint (checkpoint.json + dedupe_journal.jsonl) is
+   written every N records. After a crash, rerun with --resume: output written after the last checkpoint is truncated and the
+   input continues from the recorded position (gzip input is decompressed, but not parsed, up to it).
+ - --format parquet (or arrow, an Arrow IPC file) writes typed, zstd-compressed column files in row groups of
+   --row-group-rows rows instead of JSONL; column types are declared in COLUMN_TYPES. Needs pyarrow; the
+   dead-letter file stays JSONL, and checkpoints/--resume are only available for JSONL. Categorical fields
+   (overallStatus, phases, type, role, country, ...) are interned per file and stored as dictionary codes.
+ - --manifest kg_manifest.sqlite records every study's content hash and per-file row digests. A later run
+   with --manifest kg_manifest.sqlite --incremental --outdir <new dir> skips unchanged studies before parsing
+   and writes only deltas: staging files hold upserts, <file>.deletes.jsonl lists studies whose previous rows
+   in <file> must be dropped first (see StudyManifest).
+ - --shards N writes outdir/shard-000/ ... shard-<N-1>/, each with the full set of staging files, routing every
+   study's rows by hash of its nctId; shards.json lists each shard file with its row count and byte size so
+   loaders can fan out over shards.
+ - --compress gzip|zstd writes sites.jsonl.gz / sites.jsonl.zst (dead_letter.jsonl too); compression runs on
+   --compress-threads background threads so it overlaps with extraction. Checkpoints end a gzip member /
+   zstd frame, so --resume works on compressed output.
+ - metrics.json (rewritten every --metrics-interval seconds and at the end) holds wall time per stage and per
+   section, records/s and input/output bytes/s.
+ - --progress tqdm|log|none selects the progress reporter; it refreshes at most every --progress-interval
+   seconds (default 0.5 for tqdm, 10 for log). "none" costs nothing per record.
+ - eligibility.jsonl rows come from eligibility.parse_criteria: list markers are stripped, and nested items
+   carry their depth (level) and the sequence of the enclosing item (parentSequence). Each row also has the
+   typed bounds of its first numeric constraint (measure, lowerBound/upperBound, ...Inclusive, unit) and a
+   sex restriction; eligibility_summary.jsonl holds one compact row per study (sex, ages in years, and
+   per-measure inclusion/exclusion ranges) for numeric filtering.
+ - Interventions carry a canonicalId and role (active / placebo / sham / standard of care / no intervention)
+   from interventions.canonical_intervention, so "Semaglutide", "semaglutide 1mg" and "Drug: Semaglutide"
+   group together; intervention_aliases.jsonl maps every name and otherName to its canonicalId.
+   --intervention-synonyms adds a table built from otherNames (python interventions.py --input <dump>).
+ - Conditions are deduplicated on conditions.canonical_condition (case, punctuation, possessives, plurals,
+   MeSH-style inversion), so "Alzheimer Disease" and "Alzheimer's disease" are one node; conditions.jsonl and
+   trial_studies_rel.jsonl carry the canonicalId and condition_aliases.jsonl maps every spelling to it.
+   --condition-map adds a user mapping (JSON or two-column CSV/TSV of alias -> canonical name).
+ - Sites are deduplicated on a fingerprint of facility, city, state, zip and country (not coordinates):
+   sites.jsonl holds each physical site once under a stable siteId, and trial_has_site_rel.jsonl links
+   trials to it (with the per-trial recruitment status).
+ - Overall officials and central contacts get a stable personId / contactId from people.person_id (folded
+   name with middle initials, plus affiliation, or email for contacts), so investigators.jsonl and
+   contacts.jsonl hold each person once and the trial_has_*_rel.jsonl edges carry the role. A person with
+   neither affiliation nor email is only identified within the trial. --person-map adds a resolution
+   table for name/affiliation variants (python people.py --input <dump>).
+ - dead_letter.jsonl entries record the input path and the offset of the failed record. After fixing a
+   mapping bug, rerun just those records with --replay <outdir>/dead_letter.jsonl --outdir <new dir>: JSONL
+   input is read at the offsets (seeking, or decompressing forward for .gz) instead of re-running the dump.
+ - --raw-index writes raw_index.sqlite, nctId -> (file, byte offset, length), so one study's original JSON
+   can be fetched without scanning the dump (raw_index.RawIndex). Plain JSONL is indexed in place; gzip and
+   JSON array records are copied to raw_blocks.jsonl.gz in independent gzip members (BGZF-style) and
+   indexed by member offset. The index follows checkpoints, so --resume keeps it consistent.
+ - Output is written with stdlib json by default, byte-for-byte as it always has been. --json-backend orjson
+   (or ujson, or auto for the fastest one installed) is faster; its output parses to the same values but is
+   formatted differently (orjson writes compact separators). The backend parses JSONL input only: JSON
+   array input is always split and decoded by stdlib json (iter_json_array), whichever backend is chosen.
 """
 
 import json
 import gzip
 import argparse
 import logging
+import io
 import os
+import bisect
+import contextlib
+import hashlib
+import heapq
+import shutil
+import sqlite3
+import time
+import zlib
+import unicodedata
+import multiprocessing
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
 from typing import Dict, Any, Iterable
-from tqdm import tqdm
+
+from eligibility import structured_criteria, eligibility_summary
+from interventions import canonical_intervention, load_synonyms
+from conditions import canonical_condition, load_condition_map
+from people import person_id, load_person_map
+from raw_index import RawIndexWriter, RAW_INDEX_NAME
 
 # --------------------------
 # Config
 # --------------------------
 DEAD_LETTER_NAME = "dead_letter.jsonl"
+INPUT_BUFFER_SIZE = 1 << 20
+MAX_RECORD_CHARS = 64 << 20  # a JSON array element that has not decoded by this size is treated as malformed
+DEFAULT_FLUSH_BYTES = 1 << 20  # per output file
+DEFAULT_ROW_GROUP_ROWS = 1 << 16  # rows per Parquet row group / Arrow record batch (columnar formats)
+SECTION_TIMINGS_NAME = "section_timings.json"
+CHECKPOINT_NAME = "checkpoint.json"
+DEDUPE_JOURNAL_NAME = "dedupe_journal.jsonl"
+SHARD_MANIFEST_NAME = "shards.json"
+METRICS_NAME = "metrics.json"
+DEFAULT_METRICS_INTERVAL = 30.0  # seconds between metrics.json refreshes
+DEFAULT_CHECKPOINT_EVERY = 0  # records; checkpoints (fsyncs and the dedupe journal) are opt-in
 LOG_FILE = "split_etl_progress.log"
 
 # --------------------------
@@ -40,27 +130,247 @@ formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
 console.setFormatter(formatter)
 logging.getLogger().addHandler(console)
 
+# --------------------------
+# JSON codec (stdlib by default, orjson/ujson when installed)
+# --------------------------
+class JsonCodec:
+    """
+    loads(text) -> object and dumps_line(obj) -> UTF-8 bytes ending in "\n".
+
+    Backends may differ in insignificant whitespace and float spelling (orjson writes compact
+    separators, e.g. 1e20 vs 1e+20) but parse back to the same values. A run always uses one
+    backend, so serial and --workers output are still byte-identical to each other.
+    """
+    def __init__(self, name, loads, dumps_line):
+        self.name = name
+        self.loads = loads
+        self.dumps_line = dumps_line
+
+def _stdlib_dumps_line(obj):
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+def _make_codec(name: str):
+    if name == "json":
+        return JsonCodec("json", json.loads, _stdlib_dumps_line)
+    if name == "orjson":
+        import orjson
+        def dumps_line(obj):
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+            except TypeError:
+                # e.g. integers beyond 64 bits, which stdlib handles
+                return _stdlib_dumps_line(obj)
+        return JsonCodec("orjson", orjson.loads, dumps_line)
+    if name == "ujson":
+        import ujson
+        def dumps_line(obj):
+            return (ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False) + "\n").encode("utf-8")
+        return JsonCodec("ujson", ujson.loads, dumps_line)
+    raise ValueError(f"Unknown JSON backend: {name}")
+
+def set_codec(name: str = "json"):
+    """Select the process-wide JSON codec. "auto" tries orjson, then ujson, then stdlib json."""
+    global CODEC
+    candidates = JSON_BACKENDS if name == "auto" else [name]
+    for cand in candidates:
+        try:
+            CODEC = _make_codec(cand)
+            break
+        except ImportError:
+            if name != "auto":
+                logging.warning(f"JSON backend {cand} is not installed, falling back to stdlib json")
+    else:
+        CODEC = _make_codec("json")
+    return CODEC
+
+JSON_BACKENDS = ["orjson", "ujson", "json"]
+CODEC = _make_codec("json")
+
+# --------------------------
+# Lookup tables (process-wide, like the codec)
+# --------------------------
+# name -> (loader, CLI flag); a table changes extracted ids, so checkpoints and manifests record
+# the digest of every loaded table and refuse to continue with different ones
+MAPPING_LOADERS = {
+    "intervention_synonyms": (load_synonyms, "--intervention-synonyms"),
+    "condition_map": (load_condition_map, "--condition-map"),
+    "person_map": (load_person_map, "--person-map"),
+}
+MAPPINGS = dict.fromkeys(MAPPING_LOADERS)
+
+def load_mappings(paths=None):
+    """Install the lookup tables given as {name: path or None}; records each table's digest in MAPPINGS."""
+    for name, (loader, _) in MAPPING_LOADERS.items():
+        path = (paths or {}).get(name)
+        loader(path)
+        MAPPINGS[name] = hashlib.sha1(Path(path).read_bytes()).hexdigest()[:16] if path else None
+    return MAPPINGS
+
+def check_mappings(recorded, what):
+    for name, (_, flag) in MAPPING_LOADERS.items():
+        if (recorded or {}).get(name) != MAPPINGS[name]:
+            raise ValueError(f"{what} was built with a different {flag} table; use the same one")
+
 # --------------------------
 # Utilities
 # --------------------------
-def open_input(path: Path):
-    if not path.exists():
-        raise FileNotFoundError(path)
-    if str(path).endswith(".gz"):
-        return gzip.open(path, "rt", encoding="utf-8")
-    return open(path, "r", encoding="utf-8")
+class InputStream:
+    """
+    The input opened once for a single streaming pass, with its format sniffed on the way in.
 
-def safe_get(dct: Dict[str, Any], path: str, default=None):
+      stream - binary buffered stream (decompressed for .gz) positioned at the first non-whitespace byte
+      raw_fp - the underlying on-disk file object; raw_fp.tell() is the (compressed) byte offset
+               used to drive progress, so nothing has to be counted up front
+      fmt    - "array" if the input is a single JSON array, otherwise "jsonl"
+      start  - uncompressed offset of the first non-whitespace byte
+    """
+    def __init__(self, path: Path):
+        if not path.exists():
+            raise FileNotFoundError(path)
+        self.path = path
+        self.raw_fp = open(path, "rb")
+        source = gzip.GzipFile(fileobj=self.raw_fp, mode="rb") if str(path).endswith(".gz") else self.raw_fp
+        self.stream = io.BufferedReader(source, buffer_size=INPUT_BUFFER_SIZE)
+        self.fmt = "jsonl"
+        self.start = 0
+        self.text = None
+        while True:
+            head = self.stream.peek(INPUT_BUFFER_SIZE)
+            if not head:
+                break
+            stripped = head.lstrip()
+            if stripped:
+                self.fmt = "array" if stripped[:1] == b"[" else "jsonl"
+                break
+            # leading whitespace is irrelevant for both formats, drop it and keep looking
+            self.start += len(self.stream.read(len(head)))
+
+    def records(self, position=None):
+        """
+        Yield (position, raw_item) for every record. position is where reading resumes after that
+        record: the uncompressed byte offset for JSONL, the character offset of the decoded text for
+        JSON arrays. Passing a previously yielded position continues right after that record.
+        """
+        if self.fmt == "array":
+            # keep a reference: a collected TextIOWrapper would close the stream under the reader
+            self.text = text = io.TextIOWrapper(self.stream, encoding="utf-8")
+            if position is None:
+                return iter_json_array(text)
+            # text offsets are not seekable: decode and discard up to the resume point
+            remaining = position
+            while remaining:
+                got = len(text.read(min(remaining, INPUT_BUFFER_SIZE)))
+                if not got:
+                    break
+                remaining -= got
+            return iter_json_array(text, start=position, resume=True)
+        if position is not None:
+            # plain files seek directly; gzip streams decompress forward to the offset without parsing
+            self.stream.seek(position)
+        return iter_jsonl(self.stream, position if position is not None else self.start)
+
+    def close(self):
+        self.stream.close()
+        # GzipFile does not own raw_fp, close it explicitly
+        self.raw_fp.close()
+
+def iter_jsonl(stream, offset: int = 0):
+    """Yield (offset after line, raw line bytes) for each non-blank line of a binary stream."""
+    for line in stream:
+        offset += len(line)
+        if not line.strip():
+            continue
+        yield offset, line
+
+def iter_json_array(fh, chunk_size: int = INPUT_BUFFER_SIZE, start: int = 0, resume: bool = False,
+                    max_record: int = MAX_RECORD_CHARS):
+    """
+    Incrementally yield (offset, element) for a top-level JSON array read from a text stream.
+
+    Only the current element (plus one read chunk) is held in memory. Elements are decoded with
+    json.JSONDecoder.raw_decode; when an element straddles the end of the buffer more text is read
+    and the decode is retried. offset is the character offset just past the element; with
+    resume=True the stream is expected to be positioned at such an offset (`start`). raw_decode both finds
+    where an element ends and decodes it, so --json-backend does not apply here: array elements are always
+    parsed by stdlib json (only JSONL lines go through CODEC.loads). An element still
+    undecoded after max_record characters is malformed (or absurdly large) and raises ValueError rather
+    than buffering the rest of the input.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    base = start  # character offset of buf[0]
+    pos = 0
+    eof = False
+    state = "sep" if resume else "start"  # start -> value -> sep -> value ... -> done
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("Unexpected end of input inside JSON array")
+            more = fh.read(chunk_size)
+            eof = not more
+            base += pos
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        ch = buf[pos]
+        if state == "start":
+            if ch != "[":
+                raise ValueError("Input is not a JSON array")
+            pos += 1
+            state = "first"
+            continue
+        if ch == "]" and state in ("first", "sep"):
+            return
+        if state == "sep":
+            if ch != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {ch!r}")
+            pos += 1
+            state = "value"
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+            # a scalar ending exactly at the buffer edge may be truncated (e.g. a number), read on
+            if end >= len(buf) and not eof:
+                raise json.JSONDecodeError("element may continue past buffer", buf, end)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            if len(buf) - pos > max_record:
+                raise ValueError(f"JSON array element at offset {base + pos} does not decode within "
+                                 f"{max_record} characters")
+            # element straddles the buffer edge: drop consumed text and read more
+            more = fh.read(chunk_size)
+            eof = not more
+            base += pos
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        yield base + end, obj
+        pos = end
+        state = "sep"
+        if pos >= chunk_size:
+            base += pos
+            buf = buf[pos:]
+            pos = 0
+
+def compile_path(path: str):
+    """Split a dotted path once, up front, into the key tuple get_path walks."""
+    return tuple(path.split("."))
+
+def get_path(dct: Dict[str, Any], keys: tuple, default=None):
     cur = dct
-    for p in path.split("."):
-        if cur is None:
-            return default
+    for p in keys:
         if isinstance(cur, dict) and p in cur:
             cur = cur[p]
         else:
             return default
     return cur
 
+def safe_get(dct: Dict[str, Any], path: str, default=None):
+    return get_path(dct, path.split("."), default)
+
 def normalize_intervention_name(name: str):
     if not name:
         return name
@@ -73,27 +383,352 @@ def normalize_intervention_name(name: str):
 def ensure_dir(d: Path):
     d.mkdir(parents=True, exist_ok=True)
 
-def write_jsonl(fp, obj):
-    fp.write(json.dumps(obj, ensure_ascii=False) + "\n")
+# --------------------------
+# Batched writer (one bulk write per flush instead of one per record)
+# --------------------------
+class BatchedWriter:
+    """
+    Accumulate already-serialized JSONL lines for one output file and write them in bulk.
+
+    Lines arrive as UTF-8 bytes from the JSON codec; their sizes are added to bytes_written on
+    flush so callers get an exact per-file byte count. Newlines are translated to os.linesep on
+    flush, so the bytes on disk match what a text-mode file would have produced.
+    """
+    def __init__(self, path: Path, flush_bytes: int = DEFAULT_FLUSH_BYTES):
+        # open in append mode so multiple runs can be resumed if desired
+        self.path = path
+        self.fp = open(path, "ab")
+        self.flush_bytes = flush_bytes
+        self.buf = []
+        self.pending = 0
+        self.bytes_written = 0
+        self.lines_written = 0
+
+    def write(self, line: bytes):
+        self.buf.append(line)
+        self.pending += len(line)
+        if self.pending >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self.buf:
+            return
+        data = b"".join(self.buf)
+        if os.linesep != "\n":
+            data = data.replace(b"\n", os.linesep.encode())
+        self._write(data)
+        self.bytes_written += len(data)
+        self.lines_written += len(self.buf)
+        self.buf = []
+        self.pending = 0
+
+    def _write(self, data: bytes):
+        self.fp.write(data)
+
+    def sync(self):
+        """Flush buffered lines through to disk and return the file's size (used for checkpoints)."""
+        self.flush()
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        return self.fp.tell()
+
+    def close(self):
+        self.flush()
+        self.fp.close()
+
+# --------------------------
+# Compressed JSONL output (--compress gzip|zstd)
+# --------------------------
+# Compression runs on a small pool of background threads ("lanes"); each file is pinned to one lane,
+# so its chunks are compressed and written in order while the main thread keeps mapping and
+# serializing. zlib and zstandard release the GIL while compressing. sync() ends the current gzip
+# member / zstd frame before reporting the file size, so checkpoint sizes fall on a member boundary
+# and --resume can truncate compressed files too (concatenated members/frames are valid streams).
+COMPRESSIONS = ["none", "gzip", "zstd"]
+COMPRESS_SUFFIX = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+MAX_INFLIGHT_CHUNKS = 4  # per file: flushed chunks waiting for their lane before the writer blocks
+
+class CompressionLanes:
+    def __init__(self, compression: str, level=None, threads: int = 2):
+        if compression == "zstd":
+            import zstandard
+            self.zstandard = zstandard
+        self.compression = compression
+        self.level = level if level is not None else (3 if compression == "zstd" else 6)
+        self.lanes = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"compress-{i}") for i in range(max(1, threads))]
+        self.next = 0
+
+    def compressor(self):
+        if self.compression == "zstd":
+            # a ZstdCompressor's context is shared by its compressobjs: one compressor per stream
+            return self.zstandard.ZstdCompressor(level=self.level).compressobj()
+        return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+
+    def lane(self):
+        lane = self.lanes[self.next % len(self.lanes)]
+        self.next += 1
+        return lane
+
+    def shutdown(self):
+        for lane in self.lanes:
+            lane.shutdown()
+
+class CompressedWriter(BatchedWriter):
+    """BatchedWriter whose flushed chunks are compressed and written by a background lane."""
+    def __init__(self, path: Path, flush_bytes: int, lanes: CompressionLanes):
+        super().__init__(path, flush_bytes)
+        self.lanes = lanes
+        self.lane = lanes.lane()
+        self.comp = lanes.compressor()
+        self.dirty = False
+        self.inflight = deque()
+
+    def _submit(self, fn, *args):
+        self.inflight.append(self.lane.submit(fn, *args))
+        while len(self.inflight) > MAX_INFLIGHT_CHUNKS:
+            self.inflight.popleft().result()
+
+    def _write(self, data: bytes):
+        self._submit(self._compress, data)
+
+    def _compress(self, data):
+        self.fp.write(self.comp.compress(data))
+        self.dirty = True
+
+    def _end_member(self):
+        # an untouched empty file still gets one (empty) member so it is a valid compressed stream
+        if self.dirty or self.fp.tell() == 0:
+            self.fp.write(self.comp.flush())
+            self.comp = self.lanes.compressor()
+            self.dirty = False
+
+    def _drain(self):
+        self.flush()
+        self._submit(self._end_member)
+        while self.inflight:
+            self.inflight.popleft().result()
+
+    def sync(self):
+        self._drain()
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        return self.fp.tell()
+
+    def close(self):
+        self._drain()
+        self.fp.close()
+
+def open_jsonl_writer(path: Path, flush_bytes: int = DEFAULT_FLUSH_BYTES, lanes: CompressionLanes = None):
+    """JSONL writer for path (+ .gz/.zst when lanes compress)."""
+    if lanes is None:
+        return BatchedWriter(path, flush_bytes)
+    return CompressedWriter(path.with_name(path.name + COMPRESS_SUFFIX[lanes.compression]), flush_bytes, lanes)
+
+# --------------------------
+# Columnar writer (Parquet / Arrow IPC, requires pyarrow)
+# --------------------------
+OUTPUT_FORMATS = ["jsonl", "parquet", "arrow"]
+COLUMNAR_SUFFIX = {"parquet": ".parquet", "arrow": ".arrow"}
+
+def output_name(fname: str, fmt: str = "jsonl"):
+    """On-disk name of a staging file: trials.jsonl -> trials.parquet / trials.arrow for columnar formats."""
+    if fmt == "jsonl":
+        return fname
+    return fname[:-len(".jsonl")] + COLUMNAR_SUFFIX[fmt]
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise TypeError("bool is not an integer count")
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"{value} is not integral")
+        return int(value)
+    return int(value)
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    raise TypeError(f"{value!r} is not a boolean")
+
+def _to_str_list(value):
+    if not isinstance(value, list):
+        raise TypeError(f"{value!r} is not a list")
+    return [v if isinstance(v, str) else str(v) for v in value]
+
+def _to_str(value):
+    return value if isinstance(value, str) else str(value)
+
+def _to_json(value):
+    return json.dumps(value, ensure_ascii=False)
+
+# column kind -> (arrow type name, coercion); see COLUMN_TYPES in the schema section.
+# "category" / "category_list" values are interned in the writer's StringPool and stored as
+# dictionary codes (see ColumnarWriter).
+COLUMN_KINDS = {
+    "string": ("string", _to_str),
+    "int": ("int64", _to_int),
+    "float": ("float64", float),
+    "bool": ("bool_", _to_bool),
+    "list": ("list<string>", _to_str_list),
+    "json": ("string", _to_json),
+    "category": ("dictionary<string>", _to_str),
+    "category_list": ("list<dictionary<string>>", _to_str_list),
+}
+
+class StringPool:
+    """
+    Interned values of one categorical column: value -> dense int code in first-seen order. The pool
+    keeps a single copy of each value, and codes never change, so each batch's dictionary extends the
+    previous batch's (Arrow IPC writes only the delta).
+    """
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+class ColumnarWriter:
+    """
+    Buffer rows for one staging file column by column and write them as typed Parquet row groups
+    (zstd) or Arrow IPC record batches (zstd), so memory per file is bounded by row_group_rows.
+
+    Rows are the dicts the schema emits. Each column is coerced to its declared type; a value
+    that does not coerce (e.g. a non-numeric "numSubjects") is written as null and counted in
+    coerce_errors. Files that mix row shapes (adverse_events) get the union of their columns.
+    Categorical columns are buffered as int codes into a per-column StringPool rather than as the
+    parsed strings, and written as dictionary-encoded columns.
+    Same write/flush/close interface as BatchedWriter; bytes_written is the file size after close.
+    """
+    def __init__(self, path: Path, columns, fmt: str, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS):
+        import pyarrow as pa
+        self.pa = pa
+        self.path = path
+        self.fmt = fmt
+        self.row_group_rows = row_group_rows
+        category = pa.dictionary(pa.int32(), pa.string())
+        types = {"string": pa.string(), "int64": pa.int64(), "float64": pa.float64(), "bool_": pa.bool_(),
+                 "list<string>": pa.list_(pa.string()), "dictionary<string>": category,
+                 "list<dictionary<string>>": pa.list_(category)}
+        self.schema = pa.schema([(name, types[COLUMN_KINDS[kind][0]]) for name, kind in columns])
+        self.kinds = dict(columns)
+        self.pools = {name: StringPool() for name, kind in columns if kind in ("category", "category_list")}
+        self.coercers = [(name, self._coercer(name, kind)) for name, kind in columns]
+        self.cols = {name: [] for name, _ in columns}
+        self.pending = 0
+        self.bytes_written = 0
+        self.lines_written = 0
+        self.coerce_errors = 0
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self.sink = None
+            self.writer = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+        else:
+            self.sink = pa.OSFile(str(path), "wb")
+            self.writer = pa.ipc.new_file(self.sink, self.schema,
+                                          options=pa.ipc.IpcWriteOptions(compression="zstd",
+                                                                         emit_dictionary_deltas=True))
+
+    def _coercer(self, name, kind):
+        coerce = COLUMN_KINDS[kind][1]
+        if kind == "category":
+            code = self.pools[name].code
+            return lambda value: code(coerce(value))
+        if kind == "category_list":
+            code = self.pools[name].code
+            return lambda value: [code(v) for v in coerce(value)]
+        return coerce
+
+    def _array(self, name, values):
+        pa = self.pa
+        if name not in self.pools:
+            return pa.array(values, self.schema.field(name).type)
+        dictionary = pa.array(self.pools[name].values, pa.string())
+        if self.kinds[name] == "category":
+            return pa.DictionaryArray.from_arrays(pa.array(values, pa.int32()), dictionary)
+        offsets = [0]
+        codes = []
+        for item in values:
+            if item:
+                codes.extend(item)
+            offsets.append(len(codes))
+        items = pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()), dictionary)
+        return pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), items,
+                                        mask=pa.array([item is None for item in values]))
+
+    def write(self, row):
+        cols = self.cols
+        for name, coerce in self.coercers:
+            value = row.get(name)
+            if value is not None:
+                try:
+                    value = coerce(value)
+                except (TypeError, ValueError):
+                    value = None
+                    self.coerce_errors += 1
+            cols[name].append(value)
+        self.pending += 1
+        if self.pending >= self.row_group_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.coercers:
+            batch = self.pa.RecordBatch.from_arrays([self._array(name, values) for name, values in self.cols.items()],
+                                                    schema=self.schema)
+        else:
+            # a file whose emits declare no columns (placeholder relationship files)
+            batch = self.pa.RecordBatch.from_pylist([{}] * self.pending, schema=self.schema)
+        self.writer.write_batch(batch)
+        self.lines_written += self.pending
+        self.cols = {name: [] for name in self.cols}
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+        self.bytes_written = self.path.stat().st_size
 
 # --------------------------
 # Writers factory (open many files)
 # --------------------------
-def open_writers(outdir: Path):
+def open_writers(outdir: Path, flush_bytes: int = DEFAULT_FLUSH_BYTES, files=None, output_format: str = "jsonl",
+                 row_group_rows: int = DEFAULT_ROW_GROUP_ROWS, lanes: CompressionLanes = None):
+    """
+    Open the staging files; when `files` is given, only those (the enabled sections' outputs) are opened.
+    Writers are keyed by the schema's .jsonl name whatever the output format; writer.path is the real file.
+    `lanes` compresses JSONL output (columnar formats are compressed by their own encoders).
+    """
     ensure_dir(outdir)
     writers = {}
+    columns = file_columns() if output_format != "jsonl" else None
     def ow(name):
-        p = outdir / name
-        # open in append mode so multiple runs can be resumed if desired
-        writers[name] = open(p, "a", encoding="utf-8")
+        if files is not None and name not in files:
+            return None
+        if columns is None:
+            writers[name] = open_jsonl_writer(outdir / name, flush_bytes, lanes)
+        else:
+            writers[name] = ColumnarWriter(outdir / output_name(name, output_format), columns.get(name, []),
+                                           output_format, row_group_rows)
         return writers[name]
     # Node files
     for fname in [
-        "trials.jsonl","organizations.jsonl","conditions.jsonl","interventions.jsonl",
+        "trials.jsonl","organizations.jsonl","conditions.jsonl","condition_aliases.jsonl","interventions.jsonl",
+        "intervention_aliases.jsonl",
         "arms.jsonl","sites.jsonl","investigators.jsonl","contacts.jsonl",
         "outcomes.jsonl","results.jsonl","baseline_groups.jsonl","baseline_measures.jsonl",
         "participant_flow_groups.jsonl","adverse_events.jsonl","eligibility.jsonl",
-        "publications.jsonl","versions.jsonl"
+        "eligibility_summary.jsonl","publications.jsonl","versions.jsonl"
     ]:
         ow(fname)
 
@@ -109,404 +744,1547 @@ def open_writers(outdir: Path):
     return writers
 
 # --------------------------
-# Input counting helpers for progress
+# Sharded output (--shards N)
 # --------------------------
-def estimate_total_lines(path: Path):
+# Every row a study produces goes to shard key_fingerprint(nctId) % N, so a study's node and
+# relationship rows always share a shard and shards can be loaded independently. Rows of the
+# globally deduplicated nodes (organizations, conditions, interventions, sites, people) land in the shard of the
+# first study that emitted them: load node files from all shards before relationship files.
+# shards.json lists every shard file with its row count and byte size.
+def shard_dir_name(shard: int):
+    return f"shard-{shard:03d}"
+
+def shard_of(nct: str, shards: int):
+    return key_fingerprint(nct) % shards if shards > 1 else 0
+
+def open_shard_writers(outdir: Path, shards: int, flush_bytes: int = DEFAULT_FLUSH_BYTES, **kwargs):
     """
-    Estimate total items for progress bar.
-    If file is JSONL(.gz) we can count lines cheaply.
-    If file begins with '[' (a JSON array), attempt to parse as JSON and return len(array).
-      Warning: this loads the JSON array in memory and may be heavy for big files.
-    If counting fails, return None and tqdm will use indeterminate mode.
+    open_writers for each shard. Returns (per-shard writer dicts, flat {relative path: writer} view
+    used for checkpoints and summaries). With one shard the layout is the plain outdir/<file>.
+    The flush buffer is split across shards so buffered memory does not grow with N.
     """
+    if shards <= 1:
+        writers = open_writers(outdir, flush_bytes, **kwargs)
+        return [writers], dict(writers)
+    per_shard = max(flush_bytes // shards, 1 << 16)
+    by_shard = [open_writers(outdir / shard_dir_name(k), per_shard, **kwargs) for k in range(shards)]
+    flat = {f"{shard_dir_name(k)}/{name}": fp for k, writers in enumerate(by_shard) for name, fp in writers.items()}
+    return by_shard, flat
+
+def write_shard_manifest(outdir: Path, by_shard, output_format: str, dead_letter: str = DEAD_LETTER_NAME):
+    files = {}
+    for k, writers in enumerate(by_shard):
+        for name, fp in sorted(writers.items()):
+            rel = fp.path.relative_to(outdir).as_posix()
+            files.setdefault(name, []).append({"shard": k, "path": rel, "rows": fp.lines_written,
+                                               "bytes": fp.path.stat().st_size})
+    manifest = {"shards": len(by_shard), "key": "nctId", "format": output_format,
+                "dead_letter": dead_letter, "files": files}
+    tmp = outdir / (SHARD_MANIFEST_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, outdir / SHARD_MANIFEST_NAME)
+
+# --------------------------
+# Extraction schema
+# --------------------------
+# Every staging row is described declaratively and interpreted by the small engine below.
+#
+# Expressions (evaluated against the per-record scope):
+#   "var" / "var.a.b"          scope variable, optionally followed by a dotted path (missing -> None)
+#   ("get", "var.a.b", dflt)   same, with a default for a missing key
+#   ("const", value)           literal
+#   ("or", e1, e2, ...)        first truthy value (Python `or` semantics)
+#   ("fmt", "{}::{}", e1, e2)  str.format over sub-expressions (id templates)
+#   ("call", fn, e1, ...)      fn(*values)
+#
+# Scope variables: record (top-level study), protocol (protocolSection),
+# identification (protocolSection.identificationModule), results (resultsSection),
+# nct (nctId), input (input path), plus the loop variables bound by `each`.
+#
+# Emit(file, fields, each=..., let=..., when=..., seen=...):
+#   each   nested iteration levels [(var, list-expr), ...]; a falsy list is treated as empty. When the
+#          emit reads fields of var, items that are not objects (armGroups: [5]) are skipped and
+#          reported in an "invalid_items" dead-letter entry for the record
+#   let    derived variables [(var, expr), ...] computed per row before `when`
+#   when   expression; the row is skipped when falsy
+#   seen   (dedupe set name, key-expr); the writer drops rows whose key it has already written
+# Sections group the emits of one entity; --only selects sections by name and unselected sections
+# are never evaluated. Rows for a given file are emitted in schema order, which is the order the
+# file has always had. Section(name, emits, let=...) computes its let variables once per record,
+# before its emits, and every emit of the section can use them (a value several files are built from).
+
+def _strip(value):
+    return (value or "").strip()
+
+def _lower(value):
+    return value.lower()
+
+def _strip_lower(value):
+    return value.strip().lower()
+
+def _alias_key(alias, canonical_id):
+    return f"{alias.lower()}::{canonical_id}"
+
+def _active_alias(alias, canon):
+    # otherNames of a placebo ("Placebo (Ozempic)") name the drug it matches, not the placebo
+    return bool(alias) and canon is not None and canon["role"] == "active"
+
+def _concat_lists(*lists):
+    return [x for lst in lists for x in (lst or [])]
+
+def _outcome_key(measure):
+    return (measure or "unknown")[:120]
+
+def _site_text(value):
+    # "Hôpital Saint-Louis" and "HOPITAL SAINT LOUIS" fingerprint alike
+    s = (value or "").lower()
+    if not s.isascii():
+        s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in s).split())
+
+@lru_cache(maxsize=1 << 16)
+def _site_fingerprint(facility, city, state, zip_code, country):
+    key = "|".join(_site_text(v) for v in (facility, city, state, zip_code, country))
+    return f"{key_fingerprint(key):016x}"
+
+def _site_id(site):
+    # physical site fingerprint: facility and address (city, state, zip when present, country). The
+    # id depends only on the location itself, so it is stable across runs, shards and workers.
+    # Coordinates are left out: registries geocode the same address to slightly different points,
+    # and two facilities can share a building. Large sites recur in thousands of studies, hence the cache.
+    return _site_fingerprint(site.get("facility"), site.get("city"), site.get("state"), site.get("zip"),
+                             site.get("country"))
+
+class Emit:
+    def __init__(self, file, fields, each=(), let=(), when=None, seen=None):
+        self.file = file
+        self.fields = fields
+        self.each = each
+        self.let = let
+        self.when = when
+        self.seen = seen
+
+class Section:
+    def __init__(self, name, emits, extra_files=(), let=()):
+        self.name = name
+        self.emits = emits
+        self.let = let
+        # files owned by the section that no emit writes yet (still created, for loaders that expect them)
+        self.extra_files = extra_files
+
+    @property
+    def files(self):
+        return {e.file for e in self.emits} | set(self.extra_files)
+
+# trial node field map: (output key, expression, default), in output column order
+TRIAL_NODE_SPEC = [
+    ("nctId", "nct", None),
+    ("orgStudyId", "identification.orgStudyIdInfo.id", None),
+    ("briefTitle", "identification.briefTitle", None),
+    ("officialTitle", "identification.officialTitle", None),
+    ("acronym", "identification.acronym", None),
+    ("overallStatus", "protocol.statusModule.overallStatus", None),
+    ("statusVerifiedDate", "protocol.statusModule.statusVerifiedDate", None),
+    ("startDate", "protocol.statusModule.startDateStruct.date", None),
+    ("primaryCompletionDate", "protocol.statusModule.primaryCompletionDateStruct.date", None),
+    ("completionDate", "protocol.statusModule.completionDateStruct.date", None),
+    ("studyFirstSubmitDate", "protocol.statusModule.studyFirstSubmitDate", None),
+    ("studyFirstPostDate", "protocol.statusModule.studyFirstPostDateStruct.date", None),
+    ("lastUpdatePostDate", "protocol.statusModule.lastUpdatePostDateStruct.date", None),
+    ("studyType", "protocol.designModule.studyType", None),
+    ("phases", "protocol.designModule.phases", None),
+    ("interventionModel", "protocol.designModule.designInfo.interventionModel", None),
+    ("allocation", "protocol.designModule.designInfo.allocation", None),
+    ("primaryPurpose", "protocol.designModule.designInfo.primaryPurpose", None),
+    ("masking", "protocol.designModule.designInfo.maskingInfo.masking", None),
+    ("enrollmentCount", "protocol.designModule.enrollmentInfo.count", None),
+    ("enrollmentType", "protocol.designModule.enrollmentInfo.type", None),
+    ("briefSummary", "protocol.descriptionModule.briefSummary", None),
+    ("detailedDescription", "protocol.descriptionModule.detailedDescription", None),
+    ("hasResults", "record.hasResults", False),
+    ("ipdSharing", "protocol.ipdSharingStatementModule.ipdSharing", None),
+    ("versionHolder", "protocol.derivedSection.miscInfoModule.versionHolder", None),
+    ("rawJsonPath", ("fmt", "{}::{}", "input", "nct"), None),
+]
+
+SCHEMA = [
+    Section("trials", [
+        Emit("trials.jsonl",
+             [(key, ("get", expr, default) if default is not None else expr) for key, expr, default in TRIAL_NODE_SPEC],
+             seen=("trials", "nct")),
+    ]),
+    Section("sponsors", [
+        Emit("organizations.jsonl",
+             [("name", "lead.name"), ("class", "lead.class"),
+              ("rawSourceField", ("const", "sponsorCollaboratorsModule.leadSponsor"))],
+             let=[("lead", "protocol.sponsorCollaboratorsModule.leadSponsor")], when="lead.name",
+             seen=("orgs", ("call", _strip_lower, "lead.name"))),
+        Emit("trial_sponsoredby_rel.jsonl",
+             [("from_nct", "nct"), ("org_name", "lead.name"), ("role", ("const", "lead_sponsor"))],
+             let=[("lead", "protocol.sponsorCollaboratorsModule.leadSponsor")], when="lead.name"),
+    ]),
+    Section("conditions", [
+        # one node per canonical condition, named after the first spelling seen
+        Emit("conditions.jsonl",
+             [("name", "name"), ("rawSource", ("const", "conditionsModule.conditions")), ("canonicalId", "canon")],
+             each=[("cond", "protocol.conditionsModule.conditions")],
+             let=[("name", ("call", _strip, "cond")), ("canon", ("call", canonical_condition, "name"))], when="canon",
+             seen=("conditions", "canon")),
+        Emit("trial_studies_rel.jsonl",
+             [("from_nct", "nct"), ("condition_name", "name"), ("canonicalId", "canon")],
+             each=[("cond", "protocol.conditionsModule.conditions")],
+             let=[("name", ("call", _strip, "cond")), ("canon", ("call", canonical_condition, "name"))], when="canon"),
+        # spelling -> canonical id lookup table, once per distinct (case-insensitive) spelling
+        Emit("condition_aliases.jsonl",
+             [("alias", "name"), ("canonicalId", "canon")],
+             each=[("cond", "protocol.conditionsModule.conditions")],
+             let=[("name", ("call", _strip, "cond")), ("canon", ("call", canonical_condition, "name"))], when="canon",
+             seen=("condition_aliases", ("call", _alias_key, "name", "canon"))),
+    ]),
+    Section("interventions", [
+        Emit("interventions.jsonl",
+             [("name", "name"), ("type", "it.type"), ("description", "it.description"),
+              ("otherNames", ("get", "it.otherNames", [])),
+              ("rawSource", ("const", "armsInterventionsModule.interventions")),
+              ("canonicalId", "canon.id"), ("role", "canon.role")],
+             each=[("it", "protocol.armsInterventionsModule.interventions")],
+             let=[("name", ("call", normalize_intervention_name, "it.name")),
+                  ("canon", ("call", canonical_intervention, "it.name"))], when="name",
+             seen=("interventions", ("call", _lower, "name"))),
+        Emit("trial_uses_intervention_rel.jsonl",
+             [("from_nct", "nct"), ("intervention_name", "name"), ("canonicalId", "canon.id")],
+             each=[("it", "protocol.armsInterventionsModule.interventions")],
+             let=[("name", ("call", normalize_intervention_name, "it.name")),
+                  ("canon", ("call", canonical_intervention, "it.name"))], when="name"),
+        # alias -> canonical id lookup table: every listed name and otherName, once per pair
+        Emit("intervention_aliases.jsonl",
+             [("alias", "name"), ("canonicalId", "canon.id"), ("source", ("const", "name"))],
+             each=[("it", "protocol.armsInterventionsModule.interventions")],
+             let=[("name", ("call", normalize_intervention_name, "it.name")),
+                  ("canon", ("call", canonical_intervention, "it.name"))], when="name",
+             seen=("intervention_aliases", ("call", _alias_key, "name", "canon.id"))),
+        Emit("intervention_aliases.jsonl",
+             [("alias", "alias"), ("canonicalId", "canon.id"), ("source", ("const", "otherName"))],
+             each=[("it", "protocol.armsInterventionsModule.interventions"), ("other", "it.otherNames")],
+             let=[("alias", ("call", _strip, "other")), ("canon", ("call", canonical_intervention, "it.name"))],
+             when=("call", _active_alias, "alias", "canon"),
+             seen=("intervention_aliases", ("call", _alias_key, "alias", "canon.id"))),
+    ]),
+    Section("arms", [
+        Emit("arms.jsonl",
+             [("armId", ("fmt", "{}::{}", "nct", "arm.label")), ("label", "arm.label"), ("type", "arm.type"),
+              ("description", "arm.description"), ("interventionNames", ("get", "arm.interventionNames", [])),
+              ("nctId", "nct")],
+             each=[("arm", "protocol.armsInterventionsModule.armGroups")]),
+        Emit("trial_has_arm_rel.jsonl",
+             [("from_nct", "nct"), ("armId", ("fmt", "{}::{}", "nct", "arm.label"))],
+             each=[("arm", "protocol.armsInterventionsModule.armGroups")]),
+        Emit("arm_contains_intervention_rel.jsonl",
+             [("armId", ("fmt", "{}::{}", "nct", "arm.label")), ("intervention_name", "name"),
+              ("canonicalId", "canon.id")],
+             each=[("arm", "protocol.armsInterventionsModule.armGroups"), ("iname", "arm.interventionNames")],
+             let=[("name", ("call", normalize_intervention_name, "iname")),
+                  ("canon", ("call", canonical_intervention, "iname"))], when="name"),
+    ]),
+    Section("sites", [
+        # one row per physical site; the per-trial recruitment status lives on the edge
+        Emit("sites.jsonl",
+             [("siteId", "site_id"), ("facility", "site.facility"), ("city", "site.city"), ("state", "site.state"),
+              ("zip", "site.zip"), ("country", "site.country"),
+              ("latitude", "site.geoPoint.lat"), ("longitude", "site.geoPoint.lon")],
+             each=[("site", "protocol.contactsLocationsModule.locations")],
+             let=[("site_id", ("call", _site_id, "site"))],
+             seen=("sites", "site_id")),
+        Emit("trial_has_site_rel.jsonl",
+             [("from_nct", "nct"), ("siteId", ("call", _site_id, "site")), ("status", "site.status")],
+             each=[("site", "protocol.contactsLocationsModule.locations")]),
+    ]),
+    # people are written once per resolved identity (people.person_id); the per-trial role lives on the edge
+    Section("contacts", [
+        Emit("contacts.jsonl",
+             [("contactId", "contact_id"), ("name", "c.name"), ("phone", "c.phone"), ("email", "c.email")],
+             each=[("c", "protocol.contactsLocationsModule.centralContacts")],
+             let=[("contact_id", ("call", person_id, "c.name", ("const", None), "c.email", "nct"))], when="contact_id",
+             seen=("contacts", "contact_id")),
+        Emit("trial_has_contact_rel.jsonl",
+             [("from_nct", "nct"), ("contactId", "contact_id"), ("contact_name", "c.name"), ("role", "c.role")],
+             each=[("c", "protocol.contactsLocationsModule.centralContacts")],
+             let=[("contact_id", ("call", person_id, "c.name", ("const", None), "c.email", "nct"))],
+             when="contact_id"),
+    ]),
+    Section("investigators", [
+        Emit("investigators.jsonl",
+             [("personId", "person"), ("name", "of.name"), ("affiliation", "of.affiliation")],
+             each=[("of", "protocol.contactsLocationsModule.overallOfficials")],
+             let=[("person", ("call", person_id, "of.name", "of.affiliation", ("const", None), "nct"))], when="person",
+             seen=("investigators", "person")),
+        Emit("trial_has_investigator_rel.jsonl",
+             [("from_nct", "nct"), ("personId", "person"), ("investigator_name", "of.name"), ("role", "of.role")],
+             each=[("of", "protocol.contactsLocationsModule.overallOfficials")],
+             let=[("person", ("call", person_id, "of.name", "of.affiliation", ("const", None), "nct"))], when="person"),
+    ]),
+    Section("outcomes", [
+        Emit("outcomes.jsonl",
+             [("outcomeId", "outcome_id"), ("nctId", "nct"), ("measure", "measure"),
+              ("description", "o.description"), ("timeFrame", "o.timeFrame")],
+             each=[("o", ("call", _concat_lists, "protocol.outcomesModule.primaryOutcomes",
+                          "protocol.outcomesModule.secondaryOutcomes", "protocol.outcomesModule.otherOutcomes"))],
+             let=[("measure", ("or", "o.measure", "o.title")),
+                  ("outcome_id", ("fmt", "{}::{}", "nct", ("call", _outcome_key, "measure")))]),
+        Emit("trial_has_outcome_rel.jsonl",
+             [("from_nct", "nct"), ("outcomeId", ("fmt", "{}::{}", "nct", ("call", _outcome_key, ("or", "o.measure", "o.title"))))],
+             each=[("o", ("call", _concat_lists, "protocol.outcomesModule.primaryOutcomes",
+                          "protocol.outcomesModule.secondaryOutcomes", "protocol.outcomesModule.otherOutcomes"))]),
+    ]),
+    Section("results", [
+        Emit("results.jsonl",
+             [("resultId", "res_id"), ("nctId", "nct"), ("outcomeTitle", "om.title"), ("groupId", "m.groupId"),
+              ("value", "m.value"), ("spread", "m.spread")],
+             each=[("om", "results.outcomeMeasuresModule.outcomeMeasures"), ("cls", "om.classes"),
+                   ("cat", "cls.categories"), ("m", "cat.measurements")],
+             let=[("res_id", ("fmt", "{}::{}::{}", "nct", ("or", "om.title", "om.type"), "m.groupId"))]),
+        Emit("outcome_has_result_rel.jsonl",
+             [("outcomeTitle", "om.title"), ("resultId", ("fmt", "{}::{}::{}", "nct", ("or", "om.title", "om.type"), "m.groupId"))],
+             each=[("om", "results.outcomeMeasuresModule.outcomeMeasures"), ("cls", "om.classes"),
+                   ("cat", "cls.categories"), ("m", "cat.measurements")]),
+    ]),
+    Section("participant_flow", [
+        Emit("participant_flow_groups.jsonl",
+             [("flowGroupId", ("fmt", "{}::PF::{}", "nct", ("or", "g.id", "g.title"))), ("title", "g.title"),
+              ("description", "g.description"), ("nctId", "nct")],
+             each=[("g", "results.participantFlowModule.groups")]),
+        Emit("participantflow_has_achievement_rel.jsonl",
+             [("flowGroupId", ("fmt", "{}::PF::{}", "nct", "a.groupId")), ("periodTitle", "p.title"),
+              ("type", "ms.type"), ("numSubjects", "a.numSubjects"), ("nctId", "nct")],
+             each=[("p", "results.participantFlowModule.periods"), ("ms", "p.milestones"), ("a", "ms.achievements")]),
+    ]),
+    Section("baseline", [
+        Emit("baseline_groups.jsonl",
+             [("baselineGroupId", ("fmt", "{}::BG::{}", "nct", ("or", "g.title", "g.id"))), ("title", "g.title"),
+              ("description", "g.description"), ("nctId", "nct")],
+             each=[("g", "results.baselineCharacteristicsModule.groups")]),
+        Emit("baseline_measures.jsonl",
+             [("baselineMeasureId", ("fmt", "{}::BM::{}", "nct", "bm.title")), ("title", "bm.title"),
+              ("paramType", "bm.paramType"), ("unitOfMeasure", "bm.unitOfMeasure"), ("nctId", "nct"), ("raw", "bm")],
+             each=[("bm", "results.baselineCharacteristicsModule.measures")]),
+    ]),
+    Section("adverse_events", [
+        Emit("adverse_events.jsonl",
+             [("nctId", "nct"), ("groupId", "eg.id"), ("title", "eg.title"),
+              ("seriousNumAffected", "eg.seriousNumAffected"), ("otherNumAffected", "eg.otherNumAffected")],
+             each=[("eg", "results.adverseEventsModule.eventGroups")]),
+        Emit("adverse_events.jsonl",
+             [("adEventId", ("fmt", "{}::AE::{}", "nct", "se.term")), ("term", "se.term"),
+              ("organSystem", "se.organSystem"), ("assessmentType", "se.assessmentType"), ("nctId", "nct")],
+             each=[("se", "results.adverseEventsModule.seriousEvents")]),
+        Emit("adverseevent_has_stat_rel.jsonl",
+             [("adEventId", ("fmt", "{}::AE::{}", "nct", "se.term")), ("groupId", "st.groupId"),
+              ("numEvents", "st.numEvents"), ("numAffected", "st.numAffected"), ("numAtRisk", "st.numAtRisk"),
+              ("nctId", "nct")],
+             each=[("se", "results.adverseEventsModule.seriousEvents"), ("st", "se.stats")]),
+    ]),
+    # the criteria block is parsed once per record (section let); the rows and the summary share it
+    Section("eligibility", [
+        Emit("eligibility.jsonl",
+             [("criterionId", ("fmt", "{}::{}::#{}", "nct", "crit.tag", "crit.sequence")), ("nctId", "nct"),
+              ("type", "crit.type"), ("text", "crit.text"), ("sequence", "crit.sequence"),
+              ("level", "crit.level"), ("parentSequence", "crit.parent"),
+              ("measure", "crit.measure"), ("lowerBound", "crit.lower"), ("lowerInclusive", "crit.lowerInclusive"),
+              ("upperBound", "crit.upper"), ("upperInclusive", "crit.upperInclusive"), ("unit", "crit.unit"),
+              ("sex", "crit.sex")],
+             each=[("crit", "criteria")]),
+        Emit("eligibility_summary.jsonl",
+             [("nctId", "nct"), ("sex", "summary.sex"), ("minimumAgeYears", "summary.minimumAgeYears"),
+              ("maximumAgeYears", "summary.maximumAgeYears"), ("healthyVolunteers", "summary.healthyVolunteers"),
+              ("stdAges", "summary.stdAges"), ("inclusionCount", "summary.inclusionCount"),
+              ("exclusionCount", "summary.exclusionCount"), ("include", "summary.include"),
+              ("exclude", "summary.exclude")],
+             let=[("summary", ("call", eligibility_summary, "protocol.eligibilityModule", "criteria"))],
+             when="protocol.eligibilityModule"),
+    ], let=[("criteria", ("call", structured_criteria, "protocol.eligibilityModule.eligibilityCriteria"))]),
+    Section("publications", [
+        Emit("publications.jsonl",
+             [("publicationId", "pubid"), ("pmid", "ref.pmid"), ("citation", "ref.citation"), ("type", "ref.type"),
+              ("nctId", "nct")],
+             each=[("ref", "protocol.referencesModule.references")],
+             let=[("pubid", ("or", "ref.pmid", ("fmt", "{}::REF::{}", "nct", ("or", "ref.type", ("const", "other")))))]),
+        # historical quirk: reference links share the contact relationship file
+        Emit("trial_has_contact_rel.jsonl",
+             [("from_nct", "nct"), ("publicationId", ("or", "ref.pmid", ("fmt", "{}::REF::{}", "nct", ("or", "ref.type", ("const", "other")))))],
+             each=[("ref", "protocol.referencesModule.references")]),
+    ]),
+    Section("versions", [
+        Emit("versions.jsonl",
+             [("versionId", "protocol.derivedSection.miscInfoModule.versionHolder"), ("nctId", "nct")],
+             when="protocol.derivedSection.miscInfoModule.versionHolder"),
+    ], extra_files=["trial_has_version_rel.jsonl"]),
+]
+SECTION_NAMES = [sec.name for sec in SCHEMA]
+
+# Column types for the columnar output formats (--format parquet/arrow); unlisted columns are strings.
+# "list" is a list of strings, "json" keeps a nested payload as a JSON string, "category" /
+# "category_list" are dictionary-encoded strings for fields with a small, repeated vocabulary.
+COLUMN_TYPES = {
+    "enrollmentCount": "int", "hasResults": "bool", "phases": "category_list",
+    "otherNames": "list", "interventionNames": "list",
+    "latitude": "float", "longitude": "float",
+    "numSubjects": "int", "seriousNumAffected": "int", "otherNumAffected": "int",
+    "numEvents": "int", "numAffected": "int", "numAtRisk": "int",
+    "sequence": "int", "level": "int", "parentSequence": "int", "raw": "json",
+    "lowerBound": "float", "upperBound": "float", "lowerInclusive": "bool", "upperInclusive": "bool",
+    "minimumAgeYears": "float", "maximumAgeYears": "float", "healthyVolunteers": "bool", "stdAges": "category_list",
+    "inclusionCount": "int", "exclusionCount": "int", "include": "json", "exclude": "json",
+    # small vocabularies repeated across millions of rows
+    "overallStatus": "category", "studyType": "category", "interventionModel": "category",
+    "allocation": "category", "primaryPurpose": "category", "masking": "category", "enrollmentType": "category",
+    "ipdSharing": "category", "type": "category", "role": "category", "status": "category", "class": "category",
+    "country": "category", "state": "category", "sex": "category", "unit": "category", "paramType": "category",
+    "rawSource": "category", "rawSourceField": "category", "source": "category",
+}
+
+def file_columns():
+    """Staging file -> [(column, kind)]: the union of its emits' fields in first-seen order."""
+    columns = {}
+    for sec in SCHEMA:
+        for e in sec.emits:
+            cols = columns.setdefault(e.file, {})
+            for key, _ in e.fields:
+                cols.setdefault(key, COLUMN_TYPES.get(key, "string"))
+    return {fname: list(cols.items()) for fname, cols in columns.items()}
+
+# --------------------------
+# Schema engine
+# --------------------------
+# Each Emit is compiled once, at import, into a plain Python function whose body is the loops,
+# lookups and dict literal the spec describes (see compile_emit). Per-record cost is then the
+# same as hand-written extraction code; the schema stays the single source of truth.
+SCOPE_VARS = ("record", "protocol", "identification", "results", "nct", "input")
+
+class _EmitCompiler:
+    def __init__(self):
+        self.consts = {}
+        self.dict_vars = set()  # variables some expression reads a field of
+
+    def const(self, value):
+        name = f"_c{len(self.consts)}"
+        self.consts[name] = value
+        return name
+
+    def expr(self, expr):
+        """Schema expression -> Python source evaluated against v_<var> locals."""
+        if isinstance(expr, str):
+            return self.path(expr, None)
+        op = expr[0]
+        if op == "get":
+            return self.path(expr[1], expr[2])
+        if op == "const":
+            return self.const(expr[1])
+        if op == "or":
+            return "(" + " or ".join(self.expr(e) for e in expr[1:]) + ")"
+        if op == "fmt":
+            args = ", ".join(self.expr(e) for e in expr[2:])
+            return f"{self.const(expr[1])}.format({args})"
+        if op == "call":
+            args = ", ".join(self.expr(e) for e in expr[2:])
+            return f"{self.const(expr[1])}({args})"
+        raise ValueError(f"Unknown schema expression: {expr!r}")
+
+    def path(self, path, default):
+        var, _, rest = path.partition(".")
+        dflt = self.const(default) if default is not None else "None"
+        if not rest:
+            return f"v_{var}"
+        self.dict_vars.add(var)
+        keys = compile_path(rest)
+        if len(keys) == 1:
+            # most fields are one key below a loop variable: inline the lookup
+            return f"(v_{var}.get({keys[0]!r}, {dflt}) if isinstance(v_{var}, dict) else {dflt})"
+        return f"_get_path(v_{var}, {keys!r}, {dflt})"
+
+def compile_emit(spec: Emit, scope_vars=SCOPE_VARS):
+    """Compile an Emit into run(scope, emit), which walks its `each` levels and emits one row per item."""
+    c = _EmitCompiler()
+    # compile every expression first, so the loops know which variables must be objects
+    loops = [(var, src, c.expr(src)) for var, src in spec.each]
+    lets = [(var, c.expr(e)) for var, e in spec.let]
+    when = c.expr(spec.when) if spec.when is not None else None
+    obj = "{" + ", ".join(f"{key!r}: {c.expr(e)}" for key, e in spec.fields) + "}"
+    seen = f"({spec.seen[0]!r}, {c.expr(spec.seen[1])})" if spec.seen else "None"
+    lines = ["def run(scope, emit):"]
+    lines += [f"    v_{var} = scope[{var!r}]" for var in scope_vars]
+    if any(var in c.dict_vars for var, _, _ in loops):
+        lines.append("    invalid_item = scope['invalid_item']")
+    indent = "    "
+    for var, src, code in loops:
+        lines.append(f"{indent}for v_{var} in {code} or ():")
+        indent += "    "
+        if var in c.dict_vars:
+            label = src if isinstance(src, str) else var
+            lines.append(f"{indent}if not isinstance(v_{var}, dict):")
+            lines.append(f"{indent}    invalid_item({label!r}, v_{var})")
+            lines.append(f"{indent}    continue")
+    for var, code in lets:
+        lines.append(f"{indent}v_{var} = {code}")
+    if when is not None:
+        lines.append(f"{indent}if {when}:")
+        indent += "    "
+    lines.append(f"{indent}emit({spec.file!r}, {obj}, {seen})")
+    namespace = dict(c.consts, _get_path=get_path)
+    exec(compile("\n".join(lines) + "\n", f"<schema:{spec.file}>", "exec"), namespace)
+    return namespace["run"]
+
+def compile_section(sec: Section):
+    """Section -> its run functions: one that adds the section's let variables to the scope, then its emits."""
+    if not sec.let:
+        return [compile_emit(e) for e in sec.emits]
+    c = _EmitCompiler()
+    lines = ["def run(scope, emit):"]
+    lines += [f"    v_{var} = scope[{var!r}]" for var in SCOPE_VARS]
+    lines += [f"    v_{var} = scope[{var!r}] = {c.expr(e)}" for var, e in sec.let]
+    namespace = dict(c.consts, _get_path=get_path)
+    exec(compile("\n".join(lines) + "\n", f"<schema:{sec.name}>", "exec"), namespace)
+    scope_vars = SCOPE_VARS + tuple(var for var, _ in sec.let)
+    return [namespace["run"]] + [compile_emit(e, scope_vars) for e in sec.emits]
+
+COMPILED_SECTIONS = {sec.name: compile_section(sec) for sec in SCHEMA}
+
+def resolve_sections(only=None, skip=None):
+    """Validate --only/--skip selections; returns enabled section names in schema order."""
+    unknown = (set(only or ()) | set(skip or ())) - set(SECTION_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown section(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(SECTION_NAMES)}")
+    return [name for name in SECTION_NAMES if (not only or name in only) and name not in (skip or ())]
+
+def section_files(sections):
+    """Staging files written by the given sections."""
+    files = set()
+    for sec in SCHEMA:
+        if sec.name in sections:
+            files |= sec.files
+    return files
+
+# --------------------------
+# Per-section timing
+# --------------------------
+# Cumulative wall time spent in each section (mapping + serialization) by this process, plus JSON
+# parsing of raw records under "parse".
+SECTION_SECONDS = {name: 0.0 for name in ["parse"] + SECTION_NAMES}
+
+def take_section_seconds():
+    """Return and reset this process's accumulated section timings (used to ship worker timings back)."""
+    snapshot = dict(SECTION_SECONDS)
+    for name in SECTION_SECONDS:
+        SECTION_SECONDS[name] = 0.0
+    return snapshot
+
+def load_section_profile(outdir: Path):
     try:
-        # fast check first char
-        with open_input(path) as fh:
-            first_non_ws = None
-            while True:
-                ch = fh.read(1)
-                if not ch:
-                    break
-                if not ch.isspace():
-                    first_non_ws = ch
-                    break
-            fh.seek(0)
-            if first_non_ws == "[":
-                # JSON array: parse (may be heavy)
-                logging.info("Input looks like a JSON array (starts with '['). Attempting to parse entire array to count elements (may use a lot of memory).")
-                data = json.load(fh)
-                count = len(data)
-                logging.info(f"Counted {count} elements in JSON array.")
-                return count
+        with open(outdir / SECTION_TIMINGS_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def report_section_timings(outdir: Path, sections, seconds, processed):
+    """
+    Log time spent per enabled section and the estimated time saved per skipped one.
+
+    Savings are estimated from the per-record cost recorded the last time that section ran
+    against this output directory (section_timings.json), scaled to this run's record count.
+    The profile is then updated with this run's measurements.
+    """
+    profile = load_section_profile(outdir)
+    logging.info("Section timings:")
+    for name in SECTION_NAMES:
+        if name in sections:
+            logging.info(f"  {name}: {seconds[name]:.2f}s")
+            if processed:
+                profile[name] = {"seconds": seconds[name], "records": processed}
+        else:
+            prev = profile.get(name)
+            if prev and prev.get("records"):
+                saved = prev["seconds"] / prev["records"] * processed
+                logging.info(f"  {name}: skipped, ~{saved:.2f}s saved (from previous run profile)")
             else:
-                # JSONL: count lines
-                cnt = 0
-                for _ in fh:
-                    cnt += 1
-                logging.info(f"Counted {cnt} lines in input JSONL.")
-                return cnt
+                logging.info(f"  {name}: skipped (no previous timing to estimate savings)")
+    with open(outdir / SECTION_TIMINGS_NAME, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2, sort_keys=True)
+
+# --------------------------
+# Progress reporting
+# --------------------------
+# Reporters get update(offset, counters) once per consumed chunk/record and redraw at most every
+# `interval` seconds. offset is the on-disk input byte offset (compressed offset for .gz).
+# (postfix label, counter)
+PROGRESS_COUNTERS = [("trials", "trials"), ("orgs", "orgs"), ("ints", "interventions"), ("arms", "arms"),
+                     ("outcomes", "outcomes"), ("results", "results"), ("elig", "elig")]
+
+class SilentProgress:
+    default_interval = 0.0
+
+    def __init__(self, total: int, initial: int = 0, interval=None):
+        self.total = total
+        self.interval = self.default_interval if interval is None else interval
+        self.last = 0.0
+
+    def update(self, offset, counters):
+        pass
+
+    def close(self, offset, counters):
+        pass
+
+class TqdmProgress(SilentProgress):
+    default_interval = 0.5
+
+    def __init__(self, total: int, initial: int = 0, interval=None):
+        super().__init__(total, initial, interval)
+        from tqdm import tqdm
+        # tqdm's own throttle stays on as well; ours also skips the postfix dict build
+        self.pbar = tqdm(total=total, initial=initial, desc="Processing trials", unit="B",
+                         unit_scale=True, unit_divisor=1024, mininterval=self.interval)
+
+    def update(self, offset, counters):
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self._draw(offset, counters)
+
+    def _draw(self, offset, counters):
+        self.pbar.update(offset - self.pbar.n)
+        self.pbar.set_postfix({label: counters[key] for label, key in PROGRESS_COUNTERS}, refresh=False)
+
+    def close(self, offset, counters):
+        self._draw(offset, counters)
+        self.pbar.close()
+
+class LogProgress(SilentProgress):
+    """One INFO line per interval: for schedulers and log collectors, where a redrawn bar is noise."""
+    default_interval = 10.0
+
+    def __init__(self, total: int, initial: int = 0, interval=None):
+        super().__init__(total, initial, interval)
+        self.started = self.last = time.perf_counter()
+        self.initial = initial
+
+    def update(self, offset, counters):
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self._log(now, offset, counters)
+
+    def _log(self, now, offset, counters):
+        pct = 100.0 * offset / self.total if self.total else 100.0
+        rate = (offset - self.initial) / max(now - self.started, 1e-9) / (1 << 20)
+        postfix = ", ".join(f"{label}={counters[key]}" for label, key in PROGRESS_COUNTERS)
+        logging.info(f"Progress: {pct:.1f}% of {self.total} bytes, {rate:.2f} MiB/s, {postfix}")
+
+    def close(self, offset, counters):
+        self._log(time.perf_counter(), offset, counters)
+
+PROGRESS_REPORTERS = {"tqdm": TqdmProgress, "log": LogProgress, "none": SilentProgress}
+
+# --------------------------
+# Run metrics (metrics.json)
+# --------------------------
+class RunMetrics:
+    """
+    Stage wall times and throughput for one run, written to metrics.json every `interval` seconds
+    (0 = only at the end) and when the run completes.
+
+    Main-process stages: extract (serial mapping, parse included), wait (blocked on worker results),
+    write (dedupe + buffered writes) and checkpoint; read_other is the remainder (input reading and
+    decompression, progress display). Parse and section times are summed over the processes that did
+    the mapping, so with --workers they can exceed wall time. Rates cover this invocation only.
+    """
+    def __init__(self, path: Path, interval: float = DEFAULT_METRICS_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last_write = self.started
+        self.stages = {"extract": 0.0, "wait": 0.0, "write": 0.0, "checkpoint": 0.0}
+
+    def due(self, now: float):
+        return self.interval > 0 and now - self.last_write >= self.interval
+
+    def write(self, records, processed, input_bytes, output_bytes, section_seconds, counters, complete=False):
+        now = time.perf_counter()
+        self.last_write = now
+        elapsed = now - self.started
+        def rate(n):
+            return round(n / elapsed, 2) if elapsed > 0 else 0.0
+        stages = {name: round(secs, 3) for name, secs in self.stages.items()}
+        stages["read_other"] = round(max(0.0, elapsed - sum(self.stages.values())), 3)
+        metrics = {
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "complete": complete,
+            "elapsed_seconds": round(elapsed, 3),
+            "records": records, "processed": processed, "records_per_second": rate(records),
+            "input_bytes": input_bytes, "input_bytes_per_second": rate(input_bytes),
+            "output_bytes": output_bytes, "output_bytes_per_second": rate(output_bytes),
+            "stages": stages,
+            "sections": {name: round(secs, 3) for name, secs in section_seconds.items()},
+            "rows": counters,
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+        os.replace(tmp, self.path)
+        return metrics
+
+# --------------------------
+# Extraction logic (one record -> emitted lines)
+# --------------------------
+# node files that feed the progress/summary counters
+COUNTER_FOR_FILE = {
+    "trials.jsonl": "trials", "organizations.jsonl": "orgs", "conditions.jsonl": "conditions",
+    "interventions.jsonl": "interventions", "arms.jsonl": "arms", "sites.jsonl": "sites",
+    "contacts.jsonl": "contacts", "investigators.jsonl": "investigators", "outcomes.jsonl": "outcomes",
+    "results.jsonl": "results", "eligibility.jsonl": "elig", "publications.jsonl": "pubs"
+}
+
+LAST_UPDATE_PATH = ("statusModule", "lastUpdatePostDateStruct", "date")
+
+def extract_record(raw_item, input_path: Path, sections=None, encode: bool = True, offset=None):
+    """
+    Parse and map a single input record (raw JSONL line or already-parsed dict).
+
+    Returns (out, study) where out is a list of (filename, serialized_line, seen) tuples
+    in emission order and study is (nctId, lastUpdatePostDate) for a record with an nctId, or None
+    if the record went to the dead letter file without one. `seen` is None or a (dedupe_set_name, key) pair; dedupe itself is left
+    to the caller so it can be applied in input order even when records are mapped in parallel.
+    Dead-letter entries are emitted under DEAD_LETTER_NAME. `sections` limits extraction to the
+    named schema sections (default: all). With encode=False, rows are left as dicts for the
+    columnar writers (dead-letter entries are always serialized lines). `offset` is the input position
+    just before the record; dead-letter entries carry it with the input path so --replay can read the
+    record again without a scan.
+    """
+    out = []
+    dumps_line = CODEC.dumps_line
+
+    if encode:
+        def emit(fname, obj, seen=None):
+            out.append((fname, dumps_line(obj), seen))
+    else:
+        def emit(fname, obj, seen=None):
+            out.append((fname, dumps_line(obj) if fname == DEAD_LETTER_NAME else obj, seen))
+
+    def dead_letter(entry):
+        entry["input"] = str(input_path)
+        entry["offset"] = offset
+        emit(DEAD_LETTER_NAME, entry)
+
+    # parse raw_item (raw JSONL line as bytes/str, or a dict)
+    if isinstance(raw_item, (bytes, str)):
+        t0 = time.perf_counter()
+        try:
+            js = CODEC.loads(raw_item)
+            SECTION_SECONDS["parse"] += time.perf_counter() - t0
+        except Exception as e:
+            logging.exception("JSON parse error")
+            line = raw_item.decode("utf-8", errors="replace") if isinstance(raw_item, bytes) else raw_item
+            dead_letter({"error": "parse", "line": line.strip()[:400]})
+            return out, None
+    else:
+        # already a dict (when iterating over JSON array)
+        js = raw_item
+
+    nctId = None
+    ps = {}
+    try:
+        ps = js.get("protocolSection", {})
+        idm = ps.get("identificationModule", {})
+        nctId = safe_get(idm, "nctId")
+        if not nctId:
+            dead_letter({"error": "missing_nct", "record_excerpt": str(js)[:400]})
+            return out, None
+
+        invalid = {}  # (list path, item excerpt) -> None, in first-seen order
+
+        def invalid_item(path, item):
+            invalid[(path, repr(item)[:200])] = None
+
+        scope = {
+            "record": js, "protocol": ps, "identification": idm,
+            "results": js.get("resultsSection", {}) or {},
+            "nct": nctId, "input": input_path, "invalid_item": invalid_item,
+        }
+        for name in (sections or SECTION_NAMES):
+            t0 = time.perf_counter()
+            for run in COMPILED_SECTIONS[name]:
+                run(scope, emit)
+            SECTION_SECONDS[name] += time.perf_counter() - t0
+        if invalid:
+            # the record's other rows are written; the skipped items are reported once each
+            dead_letter({"error": "invalid_items", "nctId": nctId,
+                         "items": [{"path": path, "item": item} for path, item in invalid]})
+
     except Exception as e:
-        logging.exception("Failed to estimate total lines (will run without total).")
+        logging.exception("Error processing trial")
+        dead_letter({"error": str(e), "nctId": nctId, "excerpt": str(js)[:400]})
+        if not nctId:
+            # not a study object at all ([1, 2], null, ...): nothing to route or record
+            return out, None
+
+    return out, (nctId, get_path(ps, LAST_UPDATE_PATH))
+
+def _init_worker(codec_name: str, mapping_paths=None):
+    # spawn-based platforms re-import the module, so re-select the parent's codec and tables explicitly
+    set_codec(codec_name)
+    load_mappings(mapping_paths)
+
+def _extract_chunk(args):
+    """Pool worker: map a chunk of raw records, preserving order."""
+    chunk, offsets, input_path, sections, encode = args
+    return ([extract_record(item, input_path, sections, encode, offset) for item, offset in zip(chunk, offsets)],
+            take_section_seconds())
+
+def _with_offsets(records, start):
+    """
+    (position, raw_item) -> ((offset, position), raw_item), where offset is the position just before
+    the record (the previous record's position, or `start`): InputStream.records(offset) reads this
+    record first. Applied before any filtering, so skipped records do not shift the offsets.
+    """
+    offset = start
+    for position, raw_item in records:
+        yield (offset, position), raw_item
+        offset = position
+
+def _chunked(records, size, raw_fp):
+    """
+    Group ((offset, position), raw_item) records into chunks of raw items and their (offset, position)
+    spans. Each chunk is yielded with the resume position after its last record and the on-disk byte
+    offset reached (for progress).
+    """
+    chunk = []
+    spans = []
+    position = None
+    for span, item in records:
+        chunk.append(item)
+        spans.append(span)
+        position = span[1]
+        if len(chunk) >= size:
+            yield chunk, spans, position, raw_fp.tell()
+            chunk = []
+            spans = []
+    if chunk:
+        yield chunk, spans, position, raw_fp.tell()
+
+# --------------------------
+# Dead-letter replay (--replay)
+# --------------------------
+# Dead-letter entries carry the input path and the offset just before the failed record (the
+# uncompressed byte offset for JSONL, the character offset after the previous element for JSON
+# arrays). --replay reads those records straight from the input and runs extraction only for them,
+# so a mapping fix can be checked on the failures without a full run.
+def read_dead_letter(path: Path):
+    """Entries of a dead-letter file (plain, .gz or .zst)."""
+    name = str(path)
+    if name.endswith(".gz"):
+        fh = gzip.open(path, "rb")
+    elif name.endswith(".zst"):
+        import zstandard
+        fh = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    else:
+        fh = open(path, "rb")
+    with fh:
+        return [CODEC.loads(line) for line in fh if line.strip()]
+
+def replay_offsets(entries, input_path: Path):
+    """Sorted distinct offsets of the dead-letter entries recorded for input_path, and a count of the others."""
+    offsets = set()
+    other = 0
+    for entry in entries:
+        if "offset" in entry and Path(entry.get("input") or "").resolve() == input_path.resolve():
+            offsets.add(entry["offset"])
+        else:
+            other += 1
+    # None (the first element of a JSON array) sorts first
+    return sorted(offsets, key=lambda o: (o is not None, o or 0)), other
+
+def replay_records(inp: InputStream, offsets):
+    """
+    Yield ((offset, position), raw_item) for the record right after each offset, in offset order.
+    JSONL seeks to each offset (plain files directly; gzip decompresses forward, without parsing).
+    JSON arrays have no byte offsets to seek to, so their elements are scanned, but only the
+    listed ones are mapped.
+    """
+    if inp.fmt == "jsonl":
+        for offset in offsets:
+            inp.stream.seek(offset)
+            for position, line in iter_jsonl(inp.stream, offset):
+                yield (offset, position), line
+                break
+        return
+    wanted = set(offsets)
+    previous = None
+    for position, item in inp.records():
+        if previous in wanted:
+            yield (previous, position), item
+        previous = position
+
+# --------------------------
+# Writer side (dedupe + write, always in input order)
+# --------------------------
+def apply_record_output(out, writers, dead_letter_fp, seen, counters, journal=None):
+    for fname, line, seen_key in out:
+        if fname == DEAD_LETTER_NAME:
+            dead_letter_fp.write(line)
+            continue
+        if seen_key is not None:
+            kind, key = seen_key
+            if not seen[kind].add_new(key):
+                continue
+            if journal is not None:
+                journal.write(CODEC.dumps_line([kind, key]))
+        writers[fname].write(line)
+        counter = COUNTER_FOR_FILE.get(fname)
+        if counter:
+            counters[counter] += 1
+
+# --------------------------
+# Dedupe stores (the seen_* sets)
+# --------------------------
+# Every store supports `key in store`, store.add(key), store.add_new(key) (add, returning False if
+# the key was already present), len(store) and close().
+#   set    - plain in-memory set of strings (exact, largest memory)
+#   hashed - 64-bit blake2b fingerprints in a sorted array plus a small unsorted tail; ~10-20 bytes
+#            per key. A false "already seen" needs a 64-bit collision (~n^2 / 2^65).
+#   disk   - SQLite table per dedupe kind in the output directory; memory independent of key count
+DEDUPE_KINDS = ("trials", "orgs", "conditions", "condition_aliases", "interventions", "intervention_aliases",
+                "sites", "investigators", "contacts")
+DEDUPE_DB_NAME = "dedupe_index.sqlite"
+
+class SetStore:
+    def __init__(self):
+        self.keys = set()
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, key):
+        self.keys.add(key)
+
+    def add_new(self, key):
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def __len__(self):
+        return len(self.keys)
+
+    def close(self):
+        pass
+
+def key_fingerprint(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+BUCKET_BITS = 16  # HashedStore indexes its sorted array by the top bits of the fingerprint
+
+class HashedStore:
+    def __init__(self, min_tail: int = 1 << 16):
+        self.sorted = array("Q")
+        # starts[b] is the index of the first fingerprint whose top BUCKET_BITS are >= b, so a lookup
+        # bisects one bucket (~n / 65536 entries) instead of the whole array
+        self.starts = array("Q", [0]) * ((1 << BUCKET_BITS) + 1)
+        self.tail = set()
+        self.min_tail = min_tail
+
+    def _has(self, h):
+        if h in self.tail:
+            return True
+        b = h >> (64 - BUCKET_BITS)
+        i = bisect.bisect_left(self.sorted, h, self.starts[b], self.starts[b + 1])
+        return i < len(self.sorted) and self.sorted[i] == h
+
+    def __contains__(self, key):
+        return self._has(key_fingerprint(key))
+
+    def _add(self, h):
+        self.tail.add(h)
+        # merge once the tail is a fixed fraction of the array, so merges stay amortized O(1) per key;
+        # the unsorted tail holds Python ints, so the fraction is kept small
+        if len(self.tail) >= max(self.min_tail, len(self.sorted) >> 4):
+            self._merge()
+
+    def _merge(self):
+        # the fingerprints stay 8-byte machine integers throughout (a list of Python ints is ~5x larger):
+        # peak memory is the old and the merged array
+        shift = 64 - BUCKET_BITS
+        try:
+            import numpy as np
+        except ImportError:
+            merged = array("Q", heapq.merge(self.sorted, sorted(self.tail)))
+            starts = array("Q", [bisect.bisect_left(merged, b << shift) for b in range(1 << BUCKET_BITS)])
+        else:
+            old = np.frombuffer(self.sorted, dtype=np.uint64)
+            tail = np.fromiter(self.tail, dtype=np.uint64, count=len(self.tail))
+            tail.sort()
+            merged = array("Q", [0]) * (len(old) + len(tail))
+            out = np.frombuffer(merged, dtype=np.uint64)
+            # tail keys land at their insertion point shifted by the tail keys before them
+            at = np.searchsorted(old, tail) + np.arange(len(tail))
+            out[at] = tail
+            rest = np.ones(len(out), dtype=bool)
+            rest[at] = False
+            out[rest] = old
+            bounds = np.arange(1 << BUCKET_BITS, dtype=np.uint64) << np.uint64(shift)
+            starts = array("Q", np.searchsorted(out, bounds).astype(np.uint64).tobytes())
+            del old, out  # release the buffer exports before the arrays are replaced
+        starts.append(len(merged))
+        self.sorted = merged
+        self.starts = starts
+        self.tail = set()
+
+    def add(self, key):
+        self._add(key_fingerprint(key))
+
+    def add_new(self, key):
+        h = key_fingerprint(key)
+        if self._has(h):
+            return False
+        self._add(h)
+        return True
+
+    def __len__(self):
+        return len(self.sorted) + len(self.tail)
+
+    def close(self):
+        pass
+
+class SqliteStore:
+    def __init__(self, conn, table: str):
+        self.conn = conn
+        self.table = table
+        self.count = 0
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (k TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._has = f"SELECT 1 FROM {table} WHERE k = ?"
+        self._add = f"INSERT OR IGNORE INTO {table} (k) VALUES (?)"
+
+    def __contains__(self, key):
+        return self.conn.execute(self._has, (key,)).fetchone() is not None
+
+    def add(self, key):
+        self.add_new(key)
+
+    def add_new(self, key):
+        added = self.conn.execute(self._add, (key,)).rowcount == 1
+        self.count += added
+        return added
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.conn.commit()
+
+DEDUPE_STORES = ["set", "hashed", "disk"]
+
+def open_dedupe_stores(store: str, outdir: Path):
+    """
+    One store per dedupe kind. The disk index is rebuilt on every run (a resume replays the
+    dedupe journal into it), so it is never a second source of truth.
+    """
+    if store == "set":
+        return {kind: SetStore() for kind in DEDUPE_KINDS}
+    if store == "hashed":
+        return {kind: HashedStore() for kind in DEDUPE_KINDS}
+    if store == "disk":
+        db_path = outdir / DEDUPE_DB_NAME
+        if db_path.exists():
+            db_path.unlink()
+        conn = sqlite3.connect(db_path)
+        # rebuildable from the journal: no need for rollback journaling or fsync
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        return {kind: SqliteStore(conn, f"seen_{kind}") for kind in DEDUPE_KINDS}
+    raise ValueError(f"Unknown dedupe store: {store}")
+
+def close_dedupe_stores(seen):
+    conns = set()
+    for st in seen.values():
+        st.close()
+        if isinstance(st, SqliteStore):
+            conns.add(st.conn)
+    for conn in conns:
+        conn.close()
+
+# --------------------------
+# Checkpoints (resume after a crash)
+# --------------------------
+# A checkpoint records, after all output has been flushed and fsynced:
+#   - the input resume position (see InputStream.records) and input identity (size, mtime)
+#   - every output file's size, so --resume can truncate writes made after the checkpoint, and its row count
+#   - the size of the dedupe journal, an append-only log of keys added to the seen_* sets
+#   - counters, the enabled sections and the JSON backend (a resume must use the same ones)
+#   - with --raw-index, the committed index rows and the size of its block file
+def input_identity(input_path: Path):
+    st = os.stat(input_path)
+    return {"input": str(input_path), "input_size": st.st_size, "input_mtime_ns": st.st_mtime_ns}
+
+def load_checkpoint(outdir: Path):
+    try:
+        with open(outdir / CHECKPOINT_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
         return None
 
+def write_checkpoint(outdir: Path, state, writers, dead_letter_fp, journal, raw_index=None):
+    # sizes are keyed by path relative to outdir (compressed files carry a .gz/.zst suffix)
+    outputs = {fp.path.relative_to(outdir).as_posix(): fp.sync() for fp in list(writers.values()) + [dead_letter_fp, journal]}
+    if raw_index is not None:
+        size = raw_index.sync()
+        if raw_index.blocks_path is not None:
+            outputs[raw_index.blocks_path.relative_to(outdir).as_posix()] = size
+    rows = {name: fp.lines_written for name, fp in writers.items()}
+    state = dict(state, outputs=outputs, rows=rows, updated=datetime.now().isoformat(timespec="seconds"))
+    tmp = outdir / (CHECKPOINT_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, outdir / CHECKPOINT_NAME)
+
+def restore_checkpoint(outdir: Path, ckpt, input_path: Path, sections, seen, shards: int = 1, raw_index: bool = False):
+    """Validate a checkpoint against this run, truncate partial trailing writes and reload dedupe state."""
+    ident = input_identity(input_path)
+    for key in ("input_size", "input_mtime_ns"):
+        if ckpt.get(key) != ident[key]:
+            raise ValueError(f"Input {input_path} changed since the checkpoint ({key}); cannot resume")
+    if ckpt.get("sections") != sections:
+        raise ValueError(f"Checkpoint was taken with sections {ckpt.get('sections')}; resume with the same --only/--skip")
+    if ckpt.get("shards", 1) != shards:
+        raise ValueError(f"Checkpoint was taken with --shards {ckpt.get('shards', 1)}; resume with the same --shards")
+    if ckpt.get("raw_index", False) != raw_index:
+        raise ValueError("Checkpoint was taken " + ("with" if ckpt.get("raw_index") else "without") +
+                         " --raw-index; resume with the same option")
+    if ckpt.get("json_backend") != CODEC.name:
+        raise ValueError(f"Checkpoint was written with JSON backend {ckpt.get('json_backend')}; resume with --json-backend {ckpt.get('json_backend')}")
+    check_mappings(ckpt.get("mappings"), "Checkpoint")
+    for name, size in ckpt["outputs"].items():
+        path = outdir / name
+        if path.exists() and path.stat().st_size > size:
+            os.truncate(path, size)
+    with open(outdir / DEDUPE_JOURNAL_NAME, "rb") as f:
+        for line in f:
+            kind, key = CODEC.loads(line)
+            seen[kind].add(key)
+
 # --------------------------
-# Extraction logic (single pass with progress)
+# Incremental runs (study manifest + deltas)
 # --------------------------
-def process_file_with_progress(input_path: Path, outdir: Path):
-    writers = open_writers(outdir)
-    dead_letter_fp = open(outdir / DEAD_LETTER_NAME, "a", encoding="utf-8")
+# With --manifest, every mapped study is recorded as nctId -> (lastUpdatePostDate, hash of the raw
+# record, digest of the rows it emitted into each staging file). With --incremental the previous
+# manifest is consulted first: a record whose raw hash is already known is skipped before it is
+# parsed, so parsing, mapping and writing scale with the change set (reading and hashing the dump
+# still scale with its size). For a changed study only the staging files whose row digest changed
+# are written, as upserts; for each such file that the study owns, {"nctId": ...} is written to
+# <file>.deletes.jsonl first, meaning "drop this study's previous rows from <file>". Studies missing
+# from the new dump get delete markers for every file they had. Shared node files (organizations,
+# conditions, interventions, sites, people) only ever receive upserts. The new manifest replaces the old one only
+# when the run completes. If a dump repeats an nctId and one copy changes, the delta keeps only the
+# rows of the copies that were re-extracted.
+def delete_name(fname: str):
+    return fname[:-len(".jsonl")] + ".deletes.jsonl"
 
-    # small in-script dedupe sets to reduce duplicate writes
-    seen_orgs = set()
-    seen_conditions = set()
-    seen_interventions = set()
-    seen_trials = set()
+class StudyManifest:
+    def __init__(self, path: Path, incremental: bool, outdir: Path, sections, flush_bytes: int = DEFAULT_FLUSH_BYTES,
+                 shards: int = 1):
+        self.path = path
+        self.shards = shards
+        self.tmp = path.with_name(path.name + ".tmp")
+        self.outdir = outdir
+        self.flush_bytes = flush_bytes
+        # files whose rows are deduplicated across studies (no single study owns them)
+        self.shared = {e.file for sec in SCHEMA for e in sec.emits if e.seen and e.seen[0] != "trials"}
+        self.prev = None
+        if self.tmp.exists():
+            self.tmp.unlink()
+        if incremental:
+            if not path.exists():
+                raise ValueError(f"No manifest at {path}; run once without --incremental to create it")
+            self.prev = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            meta = dict(self.prev.execute("SELECT key, value FROM meta"))
+            if json.loads(meta["sections"]) != sections:
+                raise ValueError(f"Manifest was built with sections {meta['sections']}; use the same --only/--skip")
+            if meta["json_backend"] != CODEC.name:
+                raise ValueError(f"Manifest was built with JSON backend {meta['json_backend']}; "
+                                 f"use --json-backend {meta['json_backend']}")
+            check_mappings(json.loads(meta.get("mappings", "{}")), "Manifest")
+            shutil.copyfile(path, self.tmp)
+        self.conn = sqlite3.connect(str(self.tmp))
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS studies (nct TEXT PRIMARY KEY, last_update TEXT, files TEXT)")
+        # every raw record hash, so a dump that repeats an nctId does not look changed on every run
+        self.conn.execute("CREATE TABLE IF NOT EXISTS records (content_hash BLOB PRIMARY KEY, nct TEXT) WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS records_nct ON records (nct)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                              [("sections", json.dumps(sections)), ("json_backend", CODEC.name),
+                               ("mappings", json.dumps(MAPPINGS))])
+        self.hashes = deque()
+        self.seen_ncts = set()
+        self.applied = set()
+        self.deletes = {}
+        self.stats = {"unchanged": 0, "changed": 0, "new": 0, "removed": 0}
+
+    @staticmethod
+    def content_hash(raw_item):
+        if isinstance(raw_item, bytes):
+            data = raw_item.strip()
+        elif isinstance(raw_item, str):
+            data = raw_item.strip().encode("utf-8")
+        else:
+            data = CODEC.dumps_line(raw_item)
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def changed_records(self, records):
+        """Filter (position, raw_item) records down to those not in the previous manifest, queueing their hashes."""
+        lookup = "SELECT nct FROM records WHERE content_hash = ?"
+        for position, raw_item in records:
+            h = self.content_hash(raw_item)
+            if self.prev is not None:
+                row = self.prev.execute(lookup, (h,)).fetchone()
+                if row is not None:
+                    self.seen_ncts.add(row[0])
+                    self.stats["unchanged"] += 1
+                    continue
+            self.hashes.append(h)
+            yield position, raw_item
 
-    total_est = estimate_total_lines(input_path)
-    logging.info(f"Starting stream. Estimated total items: {total_est}")
+    def _delete(self, fname, nct):
+        # delete markers follow their study's shard, like the upserts
+        shard = shard_of(nct, self.shards)
+        fp = self.deletes.get((shard, fname))
+        if fp is None:
+            d = self.outdir / shard_dir_name(shard) if self.shards > 1 else self.outdir
+            ensure_dir(d)
+            fp = self.deletes[(shard, fname)] = BatchedWriter(d / delete_name(fname), self.flush_bytes)
+        fp.write(CODEC.dumps_line({"nctId": nct}))
+
+    def apply(self, out, study):
+        """Record one mapped record (in input order) and reduce its output to the delta against the previous run."""
+        h = self.hashes.popleft()
+        if study is None:
+            return out
+        nct, last_update = study
+        lines = {}
+        for fname, line, _ in out:
+            if fname != DEAD_LETTER_NAME:
+                lines.setdefault(fname, []).append(line if isinstance(line, bytes) else CODEC.dumps_line(line))
+        digests = {fname: hashlib.blake2b(b"".join(ls), digest_size=8).hexdigest() for fname, ls in lines.items()}
+        old = None
+        if self.prev is not None:
+            row = self.prev.execute("SELECT files FROM studies WHERE nct = ?", (nct,)).fetchone()
+            old = json.loads(row[0]) if row else None
+        self.seen_ncts.add(nct)
+        if self.prev is not None and nct not in self.applied:
+            # drop the hashes of the study's previous content so reverting to it is seen as a change
+            self.conn.execute("DELETE FROM records WHERE nct = ?", (nct,))
+        self.applied.add(nct)
+        self.conn.execute("INSERT OR REPLACE INTO records VALUES (?, ?)", (h, nct))
+        self.conn.execute("INSERT OR REPLACE INTO studies VALUES (?, ?, ?)",
+                          (nct, last_update, json.dumps(digests, separators=(",", ":"))))
+        if old is None:
+            if self.prev is not None:
+                self.stats["new"] += 1
+            return out
+        self.stats["changed"] += 1
+        for fname, digest in old.items():
+            if fname not in self.shared and digests.get(fname) != digest:
+                self._delete(fname, nct)
+        return [row for row in out if row[0] == DEAD_LETTER_NAME or digests[row[0]] != old.get(row[0])]
+
+    def finish(self):
+        """Emit deletes for studies absent from this run, then atomically replace the manifest."""
+        if self.prev is not None:
+            removed = []
+            for nct, files in self.prev.execute("SELECT nct, files FROM studies"):
+                if nct in self.seen_ncts:
+                    continue
+                removed.append((nct,))
+                for fname in json.loads(files):
+                    if fname not in self.shared:
+                        self._delete(fname, nct)
+            self.conn.executemany("DELETE FROM studies WHERE nct = ?", removed)
+            self.conn.executemany("DELETE FROM records WHERE nct = ?", removed)
+            self.stats["removed"] = len(removed)
+            self.prev.close()
+        self.conn.commit()
+        self.conn.close()
+        for fp in self.deletes.values():
+            fp.close()
+        os.replace(self.tmp, self.path)
+        return self.stats
+
+    def abort(self):
+        if self.prev is not None:
+            self.prev.close()
+        self.conn.close()
+        for fp in self.deletes.values():
+            fp.close()
+        self.tmp.unlink()
+
+# --------------------------
+# Driver (single pass with progress)
+# --------------------------
+def process_file_with_progress(input_path: Path, outdir: Path, workers: int = 1, chunk_size: int = 256,
+                               flush_bytes: int = DEFAULT_FLUSH_BYTES, only=None, skip=None,
+                               checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY, resume: bool = False,
+                               dedupe_store: str = "set", output_format: str = "jsonl",
+                               row_group_rows: int = DEFAULT_ROW_GROUP_ROWS, manifest_path: Path = None,
+                               incremental: bool = False, shards: int = 1, compress: str = "none",
+                               compress_level=None, compress_threads: int = 2,
+                               metrics_interval: float = DEFAULT_METRICS_INTERVAL, progress: str = "tqdm",
+                               progress_interval=None, mapping_paths=None, replay=None, raw_index: bool = False):
+    """
+    Split input_path into staging files under outdir (see the module docstring for the options).
+    `replay` is a list of record offsets from replay_offsets: only those records are extracted.
+    """
+    sections = resolve_sections(only, skip)
+    load_mappings(mapping_paths)
+    if shards < 1:
+        raise ValueError("--shards must be at least 1")
+    lanes = None
+    if compress != "none":
+        try:
+            lanes = CompressionLanes(compress, compress_level, compress_threads)
+        except ImportError:
+            raise ValueError("--compress zstd requires the zstandard package (pip install zstandard)")
+    encode = output_format == "jsonl"
+    if not encode:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError(f"--format {output_format} requires pyarrow (pip install pyarrow)")
+        if resume:
+            raise ValueError("--resume is only supported with --format jsonl (Parquet/Arrow files cannot be truncated)")
+        if checkpoint_every:
+            logging.info(f"Checkpoints are not written with --format {output_format}.")
+            checkpoint_every = 0
+    if incremental and manifest_path is None:
+        raise ValueError("--incremental needs --manifest")
+    if incremental and raw_index:
+        raise ValueError("--raw-index needs every study; build it with a run without --incremental")
+    if replay is not None:
+        if resume or manifest_path is not None:
+            raise ValueError("--replay cannot be combined with --resume or --manifest")
+        checkpoint_every = 0
+    if manifest_path is not None:
+        if resume:
+            raise ValueError("--resume cannot be combined with --manifest; rerun instead (the manifest is only replaced on completion)")
+        if checkpoint_every:
+            logging.info("Checkpoints are not written with --manifest.")
+            checkpoint_every = 0
+    ensure_dir(outdir)
+
+    # dedupe stores to reduce duplicate writes
+    seen = open_dedupe_stores(dedupe_store, outdir)
 
     # counters for progress postfix
     counters = {
         "trials": 0, "orgs": 0, "conditions": 0, "interventions": 0, "arms": 0, "sites": 0, "contacts": 0,
         "investigators": 0, "outcomes": 0, "results": 0, "elig": 0, "pubs": 0
     }
+    processed = 0
+    records = 0
+    position = None
 
-    # open input and iterate
-    with open_input(input_path) as fh:
-        # determine mode: JSON array or JSONL
-        first_non_ws = None
-        while True:
-            ch = fh.read(1)
-            if not ch:
-                break
-            if not ch.isspace():
-                first_non_ws = ch
-                break
-        fh.seek(0)
-
-        if first_non_ws == "[":
-            # JSON array mode: load whole array (warning in docstring)
-            logging.info("Detected JSON array format — loading into memory (may be heavy).")
-            data = json.load(fh)
-            iterator = iter(data)
-            total = len(data)
-            pbar = tqdm(iterator, total=total, desc="Processing trials", unit="trial")
+    if resume:
+        ckpt = load_checkpoint(outdir)
+        if ckpt is None:
+            raise ValueError(f"No checkpoint in {outdir}; nothing to resume")
+        if ckpt.get("complete"):
+            logging.info(f"Checkpoint in {outdir} marks the run as complete; nothing to resume.")
+            return
+        restore_checkpoint(outdir, ckpt, input_path, sections, seen, shards, raw_index)
+        counters.update(ckpt["counters"])
+        processed = ckpt["processed"]
+        records = ckpt["records"]
+        position = ckpt["position"]
+        # keep checkpointing at the interrupted run's interval unless a new one is given
+        checkpoint_every = checkpoint_every or ckpt.get("checkpoint_every", 0)
+        logging.info(f"Resuming from checkpoint taken {ckpt['updated']}: {records} records done, input position {position}")
+    elif checkpoint_every:
+        # a fresh run starts a fresh dedupe journal
+        open(outdir / DEDUPE_JOURNAL_NAME, "wb").close()
+
+    shard_writers, writers = open_shard_writers(outdir, shards, flush_bytes, files=section_files(sections),
+                                                output_format=output_format, row_group_rows=row_group_rows,
+                                                lanes=lanes)
+    if resume:
+        for name, fp in writers.items():
+            fp.lines_written = ckpt.get("rows", {}).get(name, 0)
+    dead_letter_fp = open_jsonl_writer(outdir / DEAD_LETTER_NAME, flush_bytes, lanes)
+    journal = BatchedWriter(outdir / DEDUPE_JOURNAL_NAME, flush_bytes) if checkpoint_every else None
+    resumed_processed = processed
+    last_checkpoint = records
+
+    # open input once: format sniff and progress both come from the same stream
+    inp = InputStream(input_path)
+    if raw_index:
+        # plain JSONL is indexed in place; gzip and array records are copied into seekable blocks
+        blocked = str(input_path).endswith(".gz") or inp.fmt == "array"
+        raw_index = RawIndexWriter(outdir / RAW_INDEX_NAME, input_path, blocked, CODEC.dumps_line, resume=resume)
+    else:
+        raw_index = None
+    total_bytes = os.path.getsize(input_path)
+    logging.info(f"Starting stream. Format: {inp.fmt}, input size: {total_bytes} bytes")
+    logging.info(f"Extracting sections: {', '.join(sections)}")
+    skipped = [name for name in SECTION_NAMES if name not in sections]
+    if skipped:
+        logging.info(f"Skipping sections: {', '.join(skipped)}")
+    section_seconds = dict.fromkeys(SECTION_SECONDS, 0.0)
+    take_section_seconds()
+    metrics = RunMetrics(outdir / METRICS_NAME, metrics_interval)
+    resumed_records = records
+    input_start = input_end = 0
+
+    def write_metrics(complete=False):
+        # serial runs map in this process: fold its section timings in before each snapshot
+        for name, secs in take_section_seconds().items():
+            section_seconds[name] += secs
+        output_bytes = dead_letter_fp.bytes_written + sum(fp.bytes_written for fp in writers.values())
+        input_pos = input_end if inp.raw_fp.closed else inp.raw_fp.tell()
+        m = metrics.write(records - resumed_records, processed - resumed_processed, input_pos - input_start,
+                          output_bytes, section_seconds, counters, complete)
+        logging.info(f"Throughput: {m['records_per_second']} records/s, "
+                     f"{m['input_bytes_per_second'] / (1 << 20):.2f} MiB/s in, "
+                     f"{m['output_bytes_per_second'] / (1 << 20):.2f} MiB/s out ({m['records']} records)")
+    manifest = StudyManifest(manifest_path, incremental, outdir, sections, flush_bytes, shards) if manifest_path else None
+
+    def checkpoint(complete=False):
+        nonlocal last_checkpoint
+        state = dict(input_identity(input_path), format=inp.fmt, position=position, processed=processed,
+                     records=records, counters=counters, sections=sections, json_backend=CODEC.name,
+                     mappings=MAPPINGS, checkpoint_every=checkpoint_every,
+                     shards=shards, raw_index=raw_index is not None, complete=complete)
+        t0 = time.perf_counter()
+        write_checkpoint(outdir, state, writers, dead_letter_fp, journal, raw_index)
+        metrics.stages["checkpoint"] += time.perf_counter() - t0
+        last_checkpoint = records
+
+    # every output is closed through `outputs` (in reverse order) whether the run completes or fails
+    # part-way; on failure the files are left flushed up to the error, and --resume truncates them back
+    # to the last checkpoint
+    outputs = contextlib.ExitStack()
+    if lanes is not None:
+        outputs.callback(lanes.shutdown)
+    outputs.callback(close_dedupe_stores, seen)
+    for fp in list(writers.values()) + [dead_letter_fp]:
+        outputs.callback(fp.close)
+    if journal is not None:
+        outputs.callback(journal.close)
+    if raw_index is not None:
+        outputs.callback(raw_index.close)
+
+    try:
+        if inp.fmt == "array":
+            # JSON array mode: stream elements one at a time
+            logging.info("Detected JSON array format — streaming elements incrementally.")
+        if replay is not None:
+            items = replay_records(inp, replay)
         else:
-            # JSONL mode: iterate line by line
-            # create a generator that yields parsed JSON objects per line; use tqdm with known total if available
-            def line_generator(f):
-                for line in f:
-                    if not line.strip():
-                        continue
-                    yield line
-            line_iter = line_generator(fh)
-            pbar = tqdm(line_iter, total=total_est, desc="Processing trials", unit="trial")
-
-        processed = 0
-        for raw_item in pbar:
-            # parse raw_item (either str or dict)
-            if isinstance(raw_item, str):
-                line = raw_item.strip()
-                try:
-                    js = json.loads(line)
-                except Exception as e:
-                    logging.exception("JSON parse error")
-                    write_jsonl(dead_letter_fp, {"error": "parse", "line": line[:400]})
-                    continue
-            else:
-                # already a dict (when iterating over JSON array)
-                js = raw_item
+            start = position if position is not None else (inp.start if inp.fmt == "jsonl" else None)
+            items = _with_offsets(inp.records(position), start)
+        # on resume, bytes before the checkpoint were read by an earlier invocation
+        input_start = inp.raw_fp.tell() if position is not None else 0
+        if manifest is not None:
+            items = manifest.changed_records(items)
 
-            try:
-                ps = js.get("protocolSection", {})
-                idm = ps.get("identificationModule", {})
-                nctId = safe_get(idm, "nctId")
-                if not nctId:
-                    write_jsonl(dead_letter_fp, {"error": "missing_nct", "record_excerpt": str(js)[:400]})
-                    continue
+        # progress is the byte offset in the file on disk (compressed offset for .gz)
+        reporter = PROGRESS_REPORTERS[progress](total_bytes, input_start, progress_interval)
+
+        def consume(results, pos, offset, raw=None):
+            # raw: the ((offset, position), raw_item) input of each result, for the raw index
+            nonlocal processed, records, position
+            t0 = time.perf_counter()
+            for k, (out, study) in enumerate(results):
+                if manifest is not None:
+                    out = manifest.apply(out, study)
+                shard = shard_of(study[0], shards) if study else 0
+                apply_record_output(out, shard_writers[shard], dead_letter_fp, seen, counters, journal)
+                if study:
+                    processed += 1
+                    if raw_index is not None:
+                        (record_offset, record_pos), raw_item = raw[k]
+                        raw_index.add(study[0], raw_item, record_offset, record_pos)
+            now = time.perf_counter()
+            metrics.stages["write"] += now - t0
+            records += len(results)
+            position = pos
+            reporter.update(offset, counters)
+            if checkpoint_every and records - last_checkpoint >= checkpoint_every:
+                checkpoint()
+            if metrics.due(now):
+                write_metrics()
 
-                # --- Trial node ---
-                trial_node = {
-                    "nctId": nctId,
-                    "orgStudyId": safe_get(idm, "orgStudyIdInfo.id"),
-                    "briefTitle": safe_get(idm, "briefTitle"),
-                    "officialTitle": safe_get(idm, "officialTitle"),
-                    "acronym": safe_get(idm, "acronym"),
-                    "overallStatus": safe_get(ps, "statusModule.overallStatus"),
-                    "statusVerifiedDate": safe_get(ps, "statusModule.statusVerifiedDate"),
-                    "startDate": safe_get(ps, "statusModule.startDateStruct.date"),
-                    "primaryCompletionDate": safe_get(ps, "statusModule.primaryCompletionDateStruct.date"),
-                    "completionDate": safe_get(ps, "statusModule.completionDateStruct.date"),
-                    "studyFirstSubmitDate": safe_get(ps, "statusModule.studyFirstSubmitDate"),
-                    "studyFirstPostDate": safe_get(ps, "statusModule.studyFirstPostDateStruct.date"),
-                    "lastUpdatePostDate": safe_get(ps, "statusModule.lastUpdatePostDateStruct.date"),
-                    "studyType": safe_get(ps, "designModule.studyType"),
-                    "phases": safe_get(ps, "designModule.phases"),
-                    "interventionModel": safe_get(ps, "designModule.designInfo.interventionModel"),
-                    "allocation": safe_get(ps, "designModule.designInfo.allocation"),
-                    "primaryPurpose": safe_get(ps, "designModule.designInfo.primaryPurpose"),
-                    "masking": safe_get(ps, "designModule.designInfo.maskingInfo.masking"),
-                    "enrollmentCount": safe_get(ps, "designModule.enrollmentInfo.count"),
-                    "enrollmentType": safe_get(ps, "designModule.enrollmentInfo.type"),
-                    "briefSummary": safe_get(ps, "descriptionModule.briefSummary"),
-                    "detailedDescription": safe_get(ps, "descriptionModule.detailedDescription"),
-                    "hasResults": js.get("hasResults", False),
-                    "ipdSharing": safe_get(ps, "ipdSharingStatementModule.ipdSharing"),
-                    "versionHolder": safe_get(ps, "derivedSection.miscInfoModule.versionHolder"),
-                    "rawJsonPath": f"{input_path}::{nctId}"
-                }
-                if nctId not in seen_trials:
-                    write_jsonl(writers["trials.jsonl"], trial_node)
-                    seen_trials.add(nctId)
-                    counters["trials"] += 1
-
-                # --- Organization (lead sponsor) ---
-                lead_name = safe_get(ps, "sponsorCollaboratorsModule.leadSponsor.name")
-                lead_class = safe_get(ps, "sponsorCollaboratorsModule.leadSponsor.class")
-                if lead_name:
-                    canon = lead_name.strip().lower()
-                    if canon not in seen_orgs:
-                        org_node = {"name": lead_name, "class": lead_class, "rawSourceField": "sponsorCollaboratorsModule.leadSponsor"}
-                        write_jsonl(writers["organizations.jsonl"], org_node)
-                        seen_orgs.add(canon)
-                        counters["orgs"] += 1
-                    # relationship record
-                    rel = {"from_nct": nctId, "org_name": lead_name, "role": "lead_sponsor"}
-                    write_jsonl(writers["trial_sponsoredby_rel.jsonl"], rel)
-
-                # --- Conditions ---
-                conds = safe_get(ps, "conditionsModule.conditions", []) or []
-                for cond in conds:
-                    nm = (cond or "").strip()
-                    if not nm:
-                        continue
-                    if nm.lower() not in seen_conditions:
-                        write_jsonl(writers["conditions.jsonl"], {"name": nm, "rawSource": "conditionsModule.conditions"})
-                        seen_conditions.add(nm.lower())
-                        counters["conditions"] += 1
-                    write_jsonl(writers["trial_studies_rel.jsonl"], {"from_nct": nctId, "condition_name": nm})
-
-                # --- Interventions ---
-                ints = safe_get(ps, "armsInterventionsModule.interventions", []) or []
-                for it in ints:
-                    name = it.get("name")
-                    name_norm = normalize_intervention_name(name)
-                    if not name_norm:
-                        continue
-                    key = name_norm.lower()
-                    if key not in seen_interventions:
-                        int_node = {
-                            "name": name_norm,
-                            "type": it.get("type"),
-                            "description": it.get("description"),
-                            "otherNames": it.get("otherNames", []),
-                            "rawSource": "armsInterventionsModule.interventions"
-                        }
-                        write_jsonl(writers["interventions.jsonl"], int_node)
-                        seen_interventions.add(key)
-                        counters["interventions"] += 1
-                    # relation trial -> intervention
-                    write_jsonl(writers["trial_uses_intervention_rel.jsonl"], {"from_nct": nctId, "intervention_name": name_norm})
-
-                # --- Arms ---
-                armGroups = safe_get(ps, "armsInterventionsModule.armGroups", []) or []
-                for ag in armGroups:
-                    arm_id = f"{nctId}::{ag.get('label')}"
-                    arm_node = {
-                        "armId": arm_id,
-                        "label": ag.get("label"),
-                        "type": ag.get("type"),
-                        "description": ag.get("description"),
-                        "interventionNames": ag.get("interventionNames", []),
-                        "nctId": nctId
-                    }
-                    write_jsonl(writers["arms.jsonl"], arm_node)
-                    write_jsonl(writers["trial_has_arm_rel.jsonl"], {"from_nct": nctId, "armId": arm_id})
-                    counters["arms"] += 1
-                    for iname in ag.get("interventionNames", []):
-                        iname_norm = normalize_intervention_name(iname)
-                        if iname_norm:
-                            write_jsonl(writers["arm_contains_intervention_rel.jsonl"], {"armId": arm_id, "intervention_name": iname_norm})
-
-                # --- Sites ---
-                locs = safe_get(ps, "contactsLocationsModule.locations", []) or []
-                for s in locs:
-                    site_node = {
-                        "facility": s.get("facility"),
-                        "city": s.get("city"),
-                        "state": s.get("state"),
-                        "zip": s.get("zip"),
-                        "country": s.get("country"),
-                        "status": s.get("status"),
-                        "latitude": s.get("geoPoint", {}).get("lat"),
-                        "longitude": s.get("geoPoint", {}).get("lon")
-                    }
-                    write_jsonl(writers["sites.jsonl"], site_node)
-                    write_jsonl(writers["trial_has_site_rel.jsonl"], {"from_nct": nctId, "facility": s.get("facility"), "city": s.get("city"), "country": s.get("country")})
-                    counters["sites"] += 1
-
-                # --- Contacts & Investigators ---
-                contacts = safe_get(ps, "contactsLocationsModule.centralContacts", []) or []
-                for c in contacts:
-                    contact_node = {"name": c.get("name"), "role": c.get("role"), "phone": c.get("phone"), "email": c.get("email"), "nctId": nctId}
-                    write_jsonl(writers["contacts.jsonl"], contact_node)
-                    write_jsonl(writers["trial_has_contact_rel.jsonl"], {"from_nct": nctId, "contact_name": c.get("name")})
-                    counters["contacts"] += 1
-                officials = safe_get(ps, "contactsLocationsModule.overallOfficials", []) or []
-                for of in officials:
-                    inv_node = {"name": of.get("name"), "affiliation": of.get("affiliation"), "role": of.get("role"), "nctId": nctId}
-                    write_jsonl(writers["investigators.jsonl"], inv_node)
-                    write_jsonl(writers["trial_has_investigator_rel.jsonl"], {"from_nct": nctId, "investigator_name": of.get("name")})
-                    counters["investigators"] += 1
-
-                # --- Outcomes (primary/secondary/other) ---
-                primary = safe_get(ps, "outcomesModule.primaryOutcomes", []) or []
-                secondary = safe_get(ps, "outcomesModule.secondaryOutcomes", []) or []
-                other_out = safe_get(ps, "outcomesModule.otherOutcomes", []) or []
-                for o in (primary + secondary + other_out):
-                    measure = o.get("measure") or o.get("title")
-                    outcome_id = f"{nctId}::" + (measure or "unknown")[:120]
-                    outcome_node = {"outcomeId": outcome_id, "nctId": nctId, "measure": measure, "description": o.get("description"), "timeFrame": o.get("timeFrame")}
-                    write_jsonl(writers["outcomes.jsonl"], outcome_node)
-                    write_jsonl(writers["trial_has_outcome_rel.jsonl"], {"from_nct": nctId, "outcomeId": outcome_id})
-                    counters["outcomes"] += 1
-
-                # --- resultsSection: create simple Result nodes where present ---
-                rs = js.get("resultsSection", {}) or {}
-                om = safe_get(rs, "outcomeMeasuresModule.outcomeMeasures", []) or []
-                for omm in om:
-                    classes = omm.get("classes", []) or []
-                    for cls in classes:
-                        cats = cls.get("categories", []) or []
-                        for cat in cats:
-                            meas_list = cat.get("measurements", []) or []
-                            for m in meas_list:
-                                res_id = f"{nctId}::{omm.get('title') or omm.get('type')}::{m.get('groupId')}"
-                                result_node = {
-                                    "resultId": res_id,
-                                    "nctId": nctId,
-                                    "outcomeTitle": omm.get("title"),
-                                    "groupId": m.get("groupId"),
-                                    "value": m.get("value"),
-                                    "spread": m.get("spread")
-                                }
-                                write_jsonl(writers["results.jsonl"], result_node)
-                                write_jsonl(writers["outcome_has_result_rel.jsonl"], {"outcomeTitle": omm.get("title"), "resultId": res_id})
-                                counters["results"] += 1
-
-                # --- participantFlowModule (groups + achievements) ---
-                pf = safe_get(rs, "participantFlowModule", {}) or {}
-                groups_pf = pf.get("groups", []) or []
-                periods = pf.get("periods", []) or []
-                for g in groups_pf:
-                    pg_id = f"{nctId}::PF::{g.get('id') or g.get('title')}"
-                    write_jsonl(writers["participant_flow_groups.jsonl"], {"flowGroupId": pg_id, "title": g.get("title"), "description": g.get("description"), "nctId": nctId})
-                for p in periods:
-                    milestones = p.get("milestones", []) or []
-                    for ms in milestones:
-                        achs = ms.get("achievements", []) or []
-                        for a in achs:
-                            write_jsonl(writers["participantflow_has_achievement_rel.jsonl"], {
-                                "flowGroupId": f"{nctId}::PF::{a.get('groupId')}",
-                                "periodTitle": p.get("title"),
-                                "type": ms.get("type"),
-                                "numSubjects": a.get("numSubjects"),
-                                "nctId": nctId
-                            })
-
-                # --- baseline characteristics ---
-                bc = safe_get(rs, "baselineCharacteristicsModule", {}) or {}
-                groups_bc = bc.get("groups", []) or []
-                measures = bc.get("measures", []) or []
-                for g in groups_bc:
-                    bgid = f"{nctId}::BG::{g.get('title') or g.get('id')}"
-                    write_jsonl(writers["baseline_groups.jsonl"], {"baselineGroupId": bgid, "title": g.get("title"), "description": g.get("description"), "nctId": nctId})
-                for m in measures:
-                    bm_id = f"{nctId}::BM::{m.get('title')}"
-                    write_jsonl(writers["baseline_measures.jsonl"], {"baselineMeasureId": bm_id, "title": m.get("title"), "paramType": m.get("paramType"), "unitOfMeasure": m.get("unitOfMeasure"), "nctId": nctId, "raw": m})
-
-                # --- adverse events ---
-                ae = safe_get(rs, "adverseEventsModule", {}) or {}
-                eventGroups = ae.get("eventGroups", []) or []
-                for eg in eventGroups:
-                    write_jsonl(writers["adverse_events.jsonl"], {"nctId": nctId, "groupId": eg.get("id"), "title": eg.get("title"), "seriousNumAffected": eg.get("seriousNumAffected"), "otherNumAffected": eg.get("otherNumAffected")})
-                seriousEvents = ae.get("seriousEvents", []) or []
-                for se in seriousEvents:
-                    term = se.get("term")
-                    aev_id = f"{nctId}::AE::{term}"
-                    write_jsonl(writers["adverse_events.jsonl"], {"adEventId": aev_id, "term": term, "organSystem": se.get("organSystem"), "assessmentType": se.get("assessmentType"), "nctId": nctId})
-                    stats = se.get("stats", []) or []
-                    for st in stats:
-                        write_jsonl(writers["adverseevent_has_stat_rel.jsonl"], {"adEventId": aev_id, "groupId": st.get("groupId"), "numEvents": st.get("numEvents"), "numAffected": st.get("numAffected"), "numAtRisk": st.get("numAtRisk"), "nctId": nctId})
-
-                # --- eligibility parsing (naive) ---
-                elig_text = safe_get(ps, "eligibilityModule.eligibilityCriteria")
-                if elig_text:
-                    inc = []
-                    exc = []
-                    lower = elig_text.lower()
-                    if "inclusion criteria" in lower or "exclusion criteria" in lower:
-                        lines = [l.strip() for l in elig_text.splitlines() if l.strip()]
-                        mode = None
-                        for L in lines:
-                            ll = L.lower()
-                            if "inclusion" in ll and "criteria" in ll:
-                                mode = "INCLUSION"
-                                continue
-                            if "exclusion" in ll and "criteria" in ll:
-                                mode = "EXCLUSION"
-                                continue
-                            if mode == "INCLUSION":
-                                inc.append(L)
-                            elif mode == "EXCLUSION":
-                                exc.append(L)
-                            else:
-                                if L.startswith("*") or L.startswith("-"):
-                                    inc.append(L.lstrip("*- ").strip())
-                                else:
-                                    inc.append(L)
-                    else:
-                        inc = [elig_text]
-                    seq = 0
-                    for t in inc:
-                        write_jsonl(writers["eligibility.jsonl"], {"criterionId": f"{nctId}::IN::#{seq}", "nctId": nctId, "type": "INCLUSION", "text": t, "sequence": seq})
-                        seq += 1
-                        counters["elig"] += 1
-                    seq = 0
-                    for t in exc:
-                        write_jsonl(writers["eligibility.jsonl"], {"criterionId": f"{nctId}::EX::#{seq}", "nctId": nctId, "type": "EXCLUSION", "text": t, "sequence": seq})
-                        seq += 1
-                        counters["elig"] += 1
-
-                # --- publications / references ---
-                refs = safe_get(ps, "referencesModule.references", []) or []
-                for r in refs:
-                    pmid = r.get("pmid")
-                    pubid = pmid or f"{nctId}::REF::{r.get('type') or 'other'}"
-                    write_jsonl(writers["publications.jsonl"], {"publicationId": pubid, "pmid": pmid, "citation": r.get("citation"), "type": r.get("type"), "nctId": nctId})
-                    write_jsonl(writers["trial_has_contact_rel.jsonl"], {"from_nct": nctId, "publicationId": pubid})
-                    counters["pubs"] += 1
-
-                # --- version summary ---
-                version_holder = safe_get(ps, "derivedSection.miscInfoModule.versionHolder")
-                if version_holder:
-                    write_jsonl(writers["versions.jsonl"], {"versionId": version_holder, "nctId": nctId})
-
-            except Exception as e:
-                logging.exception("Error processing trial")
-                write_jsonl(dead_letter_fp, {"error": str(e), "nctId": nctId if 'nctId' in locals() else None, "excerpt": str(js)[:400]})
-
-            processed += 1
-            # update progress postfix with counters
-            pbar.set_postfix({
-                "trials": counters["trials"], "orgs": counters["orgs"], "ints": counters["interventions"], "arms": counters["arms"],
-                "outcomes": counters["outcomes"], "results": counters["results"], "elig": counters["elig"]
-            })
-
-    # close writers
-    for fp in writers.values():
-        fp.close()
-    dead_letter_fp.close()
+        if workers > 1:
+            # reader hands chunks to the pool; results are consumed in submission order so dedupe
+            # stays in input order. The in-flight window bounds how far the reader runs ahead.
+            logging.info(f"Mapping records with {workers} worker processes (chunk size {chunk_size}).")
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(CODEC.name, mapping_paths)) as pool:
+                pending = deque()
+
+                def drain_one():
+                    res, pos, off, raw = pending.popleft()
+                    t0 = time.perf_counter()
+                    results, times = res.get()
+                    metrics.stages["wait"] += time.perf_counter() - t0
+                    consume(results, pos, off, raw)
+                    for name, secs in times.items():
+                        section_seconds[name] += secs
+
+                for chunk, spans, pos, offset in _chunked(items, chunk_size, inp.raw_fp):
+                    offsets = [span[0] for span in spans]
+                    pending.append((pool.apply_async(_extract_chunk, ((chunk, offsets, input_path, sections, encode),)),
+                                    pos, offset, list(zip(spans, chunk)) if raw_index is not None else None))
+                    if len(pending) >= workers * 4:
+                        drain_one()
+                while pending:
+                    drain_one()
+        else:
+            for (record_offset, pos), raw_item in items:
+                t0 = time.perf_counter()
+                result = extract_record(raw_item, input_path, sections, encode, record_offset)
+                metrics.stages["extract"] += time.perf_counter() - t0
+                consume([result], pos, inp.raw_fp.tell(),
+                        [((record_offset, pos), raw_item)] if raw_index is not None else None)
+        reporter.close(inp.raw_fp.tell(), counters)
+        input_end = inp.raw_fp.tell()
+    except BaseException:
+        if manifest is not None:
+            manifest.abort()
+        outputs.close()
+        raise
+    finally:
+        inp.close()
+
+    if manifest is not None:
+        stats = manifest.finish()
+        if incremental:
+            logging.info("Incremental: " + ", ".join(f"{k}={v}" for k, v in stats.items()) + " studies")
+        logging.info(f"Manifest written: {manifest_path}")
+
+    if checkpoint_every:
+        checkpoint(complete=True)
+    if raw_index is not None:
+        raw_index.sync()
+        logging.info(f"Raw index: {len(raw_index)} studies in {raw_index.path}"
+                     + (f" (records copied to {raw_index.blocks_path.name})" if raw_index.blocks_path else ""))
+    logging.info("Dedupe keys: " + ", ".join(f"{kind}={len(st)}" for kind, st in seen.items()) + f" ({dedupe_store} store)")
+    outputs.close()
+    if shards > 1:
+        write_shard_manifest(outdir, shard_writers, output_format, dead_letter_fp.path.name)
+        logging.info(f"Wrote {shards} shards; shard manifest: {outdir / SHARD_MANIFEST_NAME}")
+    for name, fp in sorted(writers.items()):
+        rel = fp.path.relative_to(outdir).as_posix()
+        logging.info(f"  {rel}: {fp.lines_written} lines, {fp.bytes_written} bytes")
+        if getattr(fp, "coerce_errors", 0):
+            logging.warning(f"  {rel}: {fp.coerce_errors} values did not match their column type and were written as null")
+    write_metrics(complete=True)
+    report_section_timings(outdir, sections, section_seconds, processed - resumed_processed)
     logging.info(f"Done. Processed ~{processed} records. Output dir: {outdir}")
     print("Summary counts:", counters)
 
@@ -517,14 +2295,106 @@ def main():
     parser = argparse.ArgumentParser(description="Split ClinicalTrials JSON into per-edge JSONL files (with progress)")
     parser.add_argument("--input", "-i", type=str, required=True, help="Input JSONL file (or .json/.jsonl.gz) with one trial per line or JSON array")
     parser.add_argument("--outdir", "-o", type=str, default="kg_staging", help="Output staging directory")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="Worker processes for record extraction (1 = serial)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Records handed to a worker per task (with --workers > 1)")
+    parser.add_argument("--only", type=str, default=None,
+                        help=f"Comma-separated schema sections to extract (default: all). Sections: {', '.join(SECTION_NAMES)}")
+    parser.add_argument("--skip", type=str, default=None,
+                        help="Comma-separated schema sections to disable; their files are not opened and their code never runs")
+    parser.add_argument("--json-backend", choices=["auto"] + JSON_BACKENDS, default="json",
+                        help="JSON codec for JSONL input parsing and output (default stdlib json; auto = orjson, "
+                             "then ujson, then stdlib json). JSON array input is always parsed by stdlib json")
+    parser.add_argument("--dedupe-store", choices=DEDUPE_STORES, default="set",
+                        help="Dedupe index for the deduplicated node files: in-memory set, 64-bit hashed "
+                             "fingerprints (compact), or an on-disk SQLite index")
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_EVERY,
+                        help="Write a resumable checkpoint every N records (default: 0, no checkpoints; "
+                             "a run needs them to be resumed)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the checkpoint in --outdir, truncating writes made after it")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Study manifest (SQLite) recording each study's content hash and per-file row digests")
+    parser.add_argument("--incremental", action="store_true",
+                        help="With --manifest: skip studies unchanged since the manifest was written and emit "
+                             "upserts plus <file>.deletes.jsonl markers only for what changed")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split every staging file into N shard directories (shard-000/ ...) by hash of nctId, "
+                             "with a shards.json manifest (opens N x files output files)")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default="none",
+                        help="Compress JSONL staging files and the dead-letter file (.gz / .zst; zstd needs zstandard)")
+    parser.add_argument("--compress-level", type=int, default=None, help="Compression level (default: gzip 6, zstd 3)")
+    parser.add_argument("--compress-threads", type=int, default=2,
+                        help="Background compression threads; each output file is pinned to one")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_METRICS_INTERVAL,
+                        help=f"Seconds between {METRICS_NAME} refreshes (stage times, records/s, bytes/s); 0 = only at the end")
+    parser.add_argument("--progress", choices=list(PROGRESS_REPORTERS), default="tqdm",
+                        help="Progress display: tqdm bar, periodic log lines, or none")
+    parser.add_argument("--progress-interval", type=float, default=None,
+                        help="Minimum seconds between progress refreshes (default: 0.5 for tqdm, 10 for log)")
+    parser.add_argument("--intervention-synonyms", type=str, default=None,
+                        help="Synonym table from `python interventions.py --input ...` used for intervention canonicalIds")
+    parser.add_argument("--condition-map", type=str, default=None,
+                        help="Condition alias -> canonical name mapping (JSON object or two-column CSV/TSV)")
+    parser.add_argument("--person-map", type=str, default=None,
+                        help="Investigator resolution table from `python people.py --input ...` used for personIds")
+    parser.add_argument("--flush-bytes", type=int, default=DEFAULT_FLUSH_BYTES, help="Buffered bytes per output file before a bulk write")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="jsonl",
+                        help="Staging file format: jsonl, or typed zstd-compressed parquet / arrow (IPC file) columns (requires pyarrow)")
+    parser.add_argument("--row-group-rows", type=int, default=DEFAULT_ROW_GROUP_ROWS,
+                        help="Rows buffered per file before a Parquet row group / Arrow record batch is written")
+    parser.add_argument("--replay", type=str, default=None,
+                        help="Re-extract only the records listed in this dead-letter file (read from --input at their "
+                             "recorded offsets) into a separate --outdir")
+    parser.add_argument("--raw-index", action="store_true",
+                        help=f"Write {RAW_INDEX_NAME} (nctId -> input byte range, or a block of a seekable gzip copy "
+                             "for .gz / JSON array input) so single studies can be fetched without a scan (see raw_index.py)")
     args = parser.parse_args()
     input_path = Path(args.input)
     outdir = Path(args.outdir)
     if not input_path.exists():
         logging.error(f"Input file {input_path} not found")
         raise SystemExit(1)
-    logging.info(f"Starting split for {input_path} -> {outdir}")
-    process_file_with_progress(input_path, outdir)
+    only = [name.strip() for name in args.only.split(",") if name.strip()] if args.only else None
+    skip = [name.strip() for name in args.skip.split(",") if name.strip()] if args.skip else None
+    try:
+        if not resolve_sections(only, skip):
+            parser.error("--only/--skip leave no sections to extract")
+    except ValueError as e:
+        parser.error(str(e))
+    codec = set_codec(args.json_backend)
+    replay = None
+    if args.replay:
+        replay_path = Path(args.replay)
+        if replay_path.parent.resolve() == outdir.resolve():
+            parser.error("--replay writes a new staging set; use an --outdir other than the dead letter's directory")
+        entries = read_dead_letter(replay_path)
+        replay, other = replay_offsets(entries, input_path)
+        errors = {}
+        for entry in entries:
+            errors[entry.get("error")] = errors.get(entry.get("error"), 0) + 1
+        logging.info(f"Replaying {len(replay)} records from {replay_path}: "
+                     + ", ".join(f"{err}={n}" for err, n in sorted(errors.items(), key=lambda kv: -kv[1])))
+        if other:
+            logging.warning(f"{other} dead-letter entries have no offset for {input_path} and are not replayed")
+    logging.info(f"Starting split for {input_path} -> {outdir} (JSON backend: {codec.name})")
+    try:
+        process_file_with_progress(input_path, outdir, workers=args.workers, chunk_size=args.chunk_size,
+                                   flush_bytes=args.flush_bytes, only=only, skip=skip,
+                                   checkpoint_every=args.checkpoint_every, resume=args.resume,
+                                   dedupe_store=args.dedupe_store, output_format=args.format,
+                                   row_group_rows=args.row_group_rows,
+                                   manifest_path=Path(args.manifest) if args.manifest else None,
+                                   incremental=args.incremental, shards=args.shards, compress=args.compress,
+                                   compress_level=args.compress_level, compress_threads=args.compress_threads,
+                                   metrics_interval=args.metrics_interval, progress=args.progress,
+                                   progress_interval=args.progress_interval,
+                                   mapping_paths={"intervention_synonyms": args.intervention_synonyms,
+                                                  "condition_map": args.condition_map,
+                                                  "person_map": args.person_map},
+                                   replay=replay, raw_index=args.raw_index)
+    except ValueError as e:
+        logging.error(str(e))
+        raise SystemExit(1)
     logging.info("Finished split.")
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+raw_index.py
+
+nctId -> raw record index for a ClinicalTrials.gov dump, written by pre_processing.py --raw-index and read
+by application.py (or anything else that needs a study's original JSON).
+
+    from raw_index import RawIndex
+    with RawIndex("kg_staging/raw_index.sqlite") as index:
+        study = index.get("NCT01234567")         # the study's original JSON as a dict, or None
+        raw = index.get_bytes("NCT01234567")     # the same record as raw bytes
+
+Print a few records:
+    python raw_index.py --index kg_staging/raw_index.sqlite NCT01234567 NCT07654321
+
+Notes:
+ - raw_index.sqlite maps nctId -> (file, block, offset, length). Plain JSONL input is indexed in place: block
+   is NULL and offset/length are the record's byte range in the input, so a fetch is one seek and one read.
+ - gzip input cannot be entered mid-stream and JSON array elements have no byte offsets, so for those the
+   records are also copied to raw_blocks.jsonl.gz next to the index, one JSON line each, in independent gzip
+   members of about BLOCK_BYTES uncompressed (a BGZF-style layout; the file is still an ordinary gzip stream).
+   block is the compressed offset of the record's member and offset/length its range once inflated, so a
+   fetch seeks and inflates a single member whatever the size of the dump.
+ - Array elements are re-serialized as compact JSON: same content, different bytes than the input.
+ - The first record of a repeated nctId is the one indexed, as in trials.jsonl.
+ - The input's size and mtime are recorded; fetching from an input that changed since raises ValueError.
+   The block file is referenced relative to the index, so the staging directory can be moved as a whole.
+"""
+
+import os
+import json
+import zlib
+import sqlite3
+import argparse
+from pathlib import Path
+
+RAW_INDEX_NAME = "raw_index.sqlite"
+RAW_BLOCKS_NAME = "raw_blocks.jsonl.gz"
+BLOCK_BYTES = 1 << 16  # uncompressed bytes per gzip member (a member holds at least one record)
+READ_BYTES = 1 << 15   # compressed bytes read per step while inflating a member
+INSERT_ROWS = 4096     # index rows buffered per executemany
+
+# --------------------------
+# Writer (used by pre_processing.py)
+# --------------------------
+class RawIndexWriter:
+    """
+    Records nctId -> location for every mapped study, in input order.
+
+    add() takes the raw item as read (JSONL line bytes, or a dict for JSON arrays) with the input positions
+    around it (InputStream.records). Rows are committed by sync(), which also ends the current gzip member
+    and returns the block file's size (None without one), so checkpoints can truncate it on --resume.
+    """
+    def __init__(self, path: Path, input_path: Path, blocked: bool, dumps_line, level: int = 6,
+                 resume: bool = False):
+        blocks_path = path.with_name(RAW_BLOCKS_NAME)
+        if not resume:
+            # a fresh run starts a fresh index
+            for p in (path, blocks_path):
+                if p.exists():
+                    p.unlink()
+        self.path = path
+        self.dumps_line = dumps_line
+        self.level = level
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, "
+                          "size INTEGER, mtime_ns INTEGER)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS records (nct TEXT PRIMARY KEY, file INTEGER, block INTEGER, "
+                          "offset INTEGER, length INTEGER) WITHOUT ROWID")
+        if blocked:
+            self.blocks_path = blocks_path
+            self.blocks = open(blocks_path, "ab")
+            self.file_id = self._file_id(RAW_BLOCKS_NAME, None)
+        else:
+            self.blocks_path = self.blocks = None
+            self.file_id = self._file_id(str(Path(input_path).resolve()), os.stat(input_path))
+        self.conn.commit()
+        self.block = self.blocks.tell() if blocked else None
+        self.buf = []
+        self.pending = 0
+        self.rows = []
+
+    def _file_id(self, name, st):
+        self.conn.execute("INSERT OR IGNORE INTO files (path, size, mtime_ns) VALUES (?, ?, ?)",
+                          (name, st and st.st_size, st and st.st_mtime_ns))
+        return self.conn.execute("SELECT id FROM files WHERE path = ?", (name,)).fetchone()[0]
+
+    def add(self, nct, raw_item, offset, position):
+        if self.blocks is None:
+            # JSONL: position is the offset just past the line
+            length = len(raw_item.rstrip(b"\r\n"))
+            self.rows.append((nct, self.file_id, None, position - len(raw_item), length))
+        else:
+            if isinstance(raw_item, bytes):
+                line = raw_item.rstrip(b"\r\n") + b"\n"
+            else:
+                line = self.dumps_line(raw_item)
+            self.rows.append((nct, self.file_id, self.block, self.pending, len(line) - 1))
+            self.buf.append(line)
+            self.pending += len(line)
+            if self.pending >= BLOCK_BYTES:
+                self._end_block()
+        if len(self.rows) >= INSERT_ROWS:
+            self._insert()
+
+    def _end_block(self):
+        if self.buf:
+            comp = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # one gzip member
+            self.blocks.write(comp.compress(b"".join(self.buf)) + comp.flush())
+            self.block = self.blocks.tell()
+            self.buf = []
+            self.pending = 0
+
+    def _insert(self):
+        # first record of a repeated nctId wins
+        self.conn.executemany("INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?, ?)", self.rows)
+        self.rows = []
+
+    def sync(self):
+        """End the current member, commit the rows and return the block file's size (None without one)."""
+        if self.blocks is not None:
+            self._end_block()
+        self._insert()
+        self.conn.commit()
+        if self.blocks is None:
+            return None
+        self.blocks.flush()
+        os.fsync(self.blocks.fileno())
+        return self.blocks.tell()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self):
+        self.sync()
+        self.conn.close()
+        if self.blocks is not None:
+            self.blocks.close()
+
+# --------------------------
+# Reader (O(1) fetch by nctId)
+# --------------------------
+class RawIndex:
+    def __init__(self, path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(self.path)
+        self.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        self.files = {fid: (name, size, mtime_ns) for fid, name, size, mtime_ns
+                      in self.conn.execute("SELECT id, path, size, mtime_ns FROM files")}
+        self.handles = {}
+
+    def _open(self, fid):
+        fh = self.handles.get(fid)
+        if fh is None:
+            name, size, mtime_ns = self.files[fid]
+            path = self.path.parent / name  # absolute input paths are kept as they are
+            if size is not None:
+                st = os.stat(path)
+                if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                    raise ValueError(f"{path} changed since {self.path} was written; rebuild the index")
+            fh = self.handles[fid] = open(path, "rb")
+        return fh
+
+    def locate(self, nct):
+        """(file path, block, offset, length) for nct, or None if it is not indexed."""
+        row = self.conn.execute("SELECT file, block, offset, length FROM records WHERE nct = ?", (nct,)).fetchone()
+        if row is None:
+            return None
+        fid, block, offset, length = row
+        return (self.path.parent / self.files[fid][0], block, offset, length)
+
+    def get_bytes(self, nct):
+        """The raw JSON bytes of nct's record, or None if it is not indexed."""
+        row = self.conn.execute("SELECT file, block, offset, length FROM records WHERE nct = ?", (nct,)).fetchone()
+        if row is None:
+            return None
+        fid, block, offset, length = row
+        fh = self._open(fid)
+        if block is None:
+            fh.seek(offset)
+            return fh.read(length)
+        # inflate the record's member only as far as the record
+        fh.seek(block)
+        inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        end = offset + length
+        data = b""
+        while len(data) < end and not inflate.eof:
+            chunk = fh.read(READ_BYTES)
+            if not chunk:
+                break
+            data += inflate.decompress(chunk)
+        if len(data) < end:
+            raise ValueError(f"{self.files[fid][0]} is truncated at block {block}")
+        return data[offset:end]
+
+    def get(self, nct):
+        """nct's original study JSON as a dict, or None if it is not indexed."""
+        raw = self.get_bytes(nct)
+        return json.loads(raw) if raw is not None else None
+
+    def __contains__(self, nct):
+        return self.conn.execute("SELECT 1 FROM records WHERE nct = ?", (nct,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self):
+        for fh in self.handles.values():
+            fh.close()
+        self.handles = {}
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --------------------------
+# CLI (print raw records)
+# --------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Print the raw JSON of studies from a pre_processing.py --raw-index index")
+    parser.add_argument("--index", type=str, default=str(Path("kg_staging") / RAW_INDEX_NAME), help="raw_index.sqlite")
+    parser.add_argument("nct", nargs="+", help="nctIds to print")
+    args = parser.parse_args()
+    with RawIndex(args.index) as index:
+        for nct in args.nct:
+            raw = index.get_bytes(nct)
+            if raw is None:
+                parser.exit(1, f"{nct} is not in {args.index}\n")
+            print(raw.decode("utf-8"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# the repo is flat scripts; the synthetic dump generator lives with the benchmarks
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+import pre_processing as pp  # noqa: E402
+from synthetic import write_dump  # noqa: E402
+
+
+@pytest.fixture
+def sample_dump(tmp_path):
+    """A 60-study synthetic JSONL dump."""
+    return Path(write_dump(tmp_path / "sample.jsonl", 60))
+
+
+@pytest.fixture
+def read_dir():
+    """outdir -> {relative path: bytes} of its staging files (run bookkeeping files left out)."""
+    skip = {"checkpoint.json", "metrics.json", "section_timings.json", "dedupe_journal.jsonl"}
+
+    def read(outdir):
+        return {p.relative_to(outdir).as_posix(): p.read_bytes()
+                for p in sorted(Path(outdir).rglob("*")) if p.is_file() and p.name not in skip}
+    return read
+
+
+def interrupt_after(monkeypatch, n):
+    """Make the writer raise KeyboardInterrupt on the n-th record it applies, as a Ctrl-C mid-run would."""
+    real = pp.apply_record_output
+    applied = []
+
+    def apply(*args, **kwargs):
+        applied.append(1)
+        if len(applied) == n:
+            raise KeyboardInterrupt
+        return real(*args, **kwargs)
+    monkeypatch.setattr(pp, "apply_record_output", apply)
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+import pre_processing as pp
+from conftest import interrupt_after
+from synthetic import write_dump
+
+
+@pytest.fixture
+def dump(tmp_path):
+    return Path(write_dump(tmp_path / "dump.jsonl", 400))
+
+
+def test_checkpoints_are_off_by_default(tmp_path, sample_dump):
+    pp.process_file_with_progress(sample_dump, tmp_path / "out", progress="none")
+    assert not (tmp_path / "out" / pp.CHECKPOINT_NAME).exists()
+    assert not (tmp_path / "out" / pp.DEDUPE_JOURNAL_NAME).exists()
+
+
+@pytest.mark.parametrize("workers,chunk_size", [(1, 256), (2, 16)])
+@pytest.mark.parametrize("stop_at", [170, 399])
+def test_resume_after_interrupt_is_byte_identical(tmp_path, monkeypatch, dump, read_dir, workers, chunk_size,
+                                                  stop_at):
+    pp.process_file_with_progress(dump, tmp_path / "clean", progress="none")
+    outdir = tmp_path / "out"
+    with monkeypatch.context() as m:
+        interrupt_after(m, stop_at)
+        with pytest.raises(KeyboardInterrupt):
+            pp.process_file_with_progress(dump, outdir, workers=workers, chunk_size=chunk_size, checkpoint_every=50,
+                                          progress="none")
+    assert 0 < pp.load_checkpoint(outdir)["records"] < stop_at
+    pp.process_file_with_progress(dump, outdir, workers=workers, chunk_size=chunk_size, resume=True, progress="none")
+    assert pp.load_checkpoint(outdir)["complete"]
+    assert read_dir(outdir) == read_dir(tmp_path / "clean")
+
+
+def test_resume_needs_a_checkpoint(tmp_path, monkeypatch, dump):
+    with monkeypatch.context() as m:
+        interrupt_after(m, 10)
+        with pytest.raises(KeyboardInterrupt):
+            pp.process_file_with_progress(dump, tmp_path / "out", checkpoint_every=50, progress="none")
+    with pytest.raises(ValueError, match="No checkpoint"):
+        pp.process_file_with_progress(dump, tmp_path / "out", resume=True, progress="none")
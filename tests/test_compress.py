@@ -0,0 +1,60 @@
+import gzip
+import io
+from pathlib import Path
+
+import pytest
+
+import pre_processing as pp
+from conftest import interrupt_after
+from synthetic import write_dump
+
+
+def decompress(path):
+    """All members / frames of a .gz or .zst file."""
+    if path.suffix == ".gz":
+        return gzip.decompress(path.read_bytes())
+    zstandard = pytest.importorskip("zstandard")
+    with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(path.read_bytes()), read_across_frames=True) as r:
+        return r.read()
+
+
+def read_compressed(outdir, suffix):
+    """outdir -> {staging file name: decompressed bytes} for its compressed staging files."""
+    return {p.name[:-len(suffix)]: decompress(p) for p in sorted(Path(outdir).glob("*.jsonl" + suffix))}
+
+
+@pytest.fixture
+def dump(tmp_path):
+    return Path(write_dump(tmp_path / "dump.jsonl", 300))
+
+
+@pytest.mark.parametrize("compress", ["gzip", "zstd"])
+@pytest.mark.parametrize("workers,threads", [(1, 1), (2, 3)])
+def test_compressed_output_decompresses_byte_identical(tmp_path, read_dir, dump, compress, workers, threads):
+    if compress == "zstd":
+        pytest.importorskip("zstandard")
+    suffix = pp.COMPRESS_SUFFIX[compress]
+    pp.process_file_with_progress(dump, tmp_path / "plain", progress="none")
+    # a small flush buffer so every file is written in many compressed chunks
+    pp.process_file_with_progress(dump, tmp_path / "packed", workers=workers, chunk_size=32, flush_bytes=4096,
+                                  compress=compress, compress_threads=threads, progress="none")
+    plain = {name: data for name, data in read_dir(tmp_path / "plain").items() if name.endswith(".jsonl")}
+    assert read_compressed(tmp_path / "packed", suffix) == plain
+
+
+@pytest.mark.parametrize("compress", ["gzip", "zstd"])
+def test_resumed_compressed_output_is_byte_identical(tmp_path, monkeypatch, read_dir, dump, compress):
+    if compress == "zstd":
+        pytest.importorskip("zstandard")
+    suffix = pp.COMPRESS_SUFFIX[compress]
+    pp.process_file_with_progress(dump, tmp_path / "plain", progress="none")
+    outdir = tmp_path / "packed"
+    with monkeypatch.context() as m:
+        interrupt_after(m, 200)
+        with pytest.raises(KeyboardInterrupt):
+            pp.process_file_with_progress(dump, outdir, checkpoint_every=64, compress=compress, progress="none")
+    assert 0 < pp.load_checkpoint(outdir)["records"] < 200
+    # checkpoints end a member / frame, and resume truncates back to the last one
+    pp.process_file_with_progress(dump, outdir, resume=True, compress=compress, progress="none")
+    plain = {name: data for name, data in read_dir(tmp_path / "plain").items() if name.endswith(".jsonl")}
+    assert read_compressed(outdir, suffix) == plain
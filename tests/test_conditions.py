@@ -0,0 +1,40 @@
+import pytest
+
+import conditions
+
+
+@pytest.mark.parametrize("name,key", [
+    ("Graves Disease", "graves"),
+    ("Graves' Disease", "graves"),
+    ("Selection Bias", "selection bias"),
+    ("Dental Caries", "dental caries"),
+    ("Glasses", "glass"),
+    ("Abscesses", "abscess"),
+    ("Hot Flushes", "hot flush"),
+    ("Reflexes, Abnormal", "abnormal reflex"),
+    ("Headaches", "headache"),
+    ("Carcinomas", "carcinoma"),
+    ("Allergies", "allergy"),
+    ("Diabetes Mellitus, Type 2", "type 2 diabetes mellitus"),
+    ("Stage IV Tumours", "stage 4 tumor"),
+])
+def test_condition_key_plurals(name, key):
+    assert conditions.condition_key(name) == key
+
+
+@pytest.mark.parametrize("name,key", [
+    ("Kidney Diseases", "kidney disease"),
+    ("Chronic Kidney Disease", "chronic kidney disease"),
+    ("Lung Diseases, Interstitial", "interstitial lung disease"),
+    ("Coronary Artery Disease", "coronary artery disease"),
+    ("Liver Disorders", "liver disorder"),
+    ("Alzheimer's Disease", "alzheimer"),
+    ("Disease", "disease"),
+])
+def test_condition_key_generic_words(name, key):
+    assert conditions.condition_key(name) == key
+
+
+def test_organ_disease_variants_share_an_id():
+    assert conditions.canonical_condition("Kidney Diseases") == conditions.canonical_condition("kidney disease")
+    assert conditions.canonical_condition("Kidney Diseases") != conditions.canonical_condition("Kidney")
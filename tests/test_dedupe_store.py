@@ -0,0 +1,21 @@
+import random
+import sys
+
+import pytest
+
+import pre_processing as pp
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_hashed_store_matches_set_store(monkeypatch, numpy):
+    if not numpy:
+        # the stdlib merge path
+        monkeypatch.setitem(sys.modules, "numpy", None)
+    rng = random.Random(7)
+    keys = [f"NCT{rng.randrange(20000):08d}" for _ in range(30000)]
+    hashed, exact = pp.HashedStore(min_tail=64), pp.SetStore()
+    assert [hashed.add_new(k) for k in keys] == [exact.add_new(k) for k in keys]
+    assert len(hashed) == len(exact)
+    assert all(k in hashed for k in exact.keys) and "NCT99999999" not in hashed
+    fingerprints = hashed.sorted.tolist()
+    assert fingerprints == sorted(set(fingerprints)) and len(hashed.tail) < len(fingerprints)
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import eligibility
+import pre_processing as pp
+from synthetic import write_dump
+
+
+def test_summary_without_criteria_text():
+    assert eligibility.structured_criteria(None) == []
+    summary = eligibility.eligibility_summary({"sex": "ALL", "minimumAge": "18 Years"})
+    assert summary["inclusionCount"] == 0 and summary["minimumAgeYears"] == 18.0
+
+
+@pytest.mark.parametrize("workers,chunk_size", [(1, 256), (4, 25)])
+def test_missing_criteria_text_is_not_dead_lettered(tmp_path, workers, chunk_size):
+    dump = tmp_path / "dump.jsonl"
+    write_dump(dump, 400)
+    lines = dump.read_text(encoding="utf-8").splitlines()
+    for i in range(0, len(lines), 50):
+        js = json.loads(lines[i])
+        del js["protocolSection"]["eligibilityModule"]["eligibilityCriteria"]
+        lines[i] = json.dumps(js)
+    dump.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    outdir = tmp_path / "out"
+    pp.process_file_with_progress(dump, outdir, workers=workers, chunk_size=chunk_size, progress="none")
+    assert (outdir / pp.DEAD_LETTER_NAME).read_bytes() == b""
+    assert len((outdir / "eligibility_summary.jsonl").read_bytes().splitlines()) == 400
+
+
+def test_parse_criteria_markers_nesting_and_headers():
+    text = ("Key Inclusion Criteria:\r\n"
+            "* Age >= 18  \n"
+            "   a. nested item\n"
+            "\t(ii)\ttab nested\n"
+            "      continued text\n"
+            "2) second\n"
+            "INCLUSION CRITERIA (cohort B): inline item\n"
+            "Exclusion Criteria\n"
+            "- Pregnant\n"
+            "o bullet\n")
+    rows = [(c["tag"], c["text"], c["sequence"], c["level"], c["parent"]) for c in eligibility.parse_criteria(text)]
+    assert rows == [
+        ("IN", "Age >= 18", 0, 0, None),
+        ("IN", "nested item", 1, 1, 0),
+        ("IN", "tab nested continued text", 2, 2, 1),  # a tab is 4 columns
+        ("IN", "second", 3, 0, None),
+        ("IN", "inline item", 4, 0, None),
+        ("EX", "Pregnant", 0, 0, None),
+        ("EX", "bullet", 1, 0, None),
+    ]
+
+
+def test_criteria_parsed_once_per_record(monkeypatch, sample_dump):
+    calls = []
+    real = eligibility.add_constraints
+    monkeypatch.setattr(eligibility, "add_constraints", lambda criteria: calls.append(1) or real(criteria))
+    line = sample_dump.read_bytes().splitlines()[1]
+    out, _ = pp.extract_record(line, sample_dump, sections=["eligibility"])
+    files = [fname for fname, _, _ in out]
+    assert files.count("eligibility_summary.jsonl") == 1 and files.count("eligibility.jsonl") > 1
+    assert len(calls) == 1
+
+
+def test_marker_prefixed_headers():
+    text = ("* Inclusion Criteria:\n"
+            "  - Age >= 18\n"
+            "1. Exclusion Criteria: pregnant\n"
+            "  - eGFR < 30\n"
+            "- Meets the inclusion criteria of the parent protocol, including consent to the extension phase\n")
+    rows = [(c["tag"], c["text"], c["level"]) for c in eligibility.parse_criteria(text)]
+    assert rows == [
+        ("IN", "Age >= 18", 0),
+        ("EX", "pregnant", 0),
+        ("EX", "eGFR < 30", 1),
+        ("EX", "Meets the inclusion criteria of the parent protocol, including consent to the extension phase", 0),
+    ]
+
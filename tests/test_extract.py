@@ -0,0 +1,119 @@
+import gzip
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+import pre_processing as pp
+from conftest import interrupt_after
+
+
+@pytest.mark.parametrize("line", [b"[1, 2]\n", b"null\n", b'"text"\n', b"42\n"])
+def test_non_object_record_is_dead_lettered(line):
+    out, study = pp.extract_record(line, Path("dump.jsonl"), offset=7)
+    assert study is None
+    assert [fname for fname, _, _ in out] == [pp.DEAD_LETTER_NAME]
+    entry = json.loads(out[0][1])
+    assert entry["nctId"] is None and entry["offset"] == 7
+
+
+def test_run_survives_non_object_records(tmp_path, sample_dump, read_dir):
+    dump = tmp_path / "mixed.jsonl"
+    lines = sample_dump.read_bytes().splitlines(keepends=True)
+    dump.write_bytes(b"".join(lines[:3]) + b"[1, 2]\nnull\n" + b"".join(lines[3:]))
+    pp.process_file_with_progress(dump, tmp_path / "serial", progress="none")
+    pp.process_file_with_progress(dump, tmp_path / "workers", workers=2, chunk_size=4, progress="none")
+    serial = read_dir(tmp_path / "serial")
+    dead = [json.loads(line) for line in serial[pp.DEAD_LETTER_NAME].splitlines()]
+    assert [d["nctId"] for d in dead] == [None, None]
+    assert len(serial["trials.jsonl"].splitlines()) == len(lines)
+    # --workers output matches the serial run byte for byte, on every staging file
+    assert read_dir(tmp_path / "workers") == serial
+
+
+def test_failed_run_closes_its_outputs(tmp_path, monkeypatch, sample_dump):
+    opened = []
+    real_open = pp.open_jsonl_writer
+
+    def open_jsonl_writer(*args, **kwargs):
+        opened.append(real_open(*args, **kwargs))
+        return opened[-1]
+    monkeypatch.setattr(pp, "open_jsonl_writer", open_jsonl_writer)
+    interrupt_after(monkeypatch, 30)
+    with pytest.raises(KeyboardInterrupt):
+        pp.process_file_with_progress(sample_dump, tmp_path / "out", compress="gzip", progress="none")
+    # the staging files and the dead letter were all opened, and are all closed (and flushed) again
+    assert len(opened) > 30 and all(fp.fp.closed for fp in opened)
+    assert gzip.decompress((tmp_path / "out" / "trials.jsonl.gz").read_bytes()).count(b"\n") == 29
+
+
+
+def test_non_object_list_items_are_dead_lettered():
+    js = {"protocolSection": {
+        "identificationModule": {"nctId": "NCT00000001"},
+        "armsInterventionsModule": {"armGroups": [5, {"label": "A", "interventionNames": ["Drug: X"]}]},
+        "contactsLocationsModule": {"locations": ["Mayo Clinic"]}}}
+    out, study = pp.extract_record(json.dumps(js), Path("dump.jsonl"), offset=7)
+    assert study[0] == "NCT00000001"
+    # the valid arm is still mapped, the bad items are reported in one entry for the record
+    assert [json.loads(line)["label"] for fname, line, _ in out if fname == "arms.jsonl"] == ["A"]
+    dead = [json.loads(line) for fname, line, _ in out if fname == pp.DEAD_LETTER_NAME]
+    assert dead == [{"error": "invalid_items", "nctId": "NCT00000001", "input": "dump.jsonl", "offset": 7, "items": [
+        {"path": "protocol.armsInterventionsModule.armGroups", "item": "5"},
+        {"path": "protocol.contactsLocationsModule.locations", "item": "'Mayo Clinic'"}]}]
+
+
+def test_site_identity():
+    site = {"facility": "Hôpital Saint-Louis", "city": "Paris", "zip": "75010", "country": "France",
+            "geoPoint": {"lat": 48.8738, "lon": 2.3685}}
+    same = {"facility": "HOPITAL SAINT LOUIS", "city": "paris", "zip": "75010", "country": "France",
+            "geoPoint": {"lat": 48.87, "lon": 2.37}}
+    assert pp._site_id(site) == pp._site_id(same) == pp._site_id(dict(site, geoPoint=None))
+    assert pp._site_id(site) != pp._site_id(dict(site, zip="75012"))
+    assert pp._site_id(site) != pp._site_id(dict(site, zip=None))
+    springfield = {"facility": "General Hospital", "city": "Springfield", "country": "United States"}
+    assert pp._site_id(dict(springfield, state="Illinois")) != pp._site_id(dict(springfield, state="Ohio"))
+
+
+def test_sites_are_written_once(tmp_path):
+    locations = [
+        {"facility": "Mayo Clinic", "city": "Rochester", "state": "Minnesota", "zip": "55905",
+         "country": "United States", "status": "RECRUITING", "geoPoint": {"lat": 44.0225, "lon": -92.4699}},
+        {"facility": "Mayo Clinic", "city": "Rochester", "state": "New York", "country": "United States"},
+    ]
+    dump = tmp_path / "sites.jsonl"
+    with open(dump, "w", encoding="utf-8") as f:
+        for i in range(3):
+            js = {"protocolSection": {"identificationModule": {"nctId": f"NCT0000000{i}"},
+                                      "contactsLocationsModule": {"locations": locations}}}
+            # the geocoder moves the same address a little between studies
+            js["protocolSection"]["contactsLocationsModule"]["locations"][0]["geoPoint"]["lat"] += 0.01
+            f.write(json.dumps(js) + "\n")
+    outdir = tmp_path / "out"
+    pp.process_file_with_progress(dump, outdir, only=["sites"], progress="none")
+    sites = [json.loads(line) for line in (outdir / "sites.jsonl").read_bytes().splitlines()]
+    assert [(s["state"], s["zip"]) for s in sites] == [("Minnesota", "55905"), ("New York", None)]
+    rels = [json.loads(line) for line in (outdir / "trial_has_site_rel.jsonl").read_bytes().splitlines()]
+    assert len(rels) == 6 and {r["siteId"] for r in rels} == {s["siteId"] for s in sites}
+
+def test_json_array_streams_elements():
+    text = '[{"a": 1},\n 2.5 , "x", [1, {"b": null}]]'
+    items = list(pp.iter_json_array(io.StringIO(text), chunk_size=3))
+    assert [obj for _, obj in items] == [{"a": 1}, 2.5, "x", [1, {"b": None}]]
+    assert [text[:off].rstrip()[-1] for off, _ in items] == ["}", "5", '"', "]"]
+
+
+def test_malformed_json_array_element_is_bounded():
+    reads = []
+
+    class Stream(io.StringIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    # an unterminated string: without the cap every remaining chunk is appended to the buffer
+    text = '[{"a": 1}, {"b": "' + "x" * 10000 + '}, {"c": 3}]'
+    with pytest.raises(ValueError, match="does not decode within 100 characters"):
+        list(pp.iter_json_array(Stream(text), chunk_size=16, max_record=100))
+    assert len(reads) < 20
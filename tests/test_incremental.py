@@ -0,0 +1,80 @@
+import json
+import random
+
+import pre_processing as pp
+from synthetic import study, write_dump
+
+
+def owner(row):
+    """The study a staging row belongs to: its nctId / from_nct, or the NCT prefix of its id."""
+    nct = row.get("nctId") or row.get("from_nct")
+    if nct:
+        return nct
+    return next(v.split("::")[0] for v in row.values() if isinstance(v, str) and v.startswith("NCT"))
+
+
+# shared node files -> the node key their rows are deduplicated on (the schema's `seen` keys)
+NODE_KEYS = {
+    "organizations.jsonl": lambda r: r["name"].strip().lower(),
+    "conditions.jsonl": lambda r: r["canonicalId"],
+    "condition_aliases.jsonl": lambda r: (r["alias"].lower(), r["canonicalId"]),
+    "interventions.jsonl": lambda r: r["name"].lower(),
+    "intervention_aliases.jsonl": lambda r: (r["alias"].lower(), r["canonicalId"]),
+    "sites.jsonl": lambda r: r["siteId"],
+    "contacts.jsonl": lambda r: r["contactId"],
+    "investigators.jsonl": lambda r: r["personId"],
+}
+
+
+def apply_delta(base, delta):
+    """
+    Staging files of a full run plus an --incremental run's output -> the files a loader would end up with:
+    each <file>.deletes.jsonl drops its studies' rows from <file>, then the upserts are added. Shared
+    node files only receive upserts and are reduced to their node keys: a node keeps the attributes of
+    the first row written for it ("Dr. John Smith" or "John Smith, MD"), which depends on input order.
+    """
+    merged = {}
+    for path in sorted(base.glob("*.jsonl")):
+        if path.name == pp.DEAD_LETTER_NAME or path.name.endswith(".deletes.jsonl"):
+            continue
+        lines = path.read_bytes().splitlines()
+        deletes = delta / pp.delete_name(path.name)
+        if deletes.exists():
+            gone = {json.loads(line)["nctId"] for line in deletes.read_bytes().splitlines()}
+            lines = [line for line in lines if owner(json.loads(line)) not in gone]
+        upserts = delta / path.name
+        lines += upserts.read_bytes().splitlines() if upserts.exists() else []
+        key = NODE_KEYS.get(path.name)
+        merged[path.name] = sorted({key(json.loads(line)) for line in lines}) if key else sorted(lines)
+    return merged
+
+
+def test_incremental_deltas_rebuild_a_full_run(tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    manifest = tmp_path / "manifest.sqlite"
+    write_dump(dump, 60)
+    pp.process_file_with_progress(dump, tmp_path / "base", manifest_path=manifest, progress="none")
+
+    studies = [json.loads(line) for line in dump.read_bytes().splitlines()]
+    # modified: a new title, a changed condition list, a site dropped, results removed
+    studies[3]["protocolSection"]["identificationModule"]["briefTitle"] = "Renamed"
+    studies[10]["protocolSection"]["conditionsModule"]["conditions"] = ["Asthma", "Obesity"]
+    studies[11]["protocolSection"]["contactsLocationsModule"]["locations"].pop(0)
+    del studies[12]["resultsSection"]
+    # removed, and added
+    del studies[40], studies[5]
+    rng = random.Random(7)
+    studies += [study(i, rng) for i in range(60, 64)]
+    dump.write_text("".join(json.dumps(js, ensure_ascii=False) + "\n" for js in studies), encoding="utf-8")
+
+    pp.process_file_with_progress(dump, tmp_path / "delta", manifest_path=manifest, incremental=True,
+                                  progress="none")
+    pp.process_file_with_progress(dump, tmp_path / "fresh", progress="none")
+
+    merged = apply_delta(tmp_path / "base", tmp_path / "delta")
+    fresh = apply_delta(tmp_path / "fresh", tmp_path / "no-delta")
+    assert merged == fresh
+    # the delta holds only what changed
+    trials = (tmp_path / "delta" / "trials.jsonl").read_bytes().splitlines()
+    assert sorted(json.loads(line)["nctId"] for line in trials) == [
+        "NCT00000003", "NCT00000060", "NCT00000061", "NCT00000062", "NCT00000063"]
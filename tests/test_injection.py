@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import injection
+import pre_processing as pp
+
+
+@pytest.fixture
+def load_all(monkeypatch):
+    """outdir -> {loader label: rows sent to Neo4j}, running injection.main against outdir without a server."""
+    real = injection.batch_loader
+    rows = []
+    loaded = {}
+
+    def batch_loader(df, query, label):
+        rows.clear()
+        real(df, query, label)
+        loaded[label] = list(rows)
+    monkeypatch.setattr(injection, "batch_loader", batch_loader)
+    monkeypatch.setattr(injection, "run_query", lambda query, parameters=None: rows.extend(
+        (parameters or {}).get("rows", [])))
+
+    def load(outdir):
+        monkeypatch.setattr(injection, "DATA_DIR", str(outdir))
+        loaded.clear()
+        injection.main()
+        return dict(loaded)
+    return load
+
+
+def test_staging_round_trip(tmp_path, sample_dump, load_all):
+    pp.process_file_with_progress(sample_dump, tmp_path / "jsonl", progress="none")
+    pp.process_file_with_progress(sample_dump, tmp_path / "parquet", output_format="parquet", progress="none")
+    loaded = load_all(tmp_path / "parquet")
+
+    assert loaded == load_all(tmp_path / "jsonl")
+    assert set(loaded) == {"Studies", "Eligibility", "Sponsors", "Conditions", "Interventions", "Arms",
+                           "Sites", "Site links", "Outcomes"}
+    # plain values only: no NaN, numpy scalars or arrays for the driver
+    json.dumps(loaded, allow_nan=False)
+
+    studies = loaded["Studies"]
+    assert len(studies) == 60
+    assert studies[0]["nct_id"] == "NCT00000000" and studies[0]["enrollment"] > 0
+    assert all(s["phases"] in ("PHASE2", "PHASE3", "PHASE1;PHASE2") for s in studies)
+    assert len(loaded["Eligibility"]) == 60
+    assert all(s["lead_sponsor"] and s["lead_sponsor_class"] for s in loaded["Sponsors"])
+    assert all(c["condition"] and c["canonical_id"] for c in loaded["Conditions"])
+    assert all(i["intervention_type"] == "DRUG" and i["role"] for i in loaded["Interventions"])
+    assert {a["arm_label"] for a in loaded["Arms"]} == {"Arm A", "Arm B"}
+    assert all(o["timeframe"] or o["measure"] == "Weight" for o in loaded["Outcomes"])
+    site_ids = {s["site_id"] for s in loaded["Sites"]}
+    assert len(loaded["Site links"]) == 60 * 3 and {e["site_id"] for e in loaded["Site links"]} <= site_ids
+
+
+
+def test_load_sites(tmp_path, sample_dump, load_all):
+    pp.process_file_with_progress(sample_dump, tmp_path, progress="none")
+    loaded = load_all(tmp_path)
+    sites = loaded["Sites"]
+    # three named sites and the bare "Nowhere" entry, each once whatever its coordinates
+    assert sorted(s["facility"] for s in sites) == ["Charité", "Mayo Clinic", "Mayo Clinic Hospital", "Nowhere"]
+    assert len({s["site_id"] for s in sites}) == 4
+    assert all({"state", "zip", "lat", "lon"} <= set(s) for s in sites)
+    links = loaded["Site links"]
+    assert len(links) == 60 * 3 and {e["site_id"] for e in links} == {s["site_id"] for s in sites}
+    assert {e["status"] for e in links} == {"RECRUITING", None}
+
+def test_staging_without_eligibility_summary(tmp_path, sample_dump, load_all):
+    pp.process_file_with_progress(sample_dump, tmp_path, skip=["eligibility"], progress="none")
+    loaded = load_all(tmp_path)
+    assert "Eligibility" not in loaded and len(loaded["Studies"]) == 60
+
+
+def test_staging_adverse_events(tmp_path, sample_dump, monkeypatch):
+    pp.process_file_with_progress(sample_dump, tmp_path, output_format="parquet", progress="none")
+    monkeypatch.setattr(injection, "DATA_DIR", str(tmp_path))
+    events = injection.read_table("adverse_events")
+    # one serious event per study with results (every other study), group rows left out
+    assert len(events) == 30
+    assert events[["event_term", "num_affected", "num_at_risk"]].values.tolist() == [["Nausea", 2, 50]] * 30
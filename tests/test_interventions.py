@@ -0,0 +1,102 @@
+import json
+import random
+import subprocess
+import sys
+
+import pytest
+
+import interventions
+from conftest import ROOT
+
+
+@pytest.fixture(autouse=True)
+def no_synonyms():
+    interventions.load_synonyms(None)
+    yield
+    interventions.load_synonyms(None)
+
+
+@pytest.mark.parametrize("name", ["Semaglutide", "semaglutide 1mg", "Drug: Semaglutide 2.4 mg s.c. once weekly",
+                                  "SEMAGLUTIDE (NN9535) 0,5 mg/kg subcutaneous injection"])
+def test_semaglutide_spellings_share_an_id(name):
+    assert interventions.canonical_intervention(name) == {"id": "semaglutide", "role": "active"}
+
+
+@pytest.mark.parametrize("name,role", [
+    ("Placebo (semaglutide)", "placebo"),
+    ("Matching placebo tablets", "placebo"),
+    ("Normal Saline", "placebo"),
+    ("Sham acupuncture", "sham"),
+    ("Standard of Care", "standard of care"),
+    ("Best supportive care", "standard of care"),
+    ("No Intervention: control", "no intervention"),
+    ("Wait-list", "no intervention"),
+])
+def test_control_roles(name, role):
+    assert interventions.canonical_intervention(name) == {"id": role, "role": role}
+
+
+@pytest.mark.parametrize("name,key", [
+    ("Hydrocortisone 1% cream", "hydrocortisone"),
+    ("Cyclophosphamide 500 mg/m2 IV", "cyclophosphamide"),
+    ("CAR-T cells 10^6 cells/kg", "car-t cells"),
+    ("Vitamin D3", "vitamin d3"),
+    ("   ", None),
+])
+def test_doses_and_forms_are_dropped(name, key):
+    found = interventions.canonical_intervention(name)
+    assert (found and found["id"]) == key
+
+
+STUDIES = [
+    ("Semaglutide", ["NN9535", "Ozempic"]),
+    ("Semaglutide 1 mg", ["Ozempic"]),
+    ("NN9535", ["Ozempic", "semaglutide"]),
+    ("Cisplatin", ["Chemotherapy", "CDDP"]),
+    ("Docetaxel", ["Chemotherapy", "Taxotere"]),
+    ("Insulin glargine", ["Lantus", "Insulin"]),
+    ("Insulin lispro", ["Humalog", "Insulin"]),
+    ("Placebo", ["Sugar pill"]),
+    ("Metformin", ["IV"]),
+]
+
+
+def test_build_synonyms_groups():
+    table = interventions.build_synonyms(STUDIES)
+    syn = table["synonyms"]
+    assert syn["nn9535"] == "semaglutide" and syn["ozempic"] == "semaglutide"
+    assert syn["cddp"] == "cisplatin" and syn["taxotere"] == "docetaxel" and syn["lantus"] == "insulin glargine"
+    # generic otherNames shared by unrelated drugs link nothing
+    assert "chemotherapy" not in syn and "insulin" not in syn
+    assert "docetaxel" not in syn and "insulin lispro" not in syn
+    assert table["ambiguous"] == 2
+    # controls and short otherNames are left out
+    assert "sugar pill" not in syn and "iv" not in syn
+
+
+def test_build_synonyms_ignores_input_order():
+    expected = interventions.build_synonyms(STUDIES)
+    for seed in range(5):
+        shuffled = STUDIES * 2
+        random.Random(seed).shuffle(shuffled)
+        assert interventions.build_synonyms(shuffled) == expected
+
+
+def test_synonym_table_applies(tmp_path):
+    path = tmp_path / "synonyms.json"
+    path.write_text(json.dumps(interventions.build_synonyms(STUDIES)), encoding="utf-8")
+    interventions.load_synonyms(path)
+    assert interventions.canonical_intervention("Ozempic 1 mg")["id"] == "semaglutide"
+
+
+def test_cli_skips_non_object_records(tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    study = {"protocolSection": {"armsInterventionsModule": {"interventions": [
+        {"name": "Semaglutide", "otherNames": ["Ozempic"]}, 5]}}}
+    dump.write_text("\n".join(json.dumps(js) for js in [study, [1, 2], None, {"protocolSection": []}]) + "\n",
+                    encoding="utf-8")
+    out = tmp_path / "synonyms.json"
+    run = subprocess.run([sys.executable, str(ROOT / "interventions.py"), "-i", str(dump), "-o", str(out)],
+                         cwd=tmp_path, capture_output=True, text=True, check=True)
+    assert "Wrote 1 synonyms in 1 groups" in run.stdout
+    assert json.loads(out.read_text(encoding="utf-8"))["synonyms"] == {"ozempic": "semaglutide"}
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import pre_processing as pp
+
+PARITY_BACKENDS = ["orjson", "ujson"]
+
+
+@pytest.fixture
+def codec():
+    """set_codec for the test; the process-wide codec is reset to the default afterwards."""
+    yield pp.set_codec
+    pp.set_codec()
+
+
+@pytest.fixture
+def awkward_dump(tmp_path, sample_dump):
+    # values the backends spell differently: non-ASCII, "/", large floats, integers beyond 64 bits
+    lines = sample_dump.read_text(encoding="utf-8").splitlines()
+    js = json.loads(lines[1])
+    js["protocolSection"]["identificationModule"]["briefTitle"] = "Ünïcödé /   \"quoted\" \\ tab\t"
+    js["protocolSection"]["designModule"]["enrollmentInfo"]["count"] = 2 ** 70
+    js["protocolSection"]["contactsLocationsModule"]["locations"][0]["geoPoint"] = {"lat": 1e20, "lon": -0.000001}
+    lines[1] = json.dumps(js, ensure_ascii=False)
+    dump = tmp_path / "awkward.jsonl"
+    dump.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return dump
+
+
+def test_default_backend_is_stdlib(codec):
+    assert codec().name == "json"
+    assert pp.CODEC.dumps_line({"a": [1, "é"]}) == '{"a": [1, "é"]}\n'.encode("utf-8")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("backend", PARITY_BACKENDS)
+def test_backend_output_parses_to_stdlib_output(tmp_path, awkward_dump, read_dir, codec, backend, workers):
+    pytest.importorskip(backend)
+    codec("json")
+    pp.process_file_with_progress(awkward_dump, tmp_path / "json", workers=workers, progress="none")
+    expected = read_dir(tmp_path / "json")
+    assert codec(backend).name == backend
+    pp.process_file_with_progress(awkward_dump, tmp_path / backend, workers=workers, progress="none")
+    actual = read_dir(tmp_path / backend)
+
+    assert actual.keys() == expected.keys()
+    for name, data in expected.items():
+        want = [json.loads(line) for line in data.splitlines()]
+        got = [json.loads(line) for line in actual[name].splitlines()]
+        assert got == want, name
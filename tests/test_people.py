@@ -0,0 +1,111 @@
+import json
+import random
+import subprocess
+import sys
+
+import pytest
+
+import people
+import pre_processing as pp
+from conftest import ROOT
+from synthetic import study
+
+
+@pytest.fixture(autouse=True)
+def no_person_map():
+    people.load_person_map(None)
+    yield
+    people.load_person_map(None)
+
+
+def test_person_key_components():
+    assert people.person_key("Smith, John A., MD", "Mayo Clinic") == "john a smith|mayo clinic|"
+    assert people.person_key("Dr. John Adam Smith", "Univ. Hosp.") == "john a smith|university hospital|"
+    # the email is not run through the affiliation rules
+    assert people.person_key("Jane Doe", email=" JDoe@univ.edu ") == "jane doe||jdoe@univ.edu"
+    assert people.person_key("M.D.", "Mayo Clinic") == ""
+
+
+def test_middle_initials_keep_people_apart():
+    assert people.person_id("John A. Smith", "Mayo Clinic") != people.person_id("John B. Smith", "Mayo Clinic")
+    assert people.person_id("John A. Smith", "Mayo Clinic") == people.person_id("Smith, John Adam", "Mayo Clinic")
+
+
+def test_name_alone_is_scoped_to_the_trial():
+    assert people.person_id("John Smith") is None
+    a = people.person_id("John Smith", trial="NCT00000001")
+    assert a and a != people.person_id("John Smith", trial="NCT00000002")
+    assert a == people.person_id("Dr. John Smith", None, "", "NCT00000001")
+    # with an affiliation or email the trial plays no part
+    assert people.person_id("John Smith", "Mayo Clinic", None, "NCT1") == people.person_id("John Smith", "Mayo Clinic")
+    assert people.person_id("Jane Doe", None, "jd@x.org", "NCT1") == people.person_id("Jane Doe", None, "jd@x.org", "NCT2")
+
+
+OFFICIALS = [
+    ("John Smith, MD", "Mayo Clinic"), ("Dr. John Smith", "Mayo Clinic, Rochester"),
+    ("J. Smith", "Mayo Clinic"), ("John A. Smith", "Mayo Clinic"), ("John B. Smith", "Mayo Clinic"),
+    ("Jim Smith", "Mayo Clinic"), ("Jane Doe", "Stanford University"), ("Jane Doe", "Stanford Univ."),
+    ("Jane Doe", None), ("Jane Doe", "Tata Memorial Centre"),
+]
+
+
+def test_build_person_map_merges_variants_without_bridging():
+    persons = people.build_person_map(OFFICIALS)["persons"]
+    canon = lambda name, aff: persons.get(people.person_key(name, aff), people.person_key(name, aff))  # noqa: E731
+    assert canon("Dr. John Smith", "Mayo Clinic, Rochester") == canon("John Smith, MD", "Mayo Clinic")
+    assert canon("Jane Doe", "Stanford Univ.") == canon("Jane Doe", "Stanford University")
+    # "John Smith" fits both John A. and John B., "J. Smith" fits John and Jim: neither joins anyone
+    assert canon("John A. Smith", "Mayo Clinic") != canon("John B. Smith", "Mayo Clinic")
+    assert canon("John A. Smith", "Mayo Clinic") != canon("John Smith, MD", "Mayo Clinic")
+    assert canon("J. Smith", "Mayo Clinic") == people.person_key("J. Smith", "Mayo Clinic")
+    assert canon("Jane Doe", None) == people.person_key("Jane Doe", None)
+    assert canon("Jane Doe", "Tata Memorial Centre") != canon("Jane Doe", "Stanford University")
+
+
+def test_build_person_map_ignores_input_order():
+    expected = people.build_person_map(OFFICIALS)
+    for seed in range(5):
+        shuffled = OFFICIALS * 2
+        random.Random(seed).shuffle(shuffled)
+        assert people.build_person_map(shuffled) == expected
+
+
+def test_investigators_and_contacts_dedupe(tmp_path):
+    rng = random.Random(1)
+    officials = [{"name": "Dr. John Smith", "affiliation": "Mayo Clinic", "role": "PRINCIPAL_INVESTIGATOR"},
+                 {"name": "John Smith", "role": "STUDY_CHAIR"}]
+    contacts = [{"name": "Jane Doe", "email": "JDoe@univ.edu", "role": "CONTACT"}, {"name": "Jane Doe", "role": "CONTACT"}]
+    dump = tmp_path / "people.jsonl"
+    with open(dump, "w", encoding="utf-8") as f:
+        for i in range(3):
+            js = study(i, rng)
+            js["protocolSection"]["contactsLocationsModule"].update(overallOfficials=officials, centralContacts=contacts)
+            f.write(json.dumps(js) + "\n")
+    outdir = tmp_path / "out"
+    pp.process_file_with_progress(dump, outdir, progress="none")
+    read = lambda name: [json.loads(line) for line in (outdir / name).read_bytes().splitlines()]  # noqa: E731
+
+    investigators = read("investigators.jsonl")
+    # the affiliated official once for all trials, the bare name once per trial
+    assert sorted(inv["affiliation"] or "" for inv in investigators) == ["", "", "", "Mayo Clinic"]
+    assert len({inv["personId"] for inv in investigators}) == 4
+    rels = read("trial_has_investigator_rel.jsonl")
+    assert len(rels) == 6 and {r["personId"] for r in rels} == {inv["personId"] for inv in investigators}
+
+    found = read("contacts.jsonl")
+    assert sorted(c["email"] or "" for c in found) == ["", "", "", "JDoe@univ.edu"]
+    assert len({c["contactId"] for c in found}) == 4
+
+
+def test_cli_skips_non_object_records(tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    js = study(1, random.Random(1))
+    js["protocolSection"]["contactsLocationsModule"]["overallOfficials"] = [
+        {"name": "John Smith", "affiliation": "Mayo Clinic"}, {"name": "J. Smith", "affiliation": "Mayo Clinic"}, 7]
+    dump.write_text("\n".join(json.dumps(x) for x in [js, [1, 2], None, {"protocolSection": "x"}]) + "\n",
+                    encoding="utf-8")
+    out = tmp_path / "person_map.json"
+    run = subprocess.run([sys.executable, str(ROOT / "people.py"), "-i", str(dump), "-o", str(out)],
+                         cwd=tmp_path, capture_output=True, text=True, check=True)
+    assert "Wrote 1 aliases in 1 groups" in run.stdout
+    assert json.loads(out.read_text(encoding="utf-8"))["persons"] == {"j smith|mayo clinic|": "john smith|mayo clinic|"}
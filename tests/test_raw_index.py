@@ -0,0 +1,52 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+import pre_processing as pp
+from conftest import interrupt_after
+from raw_index import RAW_INDEX_NAME, RawIndex
+from synthetic import write_dump
+
+
+def input_records(dump):
+    """nctId -> raw line (without the array comma) of every study in a synthetic dump."""
+    opener = gzip.open if str(dump).endswith(".gz") else open
+    with opener(dump, "rb") as f:
+        lines = [line.strip() for line in f if line.strip() not in (b"", b"[", b"]")]
+    return {json.loads(line.rstrip(b","))["protocolSection"]["identificationModule"]["nctId"]: line.rstrip(b",")
+            for line in lines}
+
+
+def check_index(outdir, records, in_place):
+    with RawIndex(outdir / RAW_INDEX_NAME) as index:
+        assert len(index) == len(records)
+        for nct, line in records.items():
+            if in_place:
+                # plain JSONL is indexed in place: the fetch is the input's own bytes
+                assert index.get_bytes(nct).strip() == line
+            assert index.get(nct) == json.loads(line)
+        assert index.get("NCT99999999") is None and "NCT99999999" not in index
+
+
+@pytest.mark.parametrize("name,fmt", [("dump.jsonl", "jsonl"), ("dump.jsonl.gz", "jsonl"), ("dump.json", "array")])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_raw_index_fetches_match_the_input(tmp_path, name, fmt, workers):
+    dump = Path(write_dump(tmp_path / name, 300, fmt=fmt))
+    outdir = tmp_path / "out"
+    pp.process_file_with_progress(dump, outdir, workers=workers, chunk_size=16, raw_index=True, progress="none")
+    check_index(outdir, input_records(dump), in_place=name == "dump.jsonl")
+
+
+@pytest.mark.parametrize("name,fmt", [("dump.jsonl", "jsonl"), ("dump.jsonl.gz", "jsonl"), ("dump.json", "array")])
+def test_raw_index_survives_a_crash_and_resume(tmp_path, monkeypatch, name, fmt):
+    dump = Path(write_dump(tmp_path / name, 300, fmt=fmt))
+    outdir = tmp_path / "out"
+    with monkeypatch.context() as m:
+        interrupt_after(m, 230)
+        with pytest.raises(KeyboardInterrupt):
+            pp.process_file_with_progress(dump, outdir, checkpoint_every=64, raw_index=True, progress="none")
+    assert 0 < pp.load_checkpoint(outdir)["records"] < 230
+    pp.process_file_with_progress(dump, outdir, resume=True, raw_index=True, progress="none")
+    check_index(outdir, input_records(dump), in_place=name == "dump.jsonl")
@@ -0,0 +1,67 @@
+import gzip
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+import pre_processing as pp
+from synthetic import study
+
+
+def bad_studies():
+    """Synthetic studies with dead-letter cases mixed in at known positions."""
+    rng = random.Random(3)
+    items = [study(i, rng) for i in range(120)]
+    items[7] = {"protocolSection": {"identificationModule": {}}}            # missing nctId
+    items[30] = [1, 2]                                                      # not an object
+    items[31] = None
+    items[64]["protocolSection"]["armsInterventionsModule"]["armGroups"].append(5)  # invalid list item
+    items[119] = {"protocolSection": {"identificationModule": {"nctId": ""}}}
+    return items
+
+
+def write_input(path, fmt):
+    items = bad_studies()
+    if fmt == "array":
+        text = "[\n" + ",\n".join(json.dumps(js, ensure_ascii=False) for js in items) + "\n]\n"
+    else:
+        lines = [json.dumps(js, ensure_ascii=False) for js in items]
+        lines[50] = lines[50][:-20]                                         # truncated line: parse error
+        text = "\n".join(lines) + "\n"
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        f.write(text)
+    return Path(path)
+
+
+def dead_letter(outdir, compress="none"):
+    return pp.read_dead_letter(Path(outdir) / (pp.DEAD_LETTER_NAME + pp.COMPRESS_SUFFIX.get(compress, "")))
+
+
+@pytest.mark.parametrize("name,fmt", [("dump.jsonl", "jsonl"), ("dump.jsonl.gz", "jsonl"), ("dump.json", "array")])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_replay_reproduces_dead_letter_offsets(tmp_path, name, fmt, workers):
+    dump = write_input(tmp_path / name, fmt)
+    pp.process_file_with_progress(dump, tmp_path / "run", workers=workers, chunk_size=8, progress="none")
+    entries = dead_letter(tmp_path / "run")
+    assert len(entries) == (6 if fmt == "jsonl" else 5)
+    assert all(e["input"] == str(dump) for e in entries)
+
+    offsets, other = pp.replay_offsets(entries, dump)
+    assert other == 0 and len(offsets) == len(entries)
+    pp.process_file_with_progress(dump, tmp_path / "replay", workers=workers, chunk_size=8, replay=offsets,
+                                  progress="none")
+    # the same failures, at the same offsets, and nothing else was mapped
+    assert dead_letter(tmp_path / "replay") == entries
+    trials = (tmp_path / "replay" / "trials.jsonl").read_bytes().splitlines()
+    assert [json.loads(line)["nctId"] for line in trials] == ["NCT00000064"]
+
+
+def test_replay_reads_a_compressed_dead_letter(tmp_path):
+    dump = write_input(tmp_path / "dump.jsonl", "jsonl")
+    pp.process_file_with_progress(dump, tmp_path / "run", compress="gzip", progress="none")
+    entries = dead_letter(tmp_path / "run", "gzip")
+    offsets, _ = pp.replay_offsets(entries, dump)
+    pp.process_file_with_progress(dump, tmp_path / "replay", replay=offsets, progress="none")
+    assert dead_letter(tmp_path / "replay") == entries